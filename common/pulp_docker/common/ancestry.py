@@ -0,0 +1,177 @@
+def get_closure(image_ids, parents):
+    """
+    Given some image IDs and a map of each image's parent, this calculates the
+    set containing those images and all of their ancestors. Ancestors that are
+    not in the map end the walk up that branch, since nothing more is known
+    about them.
+
+    :param image_ids:   IDs of the images whose ancestors should be found
+    :type  image_ids:   iterable
+    :param parents:     dictionary where keys are image IDs and values are the
+                        ID of that image's parent, or None
+    :type  parents:     dict
+
+    :return:    set of the given image IDs plus the IDs of all of their ancestors
+    :rtype:     set
+    """
+    closure = set()
+    for image_id in image_ids:
+        # stop as soon as an image is reached whose ancestors were already added
+        while image_id and image_id not in closure:
+            closure.add(image_id)
+            image_id = parents.get(image_id)
+    return closure
+
+
+def get_children(parents):
+    """
+    Invert a map of each image's parent into a map of each image's children.
+
+    :param parents: dictionary where keys are image IDs and values are the ID
+                    of that image's parent, or None
+    :type  parents: dict
+
+    :return:    dictionary where keys are image IDs and values are lists of the
+                IDs of that image's children. Images without children are not
+                included.
+    :rtype:     dict
+    """
+    children = {}
+    for image_id, parent_id in parents.iteritems():
+        if parent_id:
+            children.setdefault(parent_id, []).append(image_id)
+    return children
+
+
+def get_descendants(image_ids, children):
+    """
+    Find all descendants of the given images.
+
+    :param image_ids:   IDs of the images whose descendants should be found
+    :type  image_ids:   iterable
+    :param children:    dictionary as returned by get_children
+    :type  children:    dict
+
+    :return:    set of the IDs of all descendants, not including the given images
+                unless one is a descendant of another
+    :rtype:     set
+    """
+    descendants = set()
+    to_visit = list(image_ids)
+    while to_visit:
+        for child_id in children.get(to_visit.pop(), []):
+            if child_id not in descendants:
+                descendants.add(child_id)
+                to_visit.append(child_id)
+    return descendants
+
+
+def get_unreachable(candidates, roots, parents):
+    """
+    Find which of the candidate images are not ancestors of, or equal to, any
+    of the root images, and are not ancestors of any other image that is
+    neither a candidate nor a root. The latter ensures that no image is left
+    without its parent.
+
+    :param candidates:  IDs of the images that may be unreachable
+    :type  candidates:  set
+    :param roots:       IDs of the images that must be kept, such as tagged images
+    :type  roots:       iterable
+    :param parents:     dictionary where keys are the IDs of all images being
+                        considered and values are the ID of that image's parent,
+                        or None
+    :type  parents:     dict
+
+    :return:    set of the IDs of candidates that can be removed
+    :rtype:     set
+    """
+    roots = set(roots)
+    roots.update(image_id for image_id in parents if image_id not in candidates)
+    return candidates - get_closure(roots, parents)
+
+
+def get_rollups(images, known=None):
+    """
+    Calculate the depth and virtual size of each image. The depth is the number
+    of ancestors an image has, and the virtual size is the size of the image
+    plus the sizes of all of its ancestors. Each image takes constant time once
+    its parent's values are known, whether they were given or calculated.
+
+    :param images:  dictionary where keys are image IDs and values are
+                    dictionaries with keys "parent_id" and "size"
+    :type  images:  dict
+    :param known:   dictionary where keys are IDs of images that are not in
+                    "images" and values are dictionaries with keys "depth" and
+                    "virtual_size". An image whose parent is in neither
+                    dictionary is treated as a base image.
+    :type  known:   dict
+
+    :return:    dictionary where keys are the image IDs in "images" and values are
+                dictionaries with keys "depth" and "virtual_size"
+    :rtype:     dict
+    """
+    rollups = dict(known or {})
+    for image_id in images:
+        # walk up to the nearest ancestor whose values are known, then calculate
+        # the values on the way back down so that each parent precedes its children
+        chain = []
+        current = image_id
+        while current in images and current not in rollups:
+            chain.append(current)
+            current = images[current].get('parent_id')
+        for current in reversed(chain):
+            parent = rollups.get(images[current].get('parent_id'))
+            size = images[current].get('size') or 0
+            rollups[current] = {
+                'depth': parent['depth'] + 1 if parent else 0,
+                'virtual_size': size + (parent['virtual_size'] if parent else 0),
+            }
+    return dict((image_id, rollups[image_id]) for image_id in images)
+
+
+def build_index(images):
+    """
+    Build an ancestry index, which describes where each image sits in the
+    ancestry graph. An image whose parent is not among the given images is
+    treated as a base image.
+
+    :param images:  dictionary where keys are image IDs and values are
+                    dictionaries with keys "parent_id" and "size"
+    :type  images:  dict
+
+    :return:    dictionary where keys are image IDs and values are dictionaries
+                with keys "parent", "size", "depth" and "virtual_size", as
+                described by get_rollups, and "children" (a sorted list of the
+                IDs of its children)
+    :rtype:     dict
+    """
+    index = {}
+    for image_id, rollup in get_rollups(images).iteritems():
+        index[image_id] = {
+            'parent': images[image_id].get('parent_id'),
+            'size': images[image_id].get('size') or 0,
+            'depth': rollup['depth'],
+            'virtual_size': rollup['virtual_size'],
+            'children': [],
+        }
+    for image_id, entry in index.iteritems():
+        if entry['parent'] in index:
+            index[entry['parent']]['children'].append(image_id)
+    for entry in index.itervalues():
+        entry['children'].sort()
+    return index
+
+
+def index_to_images(index):
+    """
+    Convert an ancestry index back to the form accepted by build_index.
+
+    :param index:   dictionary as returned by build_index
+    :type  index:   dict
+
+    :return:    dictionary where keys are image IDs and values are dictionaries
+                with keys "parent_id" and "size"
+    :rtype:     dict
+    """
+    return dict((image_id, {'parent_id': entry['parent'], 'size': entry['size']})
+                for image_id, entry in index.iteritems())
@@ -12,6 +12,19 @@ REPO_NOTE_DOCKER = 'docker-repo'
 
 # Config keys for the importer
 CONFIG_KEY_UPSTREAM_NAME = 'upstream_name'
+CONFIG_KEY_INCLUDE_TAGS = 'include_tags'
+CONFIG_KEY_EXCLUDE_TAGS = 'exclude_tags'
+CONFIG_KEY_TAG_FILTER_REGEX = 'tag_filter_regex'
+CONFIG_KEY_MAX_TAGS = 'max_tags'
+CONFIG_KEY_ADAPTIVE_DOWNLOADS = 'adaptive_downloads'
+CONFIG_KEY_MAX_ADAPTIVE_DOWNLOADS = 'max_adaptive_downloads'
+CONFIG_KEY_DRY_RUN = 'dry_run'
+CONFIG_KEY_CASCADE_REMOVE = 'cascade_remove'
+CONFIG_KEY_GARBAGE_COLLECT = 'garbage_collect'
+
+# Values for the importer's cascade_remove config
+CASCADE_DESCENDANTS = 'descendants'
+CASCADE_UNREACHABLE = 'unreachable'
 
 # Config keys for the distributor plugin conf
 CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY = 'docker_publish_directory'
@@ -22,15 +35,30 @@ CONFIG_KEY_EXPORT_FILE = 'export_file'
 CONFIG_KEY_REDIRECT_URL = 'redirect-url'
 CONFIG_KEY_PROTECTED = 'protected'
 CONFIG_KEY_REPO_REGISTRY_ID = 'repo-registry-id'
+CONFIG_KEY_INCREMENTAL_PUBLISH = 'incremental-publish'
+CONFIG_KEY_FORCE_PUBLISH = 'force-publish'
+CONFIG_KEY_REDIRECT_FILE_VERSION = 'redirect-file-version'
+CONFIG_KEY_EXTENDED_REDIRECT = 'redirect-file-extended'
+CONFIG_KEY_EXPORT_BASE_MANIFEST = 'export-base-manifest'
+CONFIG_KEY_EXPORT_SINCE = 'export-since'
+CONFIG_KEY_EXPORT_VOLUME_SIZE = 'export-volume-size'
+CONFIG_KEY_EXPORT_FORMAT = 'export-format'
+
+# Values for the distributor's export-format config
+EXPORT_FORMAT_CRANE = 'crane'
+EXPORT_FORMAT_DOCKER_SAVE = 'docker-save'
 
 # Config keys for an importer override config
 CONFIG_KEY_MASK_ID = 'mask_id'
+CONFIG_KEY_COPY_TAGS = 'copy_tags'
 
 SYNC_STEP_MAIN = 'sync_step_main'
 SYNC_STEP_METADATA = 'sync_step_metadata'
 SYNC_STEP_GET_LOCAL = 'sync_step_metadata'
 SYNC_STEP_DOWNLOAD = 'sync_step_download'
 SYNC_STEP_SAVE = 'sync_step_save'
+SYNC_STEP_PLAN = 'sync_step_plan'
+SYNC_STEP_GARBAGE_COLLECT = 'sync_step_garbage_collect'
 
 # Keys that are specified on the repo config
 PUBLISH_STEP_WEB_PUBLISHER = 'publish_to_web'
@@ -39,6 +67,7 @@ PUBLISH_STEP_IMAGES = 'publish_images'
 PUBLISH_STEP_OVER_HTTP = 'publish_images_over_http'
 PUBLISH_STEP_DIRECTORY = 'publish_directory'
 PUBLISH_STEP_TAR = 'save_tar'
+PUBLISH_STEP_FINGERPRINT = 'save_fingerprint'
 
 # Dictionary keys to be used when storing or accessing a list of tag dictionaries
 # on the repo scratchpad
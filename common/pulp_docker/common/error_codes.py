@@ -10,3 +10,19 @@ DKR1003 = Error("DKR1003", _("The url specified for %(field) is missing a path.
                              "The value specified is '%(url)'."), ['field', 'url'])
 DKR1004 = Error("DKR1004", _("The value specified for %(field): '%(value)s' is not boolean."),
                 ['field', 'value'])
+DKR1005 = Error("DKR1005", _("The value specified for %(field): '%(value)s' is not a supported "
+                             "version. Supported versions are %(versions)s."),
+                ['field', 'value', 'versions'])
+DKR1006 = Error("DKR1006", _("The file specified for %(field)s: '%(value)s' does not exist."),
+                ['field', 'value'])
+DKR1007 = Error("DKR1007", _("The value specified for %(field)s: '%(value)s' is not an ISO 8601 "
+                             "date."), ['field', 'value'])
+DKR1008 = Error("DKR1008", _("The value specified for %(field)s: '%(value)s' is not a positive "
+                             "integer."), ['field', 'value'])
+DKR1009 = Error("DKR1009", _("The value specified for %(field)s: '%(value)s' is not a supported "
+                             "format. Supported formats are %(formats)s."),
+                ['field', 'value', 'formats'])
+DKR1010 = Error("DKR1010", _("The pattern specified in %(field)s: '%(value)s' is not a valid "
+                             "regular expression."), ['field', 'value'])
+DKR1011 = Error("DKR1011", _("The value specified for %(field)s: '%(value)s' is not supported. "
+                             "Supported values are %(values)s."), ['field', 'value', 'values'])
@@ -1,25 +1,85 @@
+import operator
 import os
 
 from pulp_docker.common import constants
 
 
 class DockerImage(object):
+    """
+    An immutable docker image. Instances have no __dict__, and the unit key,
+    relative path and metadata are each calculated once, on first access. The
+    dictionaries returned by "unit_key" and "unit_metadata" are shared by all
+    callers, so they must be copied before being modified.
+    """
     TYPE_ID = constants.IMAGE_TYPE_ID
 
-    def __init__(self, image_id, parent_id, size):
+    __slots__ = ('_image_id', '_parent_id', '_size', '_virtual_size', '_depth', '_stored_size',
+                 '_layer_size', '_checksum', '_unit_key', '_relative_path', '_unit_metadata')
+
+    image_id = property(operator.attrgetter('_image_id'))
+    parent_id = property(operator.attrgetter('_parent_id'))
+    size = property(operator.attrgetter('_size'))
+    virtual_size = property(operator.attrgetter('_virtual_size'))
+    depth = property(operator.attrgetter('_depth'))
+    stored_size = property(operator.attrgetter('_stored_size'))
+    layer_size = property(operator.attrgetter('_layer_size'))
+    checksum = property(operator.attrgetter('_checksum'))
+
+    def __init__(self, image_id, parent_id, size, virtual_size=None, depth=None,
+                 stored_size=None, layer_size=None, checksum=None):
         """
-        :param image_id:    unique image ID
-        :type  image_id:    basestring
-        :param parent_id:   parent's unique image ID
-        :type  parent_id:   basestring
-        :param size:        size of the image in bytes, as reported by docker.
-                            This can be None, because some very old docker images
-                            do not contain it in their metadata.
-        :type  size:        int or NoneType
+        :param image_id:        unique image ID
+        :type  image_id:        basestring
+        :param parent_id:       parent's unique image ID
+        :type  parent_id:       basestring
+        :param size:            size of the image in bytes, as reported by docker.
+                                This can be None, because some very old docker images
+                                do not contain it in their metadata.
+        :type  size:            int or NoneType
+        :param virtual_size:    size of the image plus the sizes of all of its
+                                ancestors, in bytes
+        :type  virtual_size:    int or NoneType
+        :param depth:           number of ancestors the image has
+        :type  depth:           int or NoneType
+        :param stored_size:     number of bytes the image's files take on disk
+        :type  stored_size:     int or NoneType
+        :param layer_size:      number of bytes the image's layer file takes on disk
+        :type  layer_size:      int or NoneType
+        :param checksum:        checksum of the image's layer file as it is stored,
+                                in the form "sha256:<hex digest>"
+        :type  checksum:        basestring or NoneType
+        """
+        self._image_id = image_id
+        self._parent_id = parent_id
+        self._size = size
+        self._virtual_size = virtual_size
+        self._depth = depth
+        self._stored_size = stored_size
+        self._layer_size = layer_size
+        self._checksum = checksum
+        # derived values, calculated on first access
+        self._unit_key = None
+        self._relative_path = None
+        self._unit_metadata = None
+
+    @classmethod
+    def from_metadata(cls, images):
+        """
+        Create many images at once from their metadata.
+
+        :param images:  dictionary where keys are image IDs and values are
+                        dictionaries in the form of "unit_metadata". Only
+                        "parent_id" and "size" are required.
+        :type  images:  dict
+
+        :return:    list of DockerImage instances
+        :rtype:     list
         """
-        self.image_id = image_id
-        self.parent_id = parent_id
-        self.size = size
+        return [cls(image_id, metadata.get('parent_id'), metadata.get('size'),
+                    metadata.get('virtual_size'), metadata.get('depth'),
+                    metadata.get('stored_size'), metadata.get('layer_size'),
+                    metadata.get('checksum'))
+                for image_id, metadata in images.iteritems()]
 
     @property
     def unit_key(self):
@@ -27,9 +87,11 @@ class DockerImage(object):
         :return:    unit key
         :rtype:     dict
         """
-        return {
-            'image_id': self.image_id
-        }
+        if self._unit_key is None:
+            self._unit_key = {
+                'image_id': self._image_id
+            }
+        return self._unit_key
 
     @property
     def relative_path(self):
@@ -37,7 +99,9 @@ class DockerImage(object):
         :return:    the relative path to where this image's directory should live
         :rtype:     basestring
         """
-        return os.path.join(self.TYPE_ID, self.image_id)
+        if self._relative_path is None:
+            self._relative_path = os.path.join(self.TYPE_ID, self._image_id)
+        return self._relative_path
 
     @property
     def unit_metadata(self):
@@ -46,7 +110,14 @@ class DockerImage(object):
                     including only what pulp_docker cares about
         :rtype:     dict
         """
-        return {
-            'parent_id': self.parent_id,
-            'size': self.size
-        }
+        if self._unit_metadata is None:
+            self._unit_metadata = {
+                'parent_id': self._parent_id,
+                'size': self._size,
+                'virtual_size': self._virtual_size,
+                'depth': self._depth,
+                'stored_size': self._stored_size,
+                'layer_size': self._layer_size,
+                'checksum': self._checksum,
+            }
+        return self._unit_metadata
@@ -1,6 +1,157 @@
+import fnmatch
+import re
+
 from pulp_docker.common import constants
 
 
+class TagIndex(object):
+    """
+    Tags of a repository, indexed both by tag name and by image ID so that
+    lookups and updates take constant time regardless of how many tags the
+    repository has. Tags are kept in the order they were set, which is the
+    order of the list stored on the repo scratchpad.
+    """
+
+    def __init__(self, tag_list=None):
+        """
+        :param tag_list:    list of dictionaries each containing values for 'tag'
+                            and 'image_id' keys, as stored on the repo scratchpad
+        :type  tag_list:    list of dict
+        """
+        # keys are tag names, values are image IDs
+        self._by_tag = {}
+        # keys are image IDs, values are lists of tag names
+        self._by_image = {}
+        # tag names in the order they were set. A tag that is removed or moved
+        # is left where it was, and only counts at the position that
+        # self._positions gives for it, so that no update searches the list.
+        self._order = []
+        # keys are tag names, values are their positions in self._order
+        self._positions = {}
+        for tag_dict in tag_list or []:
+            self.set_tag(tag_dict[constants.IMAGE_TAG_KEY], tag_dict[constants.IMAGE_ID_KEY])
+
+    def __len__(self):
+        return len(self._by_tag)
+
+    def __contains__(self, tag):
+        return tag in self._by_tag
+
+    def get_image_id(self, tag):
+        """
+        :param tag: name of a tag
+        :type  tag: basestring
+
+        :return:    ID of the image the tag points to, or None if there is no such tag
+        :rtype:     basestring
+        """
+        return self._by_tag.get(tag)
+
+    def get_tags(self, image_id):
+        """
+        :param image_id:    unique ID of a docker image
+        :type  image_id:    basestring
+
+        :return:    names of the tags that point to the image
+        :rtype:     list
+        """
+        return list(self._by_image.get(image_id, []))
+
+    def set_tag(self, tag, image_id):
+        """
+        Point a tag at an image. A tag that already exists is moved to the end.
+
+        :param tag:         name of a tag
+        :type  tag:         basestring
+        :param image_id:    unique ID of a docker image
+        :type  image_id:    basestring
+        """
+        self.remove_tag(tag)
+        self._by_tag[tag] = image_id
+        self._by_image.setdefault(image_id, []).append(tag)
+        self._positions[tag] = len(self._order)
+        self._order.append(tag)
+
+    def update(self, new_tags):
+        """
+        :param new_tags:    dictionary of tag:image_id
+        :type  new_tags:    dict
+        """
+        for tag, image_id in new_tags.items():
+            self.set_tag(tag, image_id)
+
+    def remove_tag(self, tag):
+        """
+        :param tag: name of a tag
+        :type  tag: basestring
+
+        :return:    True if the tag existed, else False
+        :rtype:     bool
+        """
+        if tag not in self._by_tag:
+            return False
+        image_id = self._by_tag.pop(tag)
+        del self._positions[tag]
+        image_tags = self._by_image[image_id]
+        image_tags.remove(tag)
+        if not image_tags:
+            del self._by_image[image_id]
+        self._compact()
+        return True
+
+    def remove_image(self, image_id):
+        """
+        Remove all tags that point to an image.
+
+        :param image_id:    unique ID of a docker image
+        :type  image_id:    basestring
+
+        :return:    names of the tags that were removed
+        :rtype:     list
+        """
+        image_tags = self._by_image.pop(image_id, [])
+        for tag in image_tags:
+            del self._by_tag[tag]
+            del self._positions[tag]
+        self._compact()
+        return image_tags
+
+    def to_dict(self):
+        """
+        :return:    dictionary of tag:image_id
+        :rtype:     dict
+        """
+        return dict(self._by_tag)
+
+    def to_list(self):
+        """
+        :return:    list of dictionaries each containing values for 'tag' and
+                    'image_id' keys, as stored on the repo scratchpad. Since tags
+                    can contain '.' which cannot be stored as a key in mongodb,
+                    they are stored this way.
+        :rtype:     list of dict
+        """
+        return [{constants.IMAGE_TAG_KEY: tag, constants.IMAGE_ID_KEY: self._by_tag[tag]}
+                for tag in self._get_ordered_tags()]
+
+    def _get_ordered_tags(self):
+        """
+        :return:    names of the tags, in the order they were set
+        :rtype:     list
+        """
+        return [tag for position, tag in enumerate(self._order)
+                if self._positions.get(tag) == position]
+
+    def _compact(self):
+        """
+        Drop the positions of removed and moved tags once they make up most of
+        the order list, so that it does not grow without bound.
+        """
+        if len(self._order) > 2 * len(self._by_tag):
+            self._order = self._get_ordered_tags()
+            self._positions = dict((tag, position) for position, tag in enumerate(self._order))
+
+
 def generate_updated_tags(scratchpad, new_tags):
     """
     Get the current repo scratchpad's tags and generate an updated tag list
@@ -14,15 +165,78 @@ def generate_updated_tags(scratchpad, new_tags):
     :return:           list of dictionaries each containing values for 'tag' and 'image_id' keys
     :rtype:            list of dict
     """
-    tags = scratchpad.get('tags', [])
+    index = TagIndex(scratchpad.get('tags', []))
+    index.update(new_tags)
+    return index.to_list()
+
+
+def filter_tags(tags, include=None, exclude=None, regex=False):
+    """
+    Select the tags whose names match at least one of the include patterns and
+    none of the exclude patterns. If no include patterns are given, every tag
+    that is not excluded is selected.
+
+    :param tags:    dictionary of tag:image_id
+    :type  tags:    dict
+    :param include: patterns that a tag name must match to be selected
+    :type  include: list of basestring or NoneType
+    :param exclude: patterns that a tag name must not match to be selected
+    :type  exclude: list of basestring or NoneType
+    :param regex:   if True, patterns are regular expressions that must match the
+                    whole tag name; otherwise they are shell-style globs such as "7.*"
+    :type  regex:   bool
+    :return:        dictionary of tag:image_id containing only the selected tags
+    :rtype:         dict
+    :raises re.error: if regex is True and one of the patterns is not valid
+    """
+    include_matchers = _get_matchers(include, regex)
+    exclude_matchers = _get_matchers(exclude, regex)
 
-    # Remove common tags between existing and new tags so we don't have duplicates
-    for tag_dict in tags[:]:
-        if tag_dict[constants.IMAGE_TAG_KEY] in new_tags.keys():
-            tags.remove(tag_dict)
-    # Add new tags to existing tags. Since tags can contain '.' which cannot be stored
-    # as a key in mongodb, we are storing them this way.
-    for tag, image_id in new_tags.items():
-        tags.append({constants.IMAGE_TAG_KEY: tag, constants.IMAGE_ID_KEY: image_id})
+    selected = {}
+    for tag, image_id in tags.items():
+        if include_matchers and not any(match(tag) for match in include_matchers):
+            continue
+        if any(match(tag) for match in exclude_matchers):
+            continue
+        selected[tag] = image_id
+    return selected
 
-    return tags
+
+def get_newest_tags(tags, created, count):
+    """
+    Select the tags that point to the most recently created images. Tags whose
+    image has no known creation time are considered the oldest.
+
+    :param tags:    dictionary of tag:image_id
+    :type  tags:    dict
+    :param created: dictionary of image_id:creation time, as found in the
+                    "created" field of docker image metadata. Those ISO 8601
+                    timestamps sort chronologically as strings.
+    :type  created: dict
+    :param count:   maximum number of tags to select
+    :type  count:   int
+    :return:        dictionary of tag:image_id containing only the selected tags
+    :rtype:         dict
+    """
+    # sort on the tag name as well so the selection is stable between syncs
+    ordered = sorted(tags.items(), key=lambda item: (created.get(item[1]) or '', item[0]),
+                     reverse=True)
+    return dict(ordered[:count])
+
+
+def _get_matchers(patterns, regex):
+    """
+    Turn a list of patterns into a list of functions, each of which takes a tag
+    name and returns a true value if the pattern matches it.
+
+    :param patterns:    glob or regular expression patterns
+    :type  patterns:    list of basestring or NoneType
+    :param regex:       if True, treat the patterns as regular expressions
+    :type  regex:       bool
+    :return:            list of match functions
+    :rtype:             list
+    """
+    if regex:
+        return [re.compile(r'(?:%s)\Z' % pattern).match for pattern in patterns or []]
+    return [lambda tag, pattern=pattern: fnmatch.fnmatchcase(tag, pattern)
+            for pattern in patterns or []]
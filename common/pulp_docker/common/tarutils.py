@@ -24,8 +24,35 @@ def get_metadata(tarfile_path):
     """
     metadata = {}
 
+    for image_id, parent_id, size in iter_metadata(tarfile_path):
+        metadata[image_id] = {
+            'parent': parent_id,
+            'size': size,
+        }
+
+    return metadata
+
+
+def iter_metadata(tarfile_path):
+    """
+    Given a path to a tarfile, which is itself the product of "docker save",
+    this reads the archive's headers one at a time and generates metadata about
+    each image (layer) it finds. Unlike TarFile.getmembers, this does not keep
+    a TarInfo for every member of the archive, so the memory it uses does not
+    grow with the size of the archive.
+
+    :param tarfile_path:    full path to a tarfile that is the product
+                            of "docker save"
+    :type  tarfile_path:    basestring
+
+    :return:    generator of tuples (image_id, parent_id, size), where parent_id
+                is None for a base image, and size is the size in bytes as
+                reported by docker, or None if docker did not report one
+    :rtype:     generator
+    """
     with contextlib.closing(tarfile.open(tarfile_path)) as archive:
-        for member in archive.getmembers():
+        member = archive.next()
+        while member is not None:
             # find the "json" files, which contain all image metadata
             if os.path.basename(member.path) == 'json':
                 image_data = json.load(archive.extractfile(member))
@@ -33,14 +60,13 @@ def get_metadata(tarfile_path):
                 # of whether these keys are capitalized or not.
                 image_id = image_data.get('id', image_data.get('Id'))
                 parent_id = image_data.get('parent', image_data.get('Parent'))
-                metadata[image_id] = {
-                    'parent': parent_id,
-                    # image 511136ea does not have a Size attribute, which has
-                    # caused problems during upload
-                    'size': image_data.get('Size'),
-                }
-
-    return metadata
+                # image 511136ea does not have a Size attribute, which has
+                # caused problems during upload
+                yield image_id, parent_id, image_data.get('Size')
+            # the archive remembers every member it has read, which is not
+            # needed here
+            archive.members = []
+            member = archive.next()
 
 
 def get_tags(tarfile_path):
@@ -0,0 +1,127 @@
+# Compares the memory used by, and the time taken to create and use, a large
+# number of DockerImage instances against the previous implementation, which
+# had a __dict__ and built its derived values on every access.
+#
+# Run from the "common" directory:
+#
+#     python test/benchmark/bench_models.py [count]
+
+import gc
+import os
+import sys
+import time
+
+from pulp_docker.common import constants, models
+
+
+DEFAULT_COUNT = 100000
+# the number of times each derived value is read for each image while it is saved
+ACCESSES = 3
+
+
+class LegacyDockerImage(object):
+    TYPE_ID = constants.IMAGE_TYPE_ID
+
+    def __init__(self, image_id, parent_id, size, virtual_size=None, depth=None,
+                 stored_size=None):
+        self.image_id = image_id
+        self.parent_id = parent_id
+        self.size = size
+        self.virtual_size = virtual_size
+        self.depth = depth
+        self.stored_size = stored_size
+
+    @property
+    def unit_key(self):
+        return {'image_id': self.image_id}
+
+    @property
+    def relative_path(self):
+        return os.path.join(self.TYPE_ID, self.image_id)
+
+    @property
+    def unit_metadata(self):
+        return {
+            'parent_id': self.parent_id,
+            'size': self.size,
+            'virtual_size': self.virtual_size,
+            'depth': self.depth,
+            'stored_size': self.stored_size,
+        }
+
+
+def make_metadata(count):
+    images = {}
+    parent_id = None
+    for i in xrange(count):
+        image_id = '%064x' % i
+        images[image_id] = {'parent_id': parent_id, 'size': 1024, 'virtual_size': 1024 * (i + 1),
+                            'depth': i, 'stored_size': 512}
+        parent_id = image_id
+    return images
+
+
+def instance_size(image):
+    """
+    :return:    bytes used by an instance itself and its containers, not counting
+                values that are shared with the metadata it was created from
+    :rtype:     int
+    """
+    size = sys.getsizeof(image)
+    if hasattr(image, '__dict__'):
+        size += sys.getsizeof(image.__dict__)
+    return size
+
+
+def derived_size(image):
+    """
+    :return:    bytes used by one copy of each derived value
+    :rtype:     int
+    """
+    return sum(sys.getsizeof(value)
+               for value in (image.unit_key, image.relative_path, image.unit_metadata))
+
+
+def use(images):
+    for image in images:
+        for i in xrange(ACCESSES):
+            image.unit_key
+            image.relative_path
+            image.unit_metadata
+
+
+def run(name, create, metadata):
+    gc.collect()
+    start = time.time()
+    images = create(metadata)
+    created = time.time() - start
+
+    start = time.time()
+    use(images)
+    used = time.time() - start
+
+    count = len(images)
+    # the legacy model builds new derived values on every access, which are
+    # garbage as soon as the caller is done with them
+    copies = 1 if hasattr(images[0], '__slots__') else ACCESSES
+    print '%s' % name
+    print '  create:           %.3fs' % created
+    print '  access x%d:        %.3fs' % (ACCESSES, used)
+    print '  instances:        %.1f MiB' % (instance_size(images[0]) * count / 1048576.0)
+    print '  derived values:   %.1f MiB allocated' % (
+        derived_size(images[0]) * copies * count / 1048576.0)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT
+    metadata = make_metadata(count)
+    print '%d images' % count
+    run('legacy', lambda images: [LegacyDockerImage(image_id, m['parent_id'], m['size'],
+                                                    m['virtual_size'], m['depth'],
+                                                    m['stored_size'])
+                                  for image_id, m in images.iteritems()], metadata)
+    run('slotted', models.DockerImage.from_metadata, metadata)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Compares the peak memory used to scan a large synthetic "docker save" archive
+# by tarutils.iter_metadata against the previous implementation, which read
+# every member of the archive with TarFile.getmembers. Each scan runs in its
+# own process so that its peak memory can be measured on its own.
+#
+# Run from the "common" directory:
+#
+#     python test/benchmark/bench_tarutils.py [members]
+
+import contextlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from cStringIO import StringIO
+
+from pulp_docker.common import tarutils
+
+
+DEFAULT_MEMBERS = 10000
+# each image in a "docker save" archive is a directory with these files
+IMAGE_FILES = ('VERSION', 'json', 'layer.tar')
+
+
+def add_file(archive, name, content):
+    info = tarfile.TarInfo(name)
+    info.size = len(content)
+    archive.addfile(info, StringIO(content))
+
+
+def make_archive(path, members):
+    """
+    Write a "docker save" archive with one chain of images and about the
+    requested number of members.
+    """
+    parent_id = None
+    with contextlib.closing(tarfile.open(path, 'w')) as archive:
+        for i in xrange(members / (len(IMAGE_FILES) + 1)):
+            image_id = '%064x' % i
+            info = tarfile.TarInfo(image_id)
+            info.type = tarfile.DIRTYPE
+            archive.addfile(info)
+            add_file(archive, os.path.join(image_id, 'VERSION'), '1.0')
+            add_file(archive, os.path.join(image_id, 'json'),
+                     json.dumps({'id': image_id, 'parent': parent_id, 'Size': 1024}))
+            add_file(archive, os.path.join(image_id, 'layer.tar'), '\0' * 1024)
+            parent_id = image_id
+        add_file(archive, 'repositories', json.dumps({'busybox': {'latest': parent_id}}))
+
+
+def legacy_get_metadata(tarfile_path):
+    metadata = {}
+    with contextlib.closing(tarfile.open(tarfile_path)) as archive:
+        for member in archive.getmembers():
+            if os.path.basename(member.path) == 'json':
+                image_data = json.load(archive.extractfile(member))
+                image_id = image_data.get('id', image_data.get('Id'))
+                parent_id = image_data.get('parent', image_data.get('Parent'))
+                metadata[image_id] = {'parent': parent_id, 'size': image_data.get('Size')}
+    return metadata
+
+
+def scan(name, path):
+    """
+    Scan the archive and print the number of images found, the time taken and
+    how far the peak memory grew, in KiB.
+    """
+    functions = {'legacy': legacy_get_metadata, 'iter_metadata': tarutils.get_metadata}
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    metadata = functions[name](path)
+    elapsed = time.time() - start
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print '%s %.3f %d' % (len(metadata), elapsed, after - before)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--scan':
+        scan(sys.argv[2], sys.argv[3])
+        return
+
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MEMBERS
+    working_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(working_dir, 'image.tar')
+        make_archive(path, members)
+        with contextlib.closing(tarfile.open(path)) as archive:
+            print '%d members' % len(archive.getmembers())
+        for name in ('legacy', 'iter_metadata'):
+            output = subprocess.check_output([sys.executable, __file__, '--scan', name, path])
+            images, elapsed, growth = output.split()
+            print '%s' % name
+            print '  images:       %s' % images
+            print '  scan:         %ss' % elapsed
+            print '  peak growth:  %.1f MiB' % (int(growth) / 1024.0)
+    finally:
+        shutil.rmtree(working_dir)
+
+
+if __name__ == '__main__':
+    main()
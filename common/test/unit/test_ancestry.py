@@ -0,0 +1,119 @@
+import unittest
+
+from pulp_docker.common import ancestry
+
+
+class TestGetClosure(unittest.TestCase):
+    def setUp(self):
+        self.parents = {'child1': 'parent', 'child2': 'parent', 'parent': 'base', 'base': None,
+                        'other': None}
+
+    def test_closure(self):
+        closure = ancestry.get_closure(['child1'], self.parents)
+
+        self.assertEqual(closure, set(['child1', 'parent', 'base']))
+
+    def test_shared_ancestors(self):
+        closure = ancestry.get_closure(['child1', 'child2'], self.parents)
+
+        self.assertEqual(closure, set(['child1', 'child2', 'parent', 'base']))
+
+    def test_missing_parent(self):
+        closure = ancestry.get_closure(['orphan'], {'orphan': 'unknown'})
+
+        self.assertEqual(closure, set(['orphan', 'unknown']))
+
+    def test_empty(self):
+        self.assertEqual(ancestry.get_closure([], self.parents), set())
+
+
+class TestGetChildren(unittest.TestCase):
+    def test_children(self):
+        children = ancestry.get_children({'child1': 'parent', 'child2': 'parent',
+                                          'parent': None})
+
+        self.assertEqual(set(children.keys()), set(['parent']))
+        self.assertEqual(sorted(children['parent']), ['child1', 'child2'])
+
+
+class TestGetDescendants(unittest.TestCase):
+    def test_descendants(self):
+        children = {'base': ['parent', 'other'], 'parent': ['child1', 'child2']}
+
+        descendants = ancestry.get_descendants(['parent'], children)
+
+        self.assertEqual(descendants, set(['child1', 'child2']))
+
+    def test_none(self):
+        self.assertEqual(ancestry.get_descendants(['leaf'], {}), set())
+
+
+class TestGetUnreachable(unittest.TestCase):
+    def setUp(self):
+        self.parents = {'child1': 'parent', 'child2': 'parent', 'parent': 'base', 'base': None,
+                        'other': 'base'}
+
+    def test_unreachable(self):
+        unreachable = ancestry.get_unreachable(set(['child1', 'parent', 'base']),
+                                               ['child2'], self.parents)
+
+        self.assertEqual(unreachable, set(['child1']))
+
+    def test_keeps_ancestors_of_non_candidates(self):
+        unreachable = ancestry.get_unreachable(set(['parent', 'base']), [], self.parents)
+
+        # child1, child2 and other are not candidates, so their ancestors stay
+        self.assertEqual(unreachable, set())
+
+    def test_all_unreachable(self):
+        parents = {'child': 'base', 'base': None}
+
+        unreachable = ancestry.get_unreachable(set(['child', 'base']), [], parents)
+
+        self.assertEqual(unreachable, set(['child', 'base']))
+
+
+class TestGetRollups(unittest.TestCase):
+    def test_rollups(self):
+        images = {'child': {'parent_id': 'parent', 'size': 1},
+                  'parent': {'parent_id': 'base', 'size': None}}
+        known = {'base': {'depth': 3, 'virtual_size': 100}}
+
+        rollups = ancestry.get_rollups(images, known)
+
+        self.assertEqual(rollups, {'parent': {'depth': 4, 'virtual_size': 100},
+                                   'child': {'depth': 5, 'virtual_size': 101}})
+
+    def test_unknown_parent(self):
+        rollups = ancestry.get_rollups({'child': {'parent_id': 'unknown', 'size': 1}})
+
+        self.assertEqual(rollups, {'child': {'depth': 0, 'virtual_size': 1}})
+
+
+class TestBuildIndex(unittest.TestCase):
+    def test_index(self):
+        images = {'base': {'parent_id': None, 'size': 10},
+                  'parent': {'parent_id': 'base', 'size': 5},
+                  'child2': {'parent_id': 'parent', 'size': None},
+                  'child1': {'parent_id': 'parent', 'size': 1}}
+
+        index = ancestry.build_index(images)
+
+        self.assertEqual(index['base'], {'parent': None, 'size': 10, 'depth': 0,
+                                         'virtual_size': 10, 'children': ['parent']})
+        self.assertEqual(index['parent']['children'], ['child1', 'child2'])
+        self.assertEqual(index['child1'], {'parent': 'parent', 'size': 1, 'depth': 2,
+                                           'virtual_size': 16, 'children': []})
+        self.assertEqual(index['child2']['virtual_size'], 15)
+
+    def test_missing_parent(self):
+        index = ancestry.build_index({'child': {'parent_id': 'unknown', 'size': 3}})
+
+        self.assertEqual(index['child'], {'parent': 'unknown', 'size': 3, 'depth': 0,
+                                          'virtual_size': 3, 'children': []})
+
+    def test_round_trip(self):
+        images = {'base': {'parent_id': None, 'size': 10},
+                  'child': {'parent_id': 'base', 'size': 0}}
+
+        self.assertEqual(ancestry.index_to_images(ancestry.build_index(images)), images)
@@ -27,3 +27,61 @@ class TestBasics(unittest.TestCase):
 
         self.assertEqual(metadata.get('parent_id'), 'xyz')
         self.assertEqual(metadata.get('size'), 1024)
+
+    def test_metadata_rollups(self):
+        image = models.DockerImage('abc', 'xyz', 1024, virtual_size=4096, depth=2,
+                                   stored_size=512)
+        metadata = image.unit_metadata
+
+        self.assertEqual(metadata.get('virtual_size'), 4096)
+        self.assertEqual(metadata.get('depth'), 2)
+        self.assertEqual(metadata.get('stored_size'), 512)
+
+    def test_metadata_layer(self):
+        image = models.DockerImage('abc', 'xyz', 1024, layer_size=300, checksum='sha256:123')
+        metadata = image.unit_metadata
+
+        self.assertEqual(metadata.get('layer_size'), 300)
+        self.assertEqual(metadata.get('checksum'), 'sha256:123')
+
+    def test_immutable(self):
+        image = models.DockerImage('abc', 'xyz', 1024)
+
+        self.assertRaises(AttributeError, setattr, image, 'size', 2048)
+        self.assertRaises(AttributeError, setattr, image, 'other', 1)
+        self.assertRaises(AttributeError, delattr, image, 'image_id')
+        self.assertEqual(image.size, 1024)
+
+    def test_no_instance_dict(self):
+        image = models.DockerImage('abc', 'xyz', 1024)
+
+        self.assertFalse(hasattr(image, '__dict__'))
+
+    def test_derived_values_cached(self):
+        image = models.DockerImage('abc', 'xyz', 1024)
+
+        self.assertTrue(image.unit_key is image.unit_key)
+        self.assertTrue(image.relative_path is image.relative_path)
+        self.assertTrue(image.unit_metadata is image.unit_metadata)
+
+
+class TestFromMetadata(unittest.TestCase):
+    def test_from_metadata(self):
+        images = models.DockerImage.from_metadata({
+            'abc': {'parent_id': 'xyz', 'size': 1024, 'virtual_size': 4096, 'depth': 2,
+                    'stored_size': 512},
+            'xyz': {'parent_id': None, 'size': 3072},
+        })
+
+        images = dict((image.image_id, image) for image in images)
+        self.assertEqual(sorted(images), ['abc', 'xyz'])
+        self.assertEqual(images['abc'].unit_metadata, {'parent_id': 'xyz', 'size': 1024,
+                                                       'virtual_size': 4096, 'depth': 2,
+                                                       'stored_size': 512, 'layer_size': None,
+                                                       'checksum': None})
+        self.assertEqual(images['xyz'].parent_id, None)
+        self.assertEqual(images['xyz'].size, 3072)
+        self.assertEqual(images['xyz'].depth, None)
+
+    def test_empty(self):
+        self.assertEqual(models.DockerImage.from_metadata({}), [])
@@ -33,3 +33,117 @@ class TestGenerateUpdatedTags(unittest.TestCase):
         new_tags = {}
         update_tags = tags.generate_updated_tags(scratchpad, new_tags)
         self.assertEqual(update_tags, scratchpad['tags'])
+
+
+class TestTagIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = tags.TagIndex([
+            {constants.IMAGE_TAG_KEY: 'latest', constants.IMAGE_ID_KEY: 'image1'},
+            {constants.IMAGE_TAG_KEY: '1.0', constants.IMAGE_ID_KEY: 'image1'},
+            {constants.IMAGE_TAG_KEY: '0.9', constants.IMAGE_ID_KEY: 'image2'}])
+
+    def test_lookup(self):
+        self.assertEqual(len(self.index), 3)
+        self.assertTrue('latest' in self.index)
+        self.assertEqual(self.index.get_image_id('0.9'), 'image2')
+        self.assertEqual(self.index.get_image_id('missing'), None)
+        self.assertEqual(self.index.get_tags('image1'), ['latest', '1.0'])
+        self.assertEqual(self.index.get_tags('missing'), [])
+
+    def test_set_tag_moves_existing(self):
+        self.index.set_tag('latest', 'image2')
+
+        self.assertEqual(self.index.get_tags('image1'), ['1.0'])
+        self.assertEqual(self.index.get_tags('image2'), ['0.9', 'latest'])
+        self.assertEqual([t[constants.IMAGE_TAG_KEY] for t in self.index.to_list()],
+                         ['1.0', '0.9', 'latest'])
+
+    def test_remove_tag(self):
+        self.assertTrue(self.index.remove_tag('0.9'))
+        self.assertFalse(self.index.remove_tag('0.9'))
+
+        self.assertEqual(self.index.get_tags('image2'), [])
+        self.assertEqual(self.index.to_dict(), {'latest': 'image1', '1.0': 'image1'})
+
+    def test_remove_image(self):
+        removed = self.index.remove_image('image1')
+
+        self.assertEqual(removed, ['latest', '1.0'])
+        self.assertEqual(self.index.to_list(), [{constants.IMAGE_TAG_KEY: '0.9',
+                                                 constants.IMAGE_ID_KEY: 'image2'}])
+
+    def test_repeated_moves(self):
+        for i in range(100):
+            self.index.set_tag('latest', 'image%d' % (i % 3))
+            self.index.set_tag('1.0', 'image%d' % (i % 2))
+
+        self.assertEqual([t[constants.IMAGE_TAG_KEY] for t in self.index.to_list()],
+                         ['0.9', 'latest', '1.0'])
+        self.assertEqual(self.index.get_tags('image1'), ['1.0'])
+        # the tags' old positions are dropped as they accumulate
+        self.assertTrue(len(self.index._order) <= 6)
+
+    def test_empty(self):
+        self.assertEqual(tags.TagIndex().to_list(), [])
+
+
+class TestFilterTags(unittest.TestCase):
+    def setUp(self):
+        self.tags = {'latest': 'image1', '7.0': 'image2', '7.1': 'image3', '7.1-rc1': 'image4'}
+
+    def test_no_filters(self):
+        self.assertEqual(tags.filter_tags(self.tags), self.tags)
+
+    def test_include(self):
+        selected = tags.filter_tags(self.tags, include=['latest', '7.*'])
+
+        self.assertEqual(selected, self.tags)
+
+    def test_include_subset(self):
+        selected = tags.filter_tags(self.tags, include=['7.?'])
+
+        self.assertEqual(selected, {'7.0': 'image2', '7.1': 'image3'})
+
+    def test_exclude(self):
+        selected = tags.filter_tags(self.tags, exclude=['*-rc*'])
+
+        self.assertEqual(selected, {'latest': 'image1', '7.0': 'image2', '7.1': 'image3'})
+
+    def test_include_and_exclude(self):
+        selected = tags.filter_tags(self.tags, include=['7.*'], exclude=['7.0'])
+
+        self.assertEqual(selected, {'7.1': 'image3', '7.1-rc1': 'image4'})
+
+    def test_regex(self):
+        selected = tags.filter_tags(self.tags, include=[r'\d+\.\d+'], regex=True)
+
+        self.assertEqual(selected, {'7.0': 'image2', '7.1': 'image3'})
+
+    def test_regex_matches_whole_name(self):
+        selected = tags.filter_tags(self.tags, include=['lat'], regex=True)
+
+        self.assertEqual(selected, {})
+
+
+class TestGetNewestTags(unittest.TestCase):
+    def test_newest(self):
+        tag_dict = {'a': 'image1', 'b': 'image2', 'c': 'image3'}
+        created = {'image1': '2014-06-05T21:18:21Z', 'image2': '2014-07-01T10:00:00Z',
+                   'image3': '2014-05-01T10:00:00Z'}
+
+        selected = tags.get_newest_tags(tag_dict, created, 2)
+
+        self.assertEqual(selected, {'a': 'image1', 'b': 'image2'})
+
+    def test_unknown_created_is_oldest(self):
+        tag_dict = {'a': 'image1', 'b': 'image2'}
+        created = {'image1': '2014-06-05T21:18:21Z'}
+
+        selected = tags.get_newest_tags(tag_dict, created, 1)
+
+        self.assertEqual(selected, {'a': 'image1'})
+
+    def test_count_larger_than_tags(self):
+        tag_dict = {'a': 'image1'}
+
+        self.assertEqual(tags.get_newest_tags(tag_dict, {}, 5), tag_dict)
@@ -1,4 +1,5 @@
 import os
+import tarfile
 import unittest
 
 import mock
@@ -69,6 +70,26 @@ class TestGetMetadata(unittest.TestCase):
                 self.assertTrue(isinstance(data['size'], int))
 
 
+class TestIterMetadata(unittest.TestCase):
+    def test_path_does_not_exist(self):
+        self.assertRaises(IOError, list, tarutils.iter_metadata('/a/b/c/d'))
+
+    def test_from_busybox(self):
+        records = list(tarutils.iter_metadata(busybox_tar_path))
+
+        self.assertEqual(len(records), len(busybox_ids))
+        parents = dict((image_id, parent_id) for image_id, parent_id, size in records)
+        self.assertEqual(parents, dict(zip(busybox_ids, busybox_ids[1:] + (None,))))
+
+    def test_does_not_keep_members(self):
+        archive = tarfile.open(busybox_tar_path)
+
+        with mock.patch('tarfile.open', return_value=archive):
+            for record in tarutils.iter_metadata(busybox_tar_path):
+                # only the member that was just read
+                self.assertEqual(len(archive.members), 1)
+
+
 class TestGetTags(unittest.TestCase):
     def test_normal(self):
         tags = tarutils.get_tags(busybox_tar_path)
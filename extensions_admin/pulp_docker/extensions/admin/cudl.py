@@ -181,7 +181,7 @@ class UpdateDockerRepositoryCommand(UpdateRepositoryCommand, ImporterConfigMixin
         repo_id = kwargs.get(OPTION_REPO_ID.keyword)
         response = self.context.server.repo.repository(repo_id).response_body
         scratchpad = response.get(u'scratchpad', {})
-        image_tags = scratchpad.get(u'tags', [])
+        image_tags = tags.TagIndex(scratchpad.get(u'tags', []))
 
         user_tags = kwargs.get(OPTION_TAG.keyword)
         if user_tags:
@@ -222,21 +222,17 @@ class UpdateDockerRepositoryCommand(UpdateRepositoryCommand, ImporterConfigMixin
 
             # Create a list of tag dictionaries that can be saved on the repo scratchpad
             # using the original tags and new tags specified by the user
-            image_tags = tags.generate_updated_tags(scratchpad, tags_to_update)
-            scratchpad[u'tags'] = image_tags
+            image_tags.update(tags_to_update)
+            scratchpad[u'tags'] = image_tags.to_list()
             kwargs[u'scratchpad'] = scratchpad
 
         remove_tags = kwargs.get(OPTION_REMOVE_TAG.keyword)
         if remove_tags:
             kwargs.pop(OPTION_REMOVE_TAG.keyword)
             for tag in remove_tags:
-                # For each tag in remove_tags, remove the respective tag dictionary
-                # for matching tag.
-                for image_tag in image_tags[:]:
-                    if tag == image_tag[constants.IMAGE_TAG_KEY]:
-                        image_tags.remove(image_tag)
+                image_tags.remove_tag(tag)
 
-            scratchpad[u'tags'] = image_tags
+            scratchpad[u'tags'] = image_tags.to_list()
             kwargs[u'scratchpad'] = scratchpad
 
         super(UpdateDockerRepositoryCommand, self).run(**kwargs)
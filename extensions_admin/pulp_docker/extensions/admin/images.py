@@ -4,7 +4,7 @@ from pulp.client.commands import options
 from pulp.client.commands.criteria import DisplayUnitAssociationsCommand
 from pulp.client.commands.unit import UnitCopyCommand, UnitRemoveCommand
 
-from pulp_docker.common import constants
+from pulp_docker.common import constants, tags
 
 
 DESC_COPY = _('copies images from one repository into another')
@@ -92,19 +92,13 @@ class ImageSearchCommand(DisplayUnitAssociationsCommand):
         # Get the list of tags for the repo
         response = self.context.server.repo.repository(repo_id).response_body
         scratchpad = response.get(u'scratchpad', {})
-        tags = scratchpad.get(u'tags', [])
-        image_tags = {}
-
-        # create a dictionary to map images to a list of tags
-        for tag_dict in tags:
-            tag = tag_dict[constants.IMAGE_TAG_KEY]
-            image_id = tag_dict[constants.IMAGE_ID_KEY]
-            image_tags.setdefault(image_id, []).append(tag)
+        image_tags = tags.TagIndex(scratchpad.get(u'tags', []))
 
         # Add the tag info to the images list
         for image in images:
             image_id = image[u'metadata'][u'image_id']
-            if image_id in image_tags:
-                image[u'metadata'][u'tags'] = image_tags.get(image_id)
+            tag_names = image_tags.get_tags(image_id)
+            if tag_names:
+                image[u'metadata'][u'tags'] = tag_names
 
         self.prompt.render_document_list(images)
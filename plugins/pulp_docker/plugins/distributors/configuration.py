@@ -2,6 +2,7 @@ import logging
 import os
 from urlparse import urlparse
 
+from pulp.common import dateutils
 from pulp.server.config import config as server_config
 from pulp.server.exceptions import PulpCodedValidationException
 
@@ -9,6 +10,11 @@ from pulp_docker.common import constants, error_codes
 
 _LOG = logging.getLogger(__name__)
 
+# versions of the redirect file format that can be published
+REDIRECT_FILE_VERSIONS = (1, 2)
+# formats that an export can be written in
+EXPORT_FORMATS = (constants.EXPORT_FORMAT_CRANE, constants.EXPORT_FORMAT_DOCKER_SAVE)
+
 
 def validate_config(config):
     """
@@ -41,6 +47,54 @@ def validate_config(config):
             errors.append(PulpCodedValidationException(error_code=error_codes.DKR1004,
                                                        field=constants.CONFIG_KEY_PROTECTED,
                                                        value=protected))
+    for key in (constants.CONFIG_KEY_INCREMENTAL_PUBLISH, constants.CONFIG_KEY_FORCE_PUBLISH,
+                constants.CONFIG_KEY_EXTENDED_REDIRECT):
+        value = config.get(key)
+        if value and config.get_boolean(key) is None:
+            errors.append(PulpCodedValidationException(error_code=error_codes.DKR1004,
+                                                       field=key, value=value))
+
+    version = config.get(constants.CONFIG_KEY_REDIRECT_FILE_VERSION)
+    if version is not None:
+        try:
+            get_redirect_file_version(config)
+        except ValueError:
+            errors.append(PulpCodedValidationException(
+                error_code=error_codes.DKR1005, field=constants.CONFIG_KEY_REDIRECT_FILE_VERSION,
+                value=version, versions=', '.join(str(v) for v in REDIRECT_FILE_VERSIONS)))
+
+    base_manifest = config.get(constants.CONFIG_KEY_EXPORT_BASE_MANIFEST)
+    if base_manifest and not os.path.isfile(base_manifest):
+        errors.append(PulpCodedValidationException(
+            error_code=error_codes.DKR1006, field=constants.CONFIG_KEY_EXPORT_BASE_MANIFEST,
+            value=base_manifest))
+
+    since = config.get(constants.CONFIG_KEY_EXPORT_SINCE)
+    if since:
+        try:
+            get_export_since(config)
+        except ValueError:
+            errors.append(PulpCodedValidationException(
+                error_code=error_codes.DKR1007, field=constants.CONFIG_KEY_EXPORT_SINCE,
+                value=since))
+
+    volume_size = config.get(constants.CONFIG_KEY_EXPORT_VOLUME_SIZE)
+    if volume_size is not None:
+        try:
+            get_export_volume_size(config)
+        except ValueError:
+            errors.append(PulpCodedValidationException(
+                error_code=error_codes.DKR1008, field=constants.CONFIG_KEY_EXPORT_VOLUME_SIZE,
+                value=volume_size))
+
+    export_format = config.get(constants.CONFIG_KEY_EXPORT_FORMAT)
+    if export_format is not None:
+        try:
+            get_export_format(config)
+        except ValueError:
+            errors.append(PulpCodedValidationException(
+                error_code=error_codes.DKR1009, field=constants.CONFIG_KEY_EXPORT_FORMAT,
+                value=export_format, formats=', '.join(EXPORT_FORMATS)))
 
     if errors:
         raise PulpCodedValidationException(validation_exceptions=errors)
@@ -95,6 +149,89 @@ def get_web_publish_dir(repo, config):
                         get_repo_relative_path(repo, config))
 
 
+def get_previous_web_dir(repo, config):
+    """
+    Get the directory holding the web tree from the most recent publish of the
+    given repository. The published web directory is a symlink to that tree in
+    the master publishing directory.
+
+    :param repo: repository to get the previous web tree for
+    :type  repo: pulp.plugins.model.Repository
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or None
+
+    :return: full path to the previously published web tree, or None if the
+             repository has not been published
+    :rtype:  str or NoneType
+    """
+    publish_dir = get_web_publish_dir(repo, config)
+    if not os.path.islink(publish_dir):
+        return None
+    previous_dir = os.path.realpath(publish_dir)
+    if not os.path.isdir(previous_dir):
+        return None
+    return previous_dir
+
+
+def get_incremental_publish(config):
+    """
+    Determine whether a publish should update the previous publish in place,
+    linking only the images that are new and removing those that are gone,
+    rather than linking every image into a new tree.
+
+    :param config: configuration instance for the repository
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+
+    :return: True if the publish should be incremental
+    :rtype:  bool
+    """
+    return _get_boolean(config, constants.CONFIG_KEY_INCREMENTAL_PUBLISH)
+
+
+def get_force_publish(config):
+    """
+    Determine whether a publish should happen even if neither the repository's
+    content nor its configuration has changed since it was last published.
+
+    :param config: configuration instance for the repository
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+
+    :return: True if the publish should always happen
+    :rtype:  bool
+    """
+    return _get_boolean(config, constants.CONFIG_KEY_FORCE_PUBLISH)
+
+
+def get_extended_redirect(config):
+    """
+    Determine whether the redirect file should describe each image's parent,
+    sizes and checksum in addition to its ID.
+
+    :param config: configuration instance for the repository
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+
+    :return: True if the extended redirect file format should be published
+    :rtype:  bool
+    """
+    return _get_boolean(config, constants.CONFIG_KEY_EXTENDED_REDIRECT)
+
+
+def _get_boolean(config, key):
+    """
+    :param config: configuration instance for the repository
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+    :param key: key of a boolean value, which may be a string
+    :type  key: str
+
+    :return: the value of the key, or False if it is not set
+    :rtype:  bool
+    """
+    value = config.get(key, False)
+    if isinstance(value, basestring):
+        return value.lower() == 'true'
+    return bool(value)
+
+
 def get_app_publish_dir(config):
     """
     Get the configured directory where the application redirect files should be stored
@@ -121,6 +258,38 @@ def get_redirect_file_name(repo):
     return '%s.json' % repo.id
 
 
+def get_redirect_file_version(config):
+    """
+    Get the version of the redirect file format to publish.
+
+    :param config: configuration instance for the repository
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+
+    :return: redirect file format version
+    :rtype:  int
+    :raises ValueError: if the configured version is not supported
+    """
+    version = int(config.get(constants.CONFIG_KEY_REDIRECT_FILE_VERSION) or 1)
+    if version not in REDIRECT_FILE_VERSIONS:
+        raise ValueError('unsupported redirect file version: %d' % version)
+    return version
+
+
+def get_redirect_shard_dir_name(repo):
+    """
+    Get the name of the directory that holds the compressed and sharded
+    redirect data for a repository, which is published next to the redirect
+    file when using version 2 of its format.
+
+    :param repo: the repository to get the directory name for
+    :type  repo: pulp.plugins.model.Repository
+
+    :returns: the name to use for the directory
+    :rtype:  str
+    """
+    return repo.id
+
+
 def get_redirect_url(config, repo):
     """
     Get the redirect URL for a given repo & configuration
@@ -201,6 +370,106 @@ def get_export_repo_file_with_path(repo, config):
     return file_name
 
 
+def get_export_volume_size(config):
+    """
+    Get the largest size that each file of an export may have.
+
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+    :return: the size in bytes, or None if the export should be a single file
+    :rtype:  int or NoneType
+    :raises ValueError: if the configured value is not a positive integer
+    """
+    volume_size = config.get(constants.CONFIG_KEY_EXPORT_VOLUME_SIZE)
+    if volume_size is None:
+        return None
+    volume_size = int(volume_size)
+    if volume_size <= 0:
+        raise ValueError('export volume size must be positive: %d' % volume_size)
+    return volume_size
+
+
+def get_export_format(config):
+    """
+    Get the format to write an export in.
+
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+    :return: one of EXPORT_FORMATS
+    :rtype:  str
+    :raises ValueError: if the configured format is not supported
+    """
+    export_format = config.get(constants.CONFIG_KEY_EXPORT_FORMAT) or constants.EXPORT_FORMAT_CRANE
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError('unsupported export format: %s' % export_format)
+    return export_format
+
+
+def get_export_volume_file_with_path(repo, config, number):
+    """
+    Get the file name to use for one volume of an export that is split into
+    volumes. Volumes are named after the tar file, with the volume number
+    before the extension.
+
+    :param repo: repository being exported
+    :type  repo: pulp.plugins.model.Repository
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or NoneType
+    :param number: number of the volume, starting at 1
+    :type  number: int
+    :return: The absolute file name for the volume
+    :rtype:  str
+    """
+    base, extension = os.path.splitext(get_export_repo_file_with_path(repo, config))
+    return '%s.%03d%s' % (base, number, extension)
+
+
+def get_export_manifest_file_with_path(repo, config):
+    """
+    Get the file name to use for the manifest that describes a repository's
+    export. It is saved next to the tar file.
+
+    :param repo: repository being exported
+    :type  repo: pulp.plugins.model.Repository
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or NoneType
+    :return: The absolute file name for the manifest
+    :rtype:  str
+    """
+    return '%s-manifest.json' % os.path.splitext(get_export_repo_file_with_path(repo, config))[0]
+
+
+def get_export_base_manifest(config):
+    """
+    Get the manifest of a previous export that an export should only add to.
+
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+    :return: full path to the base manifest, or None for a full export
+    :rtype:  str or NoneType
+    """
+    return config.get(constants.CONFIG_KEY_EXPORT_BASE_MANIFEST) or None
+
+
+def get_export_since(config):
+    """
+    Get the time after which images must have been added to the repository to
+    be exported.
+
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+    :return: the time in UTC, or None to export images regardless of when they
+             were added
+    :rtype:  datetime.datetime or NoneType
+    :raises ValueError: if the configured value is not an ISO 8601 date
+    """
+    since = config.get(constants.CONFIG_KEY_EXPORT_SINCE)
+    if not since:
+        return None
+    return dateutils.to_utc_datetime(dateutils.parse_iso8601_datetime(since),
+                                     no_tz_equals_local_tz=False)
+
+
 def get_repo_registry_id(repo, config):
     """
     Get the registry ID that should be used by the docker API.  If a registry name has not
@@ -9,7 +9,7 @@ from pulp.plugins.distributor import Distributor
 
 from pulp_docker.common import constants
 from pulp_docker.plugins.distributors.publish_steps import ExportPublisher
-from pulp_docker.plugins.distributors import configuration
+from pulp_docker.plugins.distributors import configuration, manifest
 
 
 _logger = logging.getLogger(__name__)
@@ -155,9 +155,13 @@ class DockerExportDistributor(Distributor):
         for repo_dir in dir_list:
             shutil.rmtree(repo_dir, ignore_errors=True)
 
-        # Remove the published app file & directory links
+        # Remove the published app file & directory links, and the volumes
+        # that the published manifest lists
+        manifest_path = configuration.get_export_manifest_file_with_path(repo, config)
         file_list = [os.path.join(configuration.get_export_repo_directory(config),
-                                  configuration.get_export_repo_filename(repo, config))]
+                                  configuration.get_export_repo_filename(repo, config)),
+                     manifest_path]
+        file_list.extend(manifest.get_published_files(manifest_path))
 
         for file_name in file_list:
             try:
@@ -162,7 +162,9 @@ class DockerWebDistributor(Distributor):
         # Remove the published app file & directory links
         dir_list = [configuration.get_web_publish_dir(repo, config),
                     os.path.join(configuration.get_app_publish_dir(config),
-                                 configuration.get_redirect_file_name(repo))]
+                                 configuration.get_redirect_file_name(repo)),
+                    os.path.join(configuration.get_app_publish_dir(config),
+                                 configuration.get_redirect_shard_dir_name(repo))]
 
         for repo_dir in dir_list:
             try:
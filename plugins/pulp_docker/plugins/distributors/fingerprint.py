@@ -0,0 +1,161 @@
+import errno
+import hashlib
+import json
+import os
+
+from pulp.plugins.conduits.mixins import UnitAssociationCriteria
+
+from pulp_docker.common import constants
+from pulp_docker.plugins.distributors import configuration
+
+
+# name of the file, saved alongside the published web tree, that holds the
+# fingerprint of what was published
+FINGERPRINT_FILE = 'fingerprint'
+# this must be incremented whenever the published files change in a way that
+# existing publishes should be replaced, such as a new redirect file format
+FINGERPRINT_VERSION = 3
+# name of the file, saved alongside the published web tree, that lists the
+# images that were published and the values that determine where each of the
+# published files is, so that a later publish can update the tree in place
+PUBLISHED_STATE_FILE = 'published.json'
+
+
+def get_fingerprint(repo, conduit, config):
+    """
+    Calculate a fingerprint of everything that determines the published files:
+    the IDs of the images in the repository, the repository's tags, and the
+    configuration that determines the redirect file.
+
+    :param repo:    repository being published
+    :type  repo:    pulp.plugins.model.Repository
+    :param conduit: conduit for the publish
+    :type  conduit: pulp.plugins.conduits.repo_publish.RepoPublishConduit
+    :param config:  configuration for the distributor
+    :type  config:  pulp.plugins.config.PluginCallConfiguration
+
+    :return:    hex digest that changes whenever the published files would change
+    :rtype:     str
+    """
+    criteria = UnitAssociationCriteria(type_ids=[constants.IMAGE_TYPE_ID],
+                                       unit_fields=['image_id'])
+    image_ids = sorted(unit.unit_key['image_id']
+                       for unit in conduit.get_units(criteria, as_generator=True))
+    tags = {}
+    for tag in conduit.get_repo_scratchpad().get(u'tags', []):
+        tags[tag[constants.IMAGE_TAG_KEY]] = tag[constants.IMAGE_ID_KEY]
+
+    document = {
+        'version': FINGERPRINT_VERSION,
+        'images': image_ids,
+        'tags': tags,
+        'redirect-url': configuration.get_redirect_url(config, repo),
+        'protected': bool(config.get(constants.CONFIG_KEY_PROTECTED, False)),
+        'repo-registry-id': configuration.get_repo_registry_id(repo, config),
+        'redirect-file-version': configuration.get_redirect_file_version(config),
+        'redirect-file-extended': configuration.get_extended_redirect(config),
+    }
+    return hashlib.sha256(json.dumps(document, sort_keys=True)).hexdigest()
+
+
+def get_published_fingerprint(repo, config):
+    """
+    Read the fingerprint saved by the most recent publish of the repository.
+
+    :param repo:    repository being published
+    :type  repo:    pulp.plugins.model.Repository
+    :param config:  configuration for the distributor
+    :type  config:  pulp.plugins.config.PluginCallConfiguration
+
+    :return:    the fingerprint, or None if the repository has not been published
+                or its publish did not save a fingerprint
+    :rtype:     str or NoneType
+    """
+    previous_dir = configuration.get_previous_web_dir(repo, config)
+    if previous_dir is None:
+        return None
+    path = os.path.join(os.path.dirname(previous_dir), FINGERPRINT_FILE)
+    try:
+        with open(path) as fingerprint_file:
+            return fingerprint_file.read().strip()
+    except IOError, e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+
+
+def save_fingerprint(working_dir, fingerprint):
+    """
+    Save a fingerprint in the directory that will become the master publish
+    directory.
+
+    :param working_dir: full path to the publish's working directory
+    :type  working_dir: str
+    :param fingerprint: fingerprint to save
+    :type  fingerprint: str
+    """
+    if not os.path.exists(working_dir):
+        os.makedirs(working_dir)
+    with open(os.path.join(working_dir, FINGERPRINT_FILE), 'w') as fingerprint_file:
+        fingerprint_file.write(fingerprint)
+
+
+def get_publish_layout(repo, config):
+    """
+    Get the values that determine where each published file is, other than the
+    images' directories. A publish can only update a previous publish in place
+    if these have not changed.
+
+    :param repo:    repository being published
+    :type  repo:    pulp.plugins.model.Repository
+    :param config:  configuration for the distributor
+    :type  config:  pulp.plugins.config.PluginCallConfiguration
+
+    :return:    dictionary of the values
+    :rtype:     dict
+    """
+    return {
+        'version': FINGERPRINT_VERSION,
+        'repo-registry-id': configuration.get_repo_registry_id(repo, config),
+        'redirect-file-version': configuration.get_redirect_file_version(config),
+    }
+
+
+def get_published_state(master_dir):
+    """
+    Read the state saved by a publish.
+
+    :param master_dir:  full path to the directory that the publish made live
+    :type  master_dir:  str
+
+    :return:    dictionary with the keys of get_publish_layout, plus "images",
+                the IDs of the published images, or None if the state was not
+                saved or can not be read
+    :rtype:     dict or NoneType
+    """
+    try:
+        with open(os.path.join(master_dir, PUBLISHED_STATE_FILE)) as state_file:
+            state = json.load(state_file)
+    except (IOError, ValueError):
+        return None
+    if not isinstance(state, dict) or not isinstance(state.get('images'), list):
+        return None
+    return state
+
+
+def save_published_state(working_dir, layout, image_ids):
+    """
+    Save the state of a publish in the directory that will become the master
+    publish directory.
+
+    :param working_dir: full path to the publish's working directory
+    :type  working_dir: str
+    :param layout:      values returned by get_publish_layout
+    :type  layout:      dict
+    :param image_ids:   IDs of the published images
+    :type  image_ids:   iterable
+    """
+    if not os.path.exists(working_dir):
+        os.makedirs(working_dir)
+    with open(os.path.join(working_dir, PUBLISHED_STATE_FILE), 'w') as state_file:
+        json.dump(dict(layout, images=sorted(image_ids)), state_file)
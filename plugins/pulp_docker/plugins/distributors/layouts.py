@@ -0,0 +1,411 @@
+import contextlib
+import gzip
+import json
+import os
+import Queue
+import struct
+import sys
+import tarfile
+import threading
+
+from pulp_docker.plugins import threads
+from pulp_docker.plugins.distributors import tarstream
+
+
+# the first bytes of a gzip compressed file
+GZIP_MAGIC = '\x1f\x8b'
+# the last 4 bytes of a gzip member hold its uncompressed size, modulo 4 GiB
+GZIP_ISIZE_FORMAT = '<I'
+GZIP_ISIZE_LIMIT = 2 ** 32
+# deflate compresses by at most this ratio, so the trailer of a smaller file
+# cannot have wrapped around
+GZIP_MAX_RATIO = 1032
+# number of decompressed buffers that may be waiting for the writer, per layer
+LAYER_QUEUE_DEPTH = 2
+# seconds a decompressing thread waits for room in its queue before checking
+# whether the layer is still wanted
+LAYER_QUEUE_TIMEOUT = 0.5
+
+
+class CraneLayout(object):
+    """
+    Lays out an export the way a repository is published to the web, for use
+    with crane: each image's files are in web/<image_id>/, and every file in
+    the working directory, including the redirect file, is at the top.
+    """
+
+    # images may be put in any volume
+    ancestry = False
+    image_files = ('ancestry', 'json', 'layer')
+
+    def __init__(self, working_dir):
+        """
+        :param working_dir: full path to the working directory holding the
+                            metadata files
+        :type  working_dir: str
+        """
+        self.working_dir = working_dir
+
+    def get_image_size(self, image):
+        """
+        :param image:   image to export
+        :type  image:   pulp_docker.plugins.distributors.volumes.ExportImage
+
+        :return:    number of bytes the image's files take in a tar file
+        :rtype:     int
+        """
+        image_dir = 'web/%s' % image.image_id
+        size = tarstream.get_member_size(0, image_dir, tarfile.DIRTYPE)
+        for file_name in self.image_files:
+            path = os.path.join(image.storage_path, file_name)
+            size += tarstream.get_member_size(os.path.getsize(path),
+                                              '%s/%s' % (image_dir, file_name))
+        return size
+
+    def add_image(self, writer, image):
+        """
+        :param writer:  tar file to add the image's files to
+        :type  writer:  pulp_docker.plugins.distributors.tarstream.TarStreamWriter
+        :param image:   image to export
+        :type  image:   pulp_docker.plugins.distributors.volumes.ExportImage
+        """
+        image_dir = 'web/%s' % image.image_id
+        writer.add_directory(image_dir)
+        for file_name in self.image_files:
+            writer.add_file('%s/%s' % (image_dir, file_name),
+                            os.path.join(image.storage_path, file_name))
+
+    def add_images(self, writer, images):
+        """
+        :param writer:  tar file to add the images' files to
+        :type  writer:  pulp_docker.plugins.distributors.tarstream.TarStreamWriter
+        :param images:  images to export, in order
+        :type  images:  list of pulp_docker.plugins.distributors.volumes.ExportImage
+        """
+        for image in images:
+            self.add_image(writer, image)
+
+    def get_metadata_size(self, exclude):
+        """
+        :param exclude: full paths in the working directory that are not added
+        :type  exclude: list
+
+        :return:    the most bytes that add_metadata adds to a tar file
+        :rtype:     int
+        """
+        return tarstream.get_tree_size(self.working_dir, exclude)
+
+    def add_metadata(self, writer, images, last, exclude):
+        """
+        :param writer:  tar file to add the metadata files to
+        :type  writer:  pulp_docker.plugins.distributors.tarstream.TarStreamWriter
+        :param images:  images in the tar file
+        :type  images:  list of pulp_docker.plugins.distributors.volumes.ExportImage
+        :param last:    True if this is the last tar file of the export
+        :type  last:    bool
+        :param exclude: full paths in the working directory that must not be added
+        :type  exclude: list
+        """
+        writer.add_tree(self.working_dir, '', exclude=exclude)
+
+
+class DockerSaveLayout(object):
+    """
+    Lays out an export the way "docker save" does, so that it can be loaded
+    with "docker load": each image's json, uncompressed layer and VERSION file
+    are in <image_id>/, and the "repositories" file names the tags. Other
+    metadata files, such as the export manifest, are added too, as docker
+    ignores files at the top that it does not know.
+
+    A volume's "repositories" file only names the tags of the images in the
+    volume, because docker cannot tag an image that it has not loaded. The
+    tags of images that are not in the export at all are in the last volume.
+    """
+
+    # docker loads an image's parent before the image, so parents must not be
+    # in a later volume
+    ancestry = True
+    version = '1.0'
+
+    def __init__(self, working_dir, registry_id, tags, images, metadata_files=(),
+                 buffer_size=tarstream.COPY_BUFFER_SIZE, workers=threads.DEFAULT_WORKERS):
+        """
+        :param working_dir: full path to the working directory holding the
+                            metadata files
+        :type  working_dir: str
+        :param registry_id: name of the repository as docker should know it
+        :type  registry_id: basestring
+        :param tags:        dictionary where keys are tag names and values are
+                            image IDs
+        :type  tags:        dict
+        :param images:      every image in the export
+        :type  images:      list of pulp_docker.plugins.distributors.volumes.ExportImage
+        :param metadata_files:  names of files in the working directory to add
+        :type  metadata_files:  iterable
+        :param buffer_size: number of bytes to decompress at a time
+        :type  buffer_size: int
+        :param workers:     number of layers that add_images decompresses at
+                            the same time
+        :type  workers:     int
+        """
+        self.working_dir = working_dir
+        self.registry_id = registry_id
+        self.tags = tags
+        self.exported_ids = set(image.image_id for image in images)
+        self.metadata_files = metadata_files
+        self.buffer_size = buffer_size
+        self.workers = workers
+        # keys are image IDs, values are the sizes of their uncompressed layers
+        self.layer_sizes = {}
+
+    def get_image_size(self, image):
+        """
+        Calculate how many bytes the image's files take in a tar file. The size
+        of the image's uncompressed layer is kept for add_image.
+
+        :param image:   image to export
+        :type  image:   pulp_docker.plugins.distributors.volumes.ExportImage
+
+        :return:    number of bytes the image's files take in a tar file
+        :rtype:     int
+        """
+        layer_size = get_layer_size(os.path.join(image.storage_path, 'layer'), self.buffer_size)
+        self.layer_sizes[image.image_id] = layer_size
+        json_size = os.path.getsize(os.path.join(image.storage_path, 'json'))
+        return tarstream.get_member_size(0, image.image_id, tarfile.DIRTYPE) + \
+            tarstream.get_member_size(len(self.version), '%s/VERSION' % image.image_id) + \
+            tarstream.get_member_size(json_size, '%s/json' % image.image_id) + \
+            tarstream.get_member_size(layer_size, '%s/layer.tar' % image.image_id)
+
+    def add_image(self, writer, image):
+        """
+        :param writer:  tar file to add the image's files to
+        :type  writer:  pulp_docker.plugins.distributors.tarstream.TarStreamWriter
+        :param image:   image to export, whose size has been calculated
+        :type  image:   pulp_docker.plugins.distributors.volumes.ExportImage
+        """
+        with contextlib.closing(open_layer(os.path.join(image.storage_path, 'layer'))) as layer:
+            self._add_files(writer, image, layer)
+
+    def add_images(self, writer, images):
+        """
+        Add the images' files in order, while the layers of the next few images
+        are decompressed in other threads. Only a few buffers of each layer are
+        decompressed ahead of the writer, so memory use is bounded.
+
+        :param writer:  tar file to add the images' files to
+        :type  writer:  pulp_docker.plugins.distributors.tarstream.TarStreamWriter
+        :param images:  images to export, in order, whose sizes have been calculated
+        :type  images:  list of pulp_docker.plugins.distributors.volumes.ExportImage
+        """
+        layers = [LayerReader(os.path.join(image.storage_path, 'layer'), self.buffer_size)
+                  for image in images]
+        pool = threads.WorkerPool(LayerReader.decompress, self.workers)
+        pool.start()
+        try:
+            for index, image in enumerate(images):
+                # keep every thread busy with the layers that are needed next
+                for layer in layers[index:index + self.workers]:
+                    if not layer.started:
+                        layer.started = True
+                        pool.add(layer)
+                self._add_files(writer, image, layers[index])
+                layers[index].close()
+        finally:
+            # any layers that are still being decompressed are not needed
+            for layer in layers:
+                layer.close()
+            pool.join()
+
+    def _add_files(self, writer, image, layer):
+        """
+        :param writer:  tar file to add the image's files to
+        :type  writer:  pulp_docker.plugins.distributors.tarstream.TarStreamWriter
+        :param image:   image to export, whose size has been calculated
+        :type  image:   pulp_docker.plugins.distributors.volumes.ExportImage
+        :param layer:   file object that reads the image's uncompressed layer
+        :type  layer:   file
+        """
+        writer.add_directory(image.image_id)
+        writer.add_data('%s/VERSION' % image.image_id, self.version)
+        writer.add_file('%s/json' % image.image_id, os.path.join(image.storage_path, 'json'))
+        writer.add_stream('%s/layer.tar' % image.image_id, layer,
+                          self.layer_sizes[image.image_id])
+
+    def get_metadata_size(self, exclude):
+        """
+        :param exclude: full paths in the working directory that are not added
+        :type  exclude: list
+
+        :return:    the most bytes that add_metadata adds to a tar file
+        :rtype:     int
+        """
+        size = tarstream.get_member_size(len(self.get_repositories(self.tags)), 'repositories')
+        for file_name in self.metadata_files:
+            path = os.path.join(self.working_dir, file_name)
+            size += tarstream.get_member_size(os.path.getsize(path), file_name)
+        return size
+
+    def add_metadata(self, writer, images, last, exclude):
+        """
+        :param writer:  tar file to add the metadata files to
+        :type  writer:  pulp_docker.plugins.distributors.tarstream.TarStreamWriter
+        :param images:  images in the tar file
+        :type  images:  list of pulp_docker.plugins.distributors.volumes.ExportImage
+        :param last:    True if this is the last tar file of the export
+        :type  last:    bool
+        :param exclude: full paths in the working directory that must not be added
+        :type  exclude: list
+        """
+        image_ids = set(image.image_id for image in images)
+        tags = dict((tag, image_id) for tag, image_id in self.tags.iteritems()
+                    if image_id in image_ids or (last and image_id not in self.exported_ids))
+        writer.add_data('repositories', self.get_repositories(tags))
+        for file_name in self.metadata_files:
+            writer.add_file(file_name, os.path.join(self.working_dir, file_name))
+
+    def get_repositories(self, tags):
+        """
+        :param tags:    dictionary where keys are tag names and values are image IDs
+        :type  tags:    dict
+
+        :return:    content of the "repositories" file naming the given tags
+        :rtype:     str
+        """
+        if not tags:
+            return json.dumps({})
+        return json.dumps({self.registry_id: tags})
+
+
+class LayerReader(object):
+    """
+    Reads an image's uncompressed layer, which another thread decompresses
+    ahead of the reader by calling "decompress". At most LAYER_QUEUE_DEPTH
+    buffers are held, and decompressing stops once the reader is closed.
+    """
+
+    def __init__(self, path, buffer_size=tarstream.COPY_BUFFER_SIZE):
+        """
+        :param path:        full path to the layer
+        :type  path:        str
+        :param buffer_size: number of bytes to decompress at a time
+        :type  buffer_size: int
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self.started = False
+        self._queue = Queue.Queue(maxsize=LAYER_QUEUE_DEPTH)
+        self._closed = threading.Event()
+        self._data = ''
+        self._done = False
+
+    def decompress(self):
+        """
+        Decompress the layer into the queue, followed by an empty string. If
+        that fails, the exception is queued instead, for "read" to raise.
+        """
+        try:
+            with contextlib.closing(open_layer(self.path)) as layer:
+                while True:
+                    data = layer.read(self.buffer_size)
+                    if not self._put(data) or not data:
+                        return
+        except Exception:
+            self._put(sys.exc_info())
+
+    def read(self, size):
+        """
+        :param size:    largest number of bytes to return
+        :type  size:    int
+
+        :return:    the next bytes of the uncompressed layer, which are an empty
+                    string at the end of the layer
+        :rtype:     str
+        """
+        if not self._data and not self._done:
+            item = self._queue.get()
+            if isinstance(item, tuple):
+                self._done = True
+                raise item[0], item[1], item[2]
+            self._data = item
+            self._done = not item
+        data, self._data = self._data[:size], self._data[size:]
+        return data
+
+    def close(self):
+        """
+        Stop decompressing the layer.
+        """
+        self._closed.set()
+
+    def _put(self, item):
+        """
+        :param item:    decompressed data, or the information of an exception
+        :type  item:    str or tuple
+
+        :return:    False if the reader was closed before there was room for the item
+        :rtype:     bool
+        """
+        while not self._closed.isSet():
+            try:
+                self._queue.put(item, timeout=LAYER_QUEUE_TIMEOUT)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+
+def get_layer_size(path, buffer_size=tarstream.COPY_BUFFER_SIZE):
+    """
+    Find the size of an image's uncompressed layer. The size of a small
+    compressed layer is read from its gzip trailer. Any other compressed layer
+    is decompressed to measure it.
+
+    :param path:        full path to the layer
+    :type  path:        str
+    :param buffer_size: number of bytes to decompress at a time, if the layer
+                        has to be decompressed
+    :type  buffer_size: int
+
+    :return:    number of bytes in the uncompressed layer
+    :rtype:     int
+    """
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as layer_file:
+        if layer_file.read(len(GZIP_MAGIC)) != GZIP_MAGIC:
+            return file_size
+        isize_length = struct.calcsize(GZIP_ISIZE_FORMAT)
+        layer_file.seek(-isize_length, os.SEEK_END)
+        isize = struct.unpack(GZIP_ISIZE_FORMAT, layer_file.read(isize_length))[0]
+    # The trailer only counts the last member of the file, modulo 4 GiB, so it
+    # is only used if the layer is too small to have wrapped around. A tar file
+    # does not get larger when it is compressed, so a layer that seems to have
+    # done so is made of several members.
+    if file_size * GZIP_MAX_RATIO < GZIP_ISIZE_LIMIT and isize >= file_size:
+        return isize
+
+    layer_size = 0
+    with contextlib.closing(open_layer(path)) as layer:
+        while True:
+            data = layer.read(buffer_size)
+            if not data:
+                break
+            layer_size += len(data)
+    return layer_size
+
+
+def open_layer(path):
+    """
+    Open an image's layer for reading, decompressing it if it is compressed
+
+    :param path:    full path to the layer
+    :type  path:    str
+
+    :return:    file object that reads the uncompressed layer
+    :rtype:     file or gzip.GzipFile
+    """
+    with open(path, 'rb') as layer_file:
+        magic = layer_file.read(len(GZIP_MAGIC))
+    if magic == GZIP_MAGIC:
+        return gzip.GzipFile(path, 'rb')
+    return open(path, 'rb')
@@ -0,0 +1,70 @@
+import errno
+import logging
+import os
+
+from pulp_docker.plugins import threads
+
+
+_LOG = logging.getLogger(__name__)
+
+# number of threads that create links if none is specified
+DEFAULT_WORKERS = 8
+
+
+def link_image(source_dir, target_dir, file_names):
+    """
+    Create a directory for one image and link each of the image's files into it.
+
+    :param source_dir:  full path to the directory holding the image's files
+    :type  source_dir:  str
+    :param target_dir:  full path to the directory in which to create the links
+    :type  target_dir:  str
+    :param file_names:  names of the files to link
+    :type  file_names:  list
+    """
+    try:
+        os.makedirs(target_dir, 0770)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+    for file_name in file_names:
+        os.symlink(os.path.join(source_dir, file_name), os.path.join(target_dir, file_name))
+
+
+class LinkBuilder(threads.WorkerPool):
+    """
+    Creates the links for images in a bounded number of threads, so that the
+    latency of each filesystem operation, which can be high on network
+    filesystems, is not paid once per link in series. Images are queued with
+    "add", which blocks if the threads have fallen too far behind.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        """
+        :param workers: number of threads that create links
+        :type  workers: int
+        """
+        super(LinkBuilder, self).__init__(link_image, workers)
+        self.images = 0
+
+    def add(self, source_dir, target_dir, file_names):
+        """
+        Queue the links for one image. If creating any earlier link failed, its
+        exception is raised instead.
+
+        :param source_dir:  full path to the directory holding the image's files
+        :type  source_dir:  str
+        :param target_dir:  full path to the directory in which to create the links
+        :type  target_dir:  str
+        :param file_names:  names of the files to link
+        :type  file_names:  list
+        """
+        super(LinkBuilder, self).add(source_dir, target_dir, file_names)
+        self.images += 1
+
+    def join(self):
+        """
+        Wait for every queued image to be linked, then stop the threads.
+        """
+        super(LinkBuilder, self).join()
+        _LOG.debug('linked %d images using %d threads' % (self.images, self.workers))
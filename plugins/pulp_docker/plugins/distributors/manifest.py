@@ -0,0 +1,151 @@
+import json
+import os
+
+from pulp.common import dateutils
+
+
+# name of the manifest within the exported tar file
+MANIFEST_FILE = 'export-manifest.json'
+MANIFEST_TYPE = 'pulp-docker-export-manifest'
+MANIFEST_VERSION = 1
+
+
+class ExportManifest(object):
+    """
+    Describes the images and tags in an export. Every manifest lists all of the
+    repository's images and tags, so that it can be the base of a later delta
+    export. A delta export only contains the files of images that are not in
+    its base manifest or that were added to the repository after a given time,
+    and its manifest also lists what was added and removed since the base.
+    """
+
+    def __init__(self, repo_id, base_path=None, since=None):
+        """
+        :param repo_id:     ID of the repository being exported
+        :type  repo_id:     basestring
+        :param base_path:   full path to the manifest of a previous export, or
+                            None if it should not be used
+        :type  base_path:   str or NoneType
+        :param since:       only images added to the repository at or after this
+                            time are exported, or None for no limit
+        :type  since:       datetime.datetime or NoneType
+        """
+        self.repo_id = repo_id
+        self.base_path = base_path
+        self.since = since
+        self.base = None
+        # keys are image IDs, values are checksums
+        self.images = {}
+        # IDs of the images whose files are in the export
+        self.exported_ids = set()
+        self.tags = {}
+        # names of the export's tar files, which are only known once the
+        # manifest inside them has been written
+        self.files = None
+        self.created = dateutils.now_utc_datetime_with_tzinfo()
+
+    @property
+    def is_delta(self):
+        return self.base_path is not None or self.since is not None
+
+    def load_base(self):
+        """
+        Read the base manifest, if there is one
+
+        :raises ValueError: if the base manifest is not an export manifest
+        """
+        if self.base_path is None:
+            return
+        with open(self.base_path) as base_file:
+            self.base = json.load(base_file)
+        if not isinstance(self.base, dict) or self.base.get('type') != MANIFEST_TYPE:
+            raise ValueError('%s is not an export manifest' % self.base_path)
+
+    def add_unit(self, unit):
+        """
+        Record that an image is in the repository, and decide whether its files
+        need to be exported
+
+        :param unit:    image unit
+        :type  unit:    pulp.plugins.model.AssociatedUnit
+
+        :return:    True if the image's files should be exported
+        :rtype:     bool
+        """
+        image_id = unit.unit_key['image_id']
+        self.images[image_id] = unit.metadata.get('checksum')
+        if self.base is not None and image_id in self.base['images']:
+            return False
+        if self.since is not None and unit.created and \
+                dateutils.to_utc_datetime(dateutils.parse_iso8601_datetime(unit.created),
+                                          no_tz_equals_local_tz=False) < self.since:
+            return False
+        self.exported_ids.add(image_id)
+        return True
+
+    def to_dict(self):
+        """
+        :return:    json-serializable representation of the manifest
+        :rtype:     dict
+        """
+        data = {
+            'type': MANIFEST_TYPE,
+            'version': MANIFEST_VERSION,
+            'repository': self.repo_id,
+            'created': dateutils.format_iso8601_datetime(self.created),
+            'images': self.images,
+            'tags': self.tags,
+            'delta': None,
+        }
+        if self.is_delta:
+            base_images = self.base['images'] if self.base else {}
+            base_tags = self.base['tags'] if self.base else {}
+            data['delta'] = {
+                'base': self.base['created'] if self.base else None,
+                'since': dateutils.format_iso8601_datetime(self.since) if self.since else None,
+                'images': sorted(self.exported_ids),
+                'removed-images': sorted(set(base_images) - set(self.images)),
+                'tags': dict((tag, image_id) for tag, image_id in self.tags.iteritems()
+                             if base_tags.get(tag) != image_id),
+                'removed-tags': sorted(set(base_tags) - set(self.tags)),
+            }
+        if self.files is not None:
+            data['files'] = self.files
+        return data
+
+    def write(self, path):
+        """
+        Save the manifest
+
+        :param path:    full path to the file to write
+        :type  path:    str
+        """
+        with open(path, 'w') as manifest_file:
+            json.dump(self.to_dict(), manifest_file, sort_keys=True)
+
+
+def get_published_files(path):
+    """
+    Get the names of the tar files that a previously published manifest lists.
+
+    :param path:    full path to the manifest that was saved next to an export
+    :type  path:    str
+
+    :return:    full paths to the tar files in the same directory as the
+                manifest, which is empty if there is no manifest or it does not
+                list its files
+    :rtype:     list of str
+    """
+    try:
+        with open(path) as manifest_file:
+            data = json.load(manifest_file)
+    except (IOError, ValueError):
+        return []
+    if not isinstance(data, dict) or data.get('type') != MANIFEST_TYPE:
+        return []
+    export_dir = os.path.dirname(path)
+    # only names of files in the export directory, so that a damaged manifest
+    # cannot cause anything else to be removed
+    names = [name for name in data.get('files') or [] if isinstance(name, basestring)]
+    return [os.path.join(export_dir, name) for name in names
+            if name == os.path.basename(name) and name not in (os.curdir, os.pardir)]
@@ -1,3 +1,6 @@
+import contextlib
+import gzip
+import hashlib
 import logging
 import os
 
@@ -10,13 +13,27 @@ from pulp_docker.plugins.distributors import configuration
 
 _LOG = logging.getLogger(__name__)
 
+# directory in the published web tree that holds static responses to docker
+# registry API calls
+V1_API_DIRECTORY = 'v1'
+# a directory can not also be a file, so the response for a repository's tags
+# is saved under this name in the directory that holds each tag's response. The
+# web server serves it as that directory's index.
+TAGS_INDEX_FILE = 'index.json'
+# name of the compressed file, in the redirect shard directory, that holds all
+# of the redirect data in the version 1 format
+REDIRECT_FULL_FILE = 'full.json.gz'
+# number of leading hex digits of the md5 digest of an image ID or tag name
+# that select the shard it is stored in
+SHARD_PREFIX_LENGTH = 1
+
 
 class RedirectFileContext(JSONArrayFileContext):
     """
     Context manager for generating the docker images file.
     """
 
-    def __init__(self, working_dir, conduit, config, repo):
+    def __init__(self, working_dir, conduit, config, repo, file_name=None):
         """
         :param working_dir: working directory to create the filelists.xml.gz in
         :type  working_dir: str
@@ -26,11 +43,14 @@ class RedirectFileContext(JSONArrayFileContext):
         :type  config: pulp.plugins.config.PluginCallConfiguration
         :param repo: Pulp managed repository
         :type  repo: pulp.plugins.model.Repository
+        :param file_name: name of the file to write, which is compressed if it
+                          ends with ".gz". Defaults to the redirect file name.
+        :type  file_name: str
         """
 
         self.repo_id = repo.id
-        metadata_file_path = os.path.join(working_dir,
-                                          configuration.get_redirect_file_name(repo))
+        file_name = file_name or configuration.get_redirect_file_name(repo)
+        metadata_file_path = os.path.join(working_dir, file_name)
         super(RedirectFileContext, self).__init__(metadata_file_path)
         scratchpad = conduit.get_repo_scratchpad()
 
@@ -45,6 +65,8 @@ class RedirectFileContext(JSONArrayFileContext):
         else:
             self.protected = "false"
 
+        self.extended = configuration.get_extended_redirect(config)
+
     def _write_file_header(self):
         """
         Write out the beginning of the json file
@@ -75,6 +97,13 @@ class RedirectFileContext(JSONArrayFileContext):
         unit_data = {
             'id': image_id
         }
+        if self.extended:
+            # everything a server needs to answer ancestry and HEAD requests
+            # without reading the image's files
+            unit_data['parent'] = unit.metadata.get('parent_id')
+            unit_data['size'] = unit.metadata.get('size')
+            unit_data['layer_size'] = unit.metadata.get('layer_size')
+            unit_data['checksum'] = unit.metadata.get('checksum')
         string_representation = json.dumps(unit_data)
         self.metadata_file_handle.write(string_representation)
 
@@ -95,3 +124,198 @@ class RedirectFileContext(JSONArrayFileContext):
         for tag in tag_list:
             tag_dict[tag[constants.IMAGE_TAG_KEY]] = tag[constants.IMAGE_ID_KEY]
         return tag_dict
+
+
+class ShardedRedirectFileContext(object):
+    """
+    Context manager for generating version 2 of the redirect file, for
+    repositories too large for the whole file to be read on every request. The
+    redirect file itself only holds the repository's details and describes
+    where the rest of the data is. It sits next to a directory that holds:
+
+    - all of the data in the version 1 format, compressed
+    - the image IDs and the tags, each split into compressed shards by the md5
+      digest of the image ID or tag name
+    """
+
+    def __init__(self, working_dir, conduit, config, repo):
+        """
+        :param working_dir: working directory to create the files in
+        :type  working_dir: str
+        :param conduit: The conduit to get api calls
+        :type conduit: pulp.plugins.conduits.repo_publish.RepoPublishConduit
+        :param config: Pulp configuration for the distributor
+        :type  config: pulp.plugins.config.PluginCallConfiguration
+        :param repo: Pulp managed repository
+        :type  repo: pulp.plugins.model.Repository
+        """
+        self.shard_dir_name = configuration.get_redirect_shard_dir_name(repo)
+        self.shard_dir = os.path.join(working_dir, self.shard_dir_name)
+        self.metadata_file_path = os.path.join(working_dir,
+                                               configuration.get_redirect_file_name(repo))
+        self.full_context = RedirectFileContext(self.shard_dir, conduit, config, repo,
+                                                file_name=REDIRECT_FULL_FILE)
+        self.tags = self.full_context.tags
+        self.registry = self.full_context.registry
+        self.image_contexts = {}
+        for prefix in get_shard_prefixes():
+            path = os.path.join(self.shard_dir, 'images', '%s.json.gz' % prefix)
+            self.image_contexts[prefix] = ImageIdsFileContext(path)
+        self.image_count = 0
+
+    def initialize(self):
+        """
+        Open each of the files that images are written to
+        """
+        self.full_context.initialize()
+        for context in self.image_contexts.itervalues():
+            context.initialize()
+
+    def add_unit_metadata(self, unit):
+        """
+        Add the specific metadata for this unit
+
+        :param unit: The docker unit to add to the images metadata file
+        :type unit: pulp.plugins.model.AssociatedUnit
+        """
+        self.full_context.add_unit_metadata(unit)
+        image_id = unit.unit_key['image_id']
+        self.image_contexts[get_shard(image_id)].add_unit_metadata(unit)
+        self.image_count += 1
+
+    def finalize(self):
+        """
+        Close the image files, then write the tag shards and the redirect file
+        """
+        self.full_context.finalize()
+        for context in self.image_contexts.itervalues():
+            context.finalize()
+
+        shards = dict((prefix, {}) for prefix in get_shard_prefixes())
+        for tag, image_id in self.tags.iteritems():
+            shards[get_shard(tag)][tag] = image_id
+        tags_dir = os.path.join(self.shard_dir, 'tags')
+        if not os.path.exists(tags_dir):
+            os.makedirs(tags_dir, 0770)
+        for prefix, tags in shards.iteritems():
+            with contextlib.closing(gzip.open(os.path.join(tags_dir, '%s.json.gz' % prefix),
+                                              'w')) as tags_file:
+                json.dump(tags, tags_file)
+
+        redirect_data = {
+            'type': 'pulp-docker-redirect',
+            'version': 2,
+            'repository': self.full_context.repo_id,
+            'repo-registry-id': self.registry,
+            'url': self.full_context.redirect_url,
+            'protected': self.full_context.protected == 'true',
+            'image-count': self.image_count,
+            'tag-count': len(self.tags),
+            'extended': self.full_context.extended,
+            'full': '%s/%s' % (self.shard_dir_name, REDIRECT_FULL_FILE),
+            'shards': {
+                'hash': 'md5',
+                'prefix-length': SHARD_PREFIX_LENGTH,
+                'images': '%s/images/{prefix}.json.gz' % self.shard_dir_name,
+                'tags': '%s/tags/{prefix}.json.gz' % self.shard_dir_name,
+            },
+        }
+        with open(self.metadata_file_path, 'w') as metadata_file:
+            json.dump(redirect_data, metadata_file)
+
+
+def get_shard_prefixes():
+    """
+    :return: the prefix of every shard, in order
+    :rtype:  list
+    """
+    return ['%0*x' % (SHARD_PREFIX_LENGTH, i) for i in range(16 ** SHARD_PREFIX_LENGTH)]
+
+
+def get_shard(key):
+    """
+    :param key: image ID or tag name
+    :type  key: basestring
+
+    :return: the prefix of the shard that the key is stored in
+    :rtype:  str
+    """
+    return hashlib.md5(key.encode('utf-8')).hexdigest()[:SHARD_PREFIX_LENGTH]
+
+
+class ImageIdsFileContext(JSONArrayFileContext):
+    """
+    Context manager for generating a file that holds a JSON array with an
+    object for each image, containing its ID.
+    """
+
+    def add_unit_metadata(self, unit):
+        """
+        Add the specific metadata for this unit
+
+        :param unit: The docker unit to add to the file
+        :type unit: pulp.plugins.model.AssociatedUnit
+        """
+        super(ImageIdsFileContext, self).add_unit_metadata(unit)
+        self.metadata_file_handle.write(json.dumps({'id': unit.unit_key['image_id']}))
+
+
+class ImagesFileContext(ImageIdsFileContext):
+    """
+    Context manager for generating the static response to the docker registry
+    API call that lists a repository's images.
+    """
+
+    def __init__(self, web_dir, registry_id):
+        """
+        :param web_dir: directory that is published to the web
+        :type  web_dir: str
+        :param registry_id: name of the repository as it is served by the docker API
+        :type  registry_id: str
+        """
+        metadata_file_path = os.path.join(get_repository_api_dir(web_dir, registry_id), 'images')
+        super(ImagesFileContext, self).__init__(metadata_file_path)
+
+
+def get_repository_api_dir(web_dir, registry_id):
+    """
+    :param web_dir: directory that is published to the web
+    :type  web_dir: str
+    :param registry_id: name of the repository as it is served by the docker API
+    :type  registry_id: str
+
+    :return: directory that holds the static API responses for the repository
+    :rtype:  str
+    """
+    return os.path.join(web_dir, V1_API_DIRECTORY, 'repositories', registry_id)
+
+
+def write_api_files(web_dir, registry_id, tags):
+    """
+    Write the static responses to the docker registry API calls for a
+    repository's tags. Each image's ancestry, json and layer are already
+    published at the top of the web directory, and the web server maps
+    v1/images/<image_id>/ to them, so nothing is written for the images. A tag
+    named like the index file is only listed in the index, rather than
+    overwriting it.
+
+    :param web_dir: directory that is published to the web
+    :type  web_dir: str
+    :param registry_id: name of the repository as it is served by the docker API
+    :type  registry_id: str
+    :param tags: dictionary where keys are tag names and values are image IDs
+    :type  tags: dict
+    """
+    tags_dir = os.path.join(get_repository_api_dir(web_dir, registry_id), 'tags')
+    if not os.path.exists(tags_dir):
+        os.makedirs(tags_dir, 0770)
+    with open(os.path.join(tags_dir, TAGS_INDEX_FILE), 'w') as tags_file:
+        json.dump(tags, tags_file)
+    for tag, image_id in tags.iteritems():
+        if tag == TAGS_INDEX_FILE:
+            # its response would replace the index, which is still served in
+            # its place
+            _LOG.warning('tag %s of %s can not be looked up on its own' % (tag, registry_id))
+            continue
+        with open(os.path.join(tags_dir, tag), 'w') as tag_file:
+            json.dump(image_id, tag_file)
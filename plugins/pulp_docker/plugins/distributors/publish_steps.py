@@ -1,13 +1,18 @@
 from gettext import gettext as _
 import logging
 import os
+import shutil
 
 from pulp.plugins.util.publish_step import PublishStep, UnitPublishStep, \
-    AtomicDirectoryPublishStep, SaveTarFilePublishStep
+    AtomicDirectoryPublishStep
 
 from pulp_docker.common import constants
-from pulp_docker.plugins.distributors import configuration
-from pulp_docker.plugins.distributors.metadata import RedirectFileContext
+from pulp_docker.plugins import metrics, threads
+from pulp_docker.plugins.distributors import configuration, fingerprint, layouts, links, \
+    manifest, tarstream, volumes
+from pulp_docker.plugins.distributors import metadata
+from pulp_docker.plugins.distributors.metadata import RedirectFileContext, \
+    ShardedRedirectFileContext
 
 
 _LOG = logging.getLogger(__name__)
@@ -36,14 +41,76 @@ class WebPublisher(PublishStep):
         app_publish_location = os.path.join(configuration.get_app_publish_dir(config), app_file)
         self.web_working_dir = os.path.join(self.get_working_dir(), 'web')
         master_publish_dir = configuration.get_master_publish_dir(repo, config)
-        atomic_publish_step = AtomicDirectoryPublishStep(self.get_working_dir(),
-                                                         [('web', publish_dir),
-                                                          (app_file, app_publish_location)],
-                                                         master_publish_dir,
-                                                         step_type=constants.PUBLISH_STEP_OVER_HTTP)
-        atomic_publish_step.description = _('Making files available via web.')
-        self.add_child(PublishImagesStep())
-        self.add_child(atomic_publish_step)
+        publish_locations = [('web', publish_dir), (app_file, app_publish_location)]
+        if configuration.get_redirect_file_version(config) == 2:
+            shard_dir = configuration.get_redirect_shard_dir_name(repo)
+            publish_locations.append(
+                (shard_dir, os.path.join(configuration.get_app_publish_dir(config), shard_dir)))
+        self.layout = fingerprint.get_publish_layout(repo, config)
+        # directory of the previous publish, if it can be updated in place
+        previous_master_dir = None
+        published_ids = ()
+        if configuration.get_incremental_publish(config):
+            previous_master_dir, published_ids = self._get_previous_publish(publish_locations)
+        self.images_step = PublishImagesStep(previous_master_dir, published_ids)
+        self.add_child(self.images_step)
+        self.add_child(SaveFingerprintStep())
+        if previous_master_dir is not None:
+            self.add_child(UpdatePublishedStep(previous_master_dir))
+        else:
+            atomic_publish_step = AtomicDirectoryPublishStep(
+                self.get_working_dir(), publish_locations, master_publish_dir,
+                step_type=constants.PUBLISH_STEP_OVER_HTTP)
+            atomic_publish_step.description = _('Making files available via web.')
+            self.add_child(atomic_publish_step)
+        self.fingerprint = None
+
+    def _get_previous_publish(self, publish_locations):
+        """
+        Find the previous publish of the repository, if it can be updated in
+        place: it saved its state, it was published with the same layout, and
+        each of the publish locations still links into it.
+
+        :param publish_locations: pairs of the path relative to the master
+                                  directory and the location it is published at
+        :type  publish_locations: list
+
+        :return: full path to the previous publish's master directory and the IDs
+                 of the images it published, or None and an empty tuple
+        :rtype:  tuple
+        """
+        previous_dir = configuration.get_previous_web_dir(self.get_repo(), self.config)
+        if previous_dir is None:
+            return None, ()
+        master_dir = os.path.dirname(previous_dir)
+        state = fingerprint.get_published_state(master_dir)
+        if state is None:
+            return None, ()
+        for key, value in self.layout.iteritems():
+            if state.get(key) != value:
+                return None, ()
+        for relative_path, location in publish_locations:
+            if os.path.realpath(location) != os.path.join(master_dir, relative_path):
+                return None, ()
+        return master_dir, state['images']
+
+    def publish(self):
+        """
+        Publish the repository, unless neither its content nor the configuration
+        that is written to the redirect file has changed since the repository
+        was last published.
+
+        :return: report describing the publish
+        :rtype:  pulp.plugins.model.PublishReport
+        """
+        repo = self.get_repo()
+        self.fingerprint = fingerprint.get_fingerprint(repo, self.get_conduit(), self.config)
+        if not configuration.get_force_publish(self.config) and \
+                self.fingerprint == fingerprint.get_published_fingerprint(repo, self.config):
+            _LOG.info(_('Repository %(repo)s has not changed since it was last published; '
+                        'skipping publish') % {'repo': repo.id})
+            return self.get_conduit().build_success_report({'skipped': True}, {})
+        return super(WebPublisher, self).publish()
 
 
 class ExportPublisher(PublishStep):
@@ -64,9 +131,47 @@ class ExportPublisher(PublishStep):
         super(ExportPublisher, self).__init__(constants.PUBLISH_STEP_EXPORT_PUBLISHER,
                                               repo, publish_conduit, config)
 
-        self.add_child(PublishImagesStep())
-        tar_file = configuration.get_export_repo_file_with_path(repo, config)
-        self.add_child(SaveTarFilePublishStep(self.get_working_dir(), tar_file))
+        self.manifest = manifest.ExportManifest(repo.id,
+                                                configuration.get_export_base_manifest(config),
+                                                configuration.get_export_since(config))
+        # images whose files are to be written to the tar file
+        self.images = []
+        self.add_child(ExportImagesStep())
+        self.add_child(SaveTarFileStep())
+
+    def publish(self):
+        """
+        Export the repository, then report how long each phase took and how
+        many bytes it wrote.
+
+        :return: report describing the publish
+        :rtype:  pulp.plugins.model.PublishReport
+        """
+        self.process_lifecycle()
+        metrics.report_metrics(self, 'export')
+        return self._build_final_report()
+
+
+class SaveFingerprintStep(PublishStep):
+    """
+    Save the fingerprint of what is being published, so that the next publish
+    can be skipped if nothing changes, and the state of the publish, so that
+    the next publish can update it in place.
+    """
+
+    def __init__(self):
+        super(SaveFingerprintStep, self).__init__(constants.PUBLISH_STEP_FINGERPRINT)
+        self.description = _('Saving publish fingerprint.')
+
+    def process_main(self):
+        """
+        Write the parent's fingerprint and the IDs of the images it published to
+        the working directory, which is copied to the master publish directory
+        """
+        if self.parent.fingerprint is not None:
+            fingerprint.save_fingerprint(self.get_working_dir(), self.parent.fingerprint)
+        fingerprint.save_published_state(self.get_working_dir(), self.parent.layout,
+                                         self.parent.images_step.image_ids)
 
 
 class PublishImagesStep(UnitPublishStep):
@@ -74,23 +179,65 @@ class PublishImagesStep(UnitPublishStep):
     Publish Images
     """
 
-    def __init__(self):
+    def __init__(self, previous_master_dir=None, published_ids=()):
+        """
+        :param previous_master_dir: full path to the master directory of a previous
+                                    publish to update in place. If specified, new
+                                    images are linked straight into its web tree,
+                                    and images that it already published are not
+                                    linked again.
+        :type  previous_master_dir: str or NoneType
+        :param published_ids:       IDs of the images the previous publish published
+        :type  published_ids:       iterable
+        """
         super(PublishImagesStep, self).__init__(constants.PUBLISH_STEP_IMAGES,
                                                 constants.IMAGE_TYPE_ID)
         self.context = None
         self.redirect_context = None
+        self.images_context = None
         self.description = _('Publishing Image Files.')
+        self.link_builder = None
+        self.previous_master_dir = previous_master_dir
+        self.published_ids = set(published_ids)
+        # IDs of the images that this publish publishes
+        self.image_ids = set()
 
     def initialize(self):
         """
         Initialize the metadata contexts
         """
-        self.redirect_context = RedirectFileContext(self.get_working_dir(),
-                                                    self.get_conduit(),
-                                                    self.parent.config,
-                                                    self.get_repo())
+        working_dir = self.get_working_dir()
+        if self.previous_master_dir is not None and os.path.exists(working_dir):
+            # every file in the working directory replaces the published one,
+            # so nothing may be left from an earlier publish that failed
+            shutil.rmtree(working_dir)
+        if configuration.get_redirect_file_version(self.parent.config) == 2:
+            context_class = ShardedRedirectFileContext
+        else:
+            context_class = RedirectFileContext
+        self.redirect_context = context_class(working_dir,
+                                              self.get_conduit(),
+                                              self.parent.config,
+                                              self.get_repo())
         self.redirect_context.initialize()
 
+        self.images_context = metadata.ImagesFileContext(self.get_web_directory(),
+                                                         self.redirect_context.registry)
+        self.images_context.initialize()
+
+    def process_main(self):
+        """
+        Process each unit while the links are created in other threads
+        """
+        self.link_builder = links.LinkBuilder()
+        self.link_builder.start()
+        try:
+            super(PublishImagesStep, self).process_main()
+        finally:
+            # no thread may be left writing to the working directory
+            self.link_builder.join()
+        self.link_builder.check()
+
     def process_unit(self, unit):
         """
         Link the unit to the image content directory and the package_dir
@@ -99,21 +246,285 @@ class PublishImagesStep(UnitPublishStep):
         :type unit: pulp_docker.common.models.DockerImage
         """
         self.redirect_context.add_unit_metadata(unit)
-        target_base = os.path.join(self.get_web_directory(), unit.unit_key['image_id'])
+        self.images_context.add_unit_metadata(unit)
+        image_id = unit.unit_key['image_id']
+        self.image_ids.add(image_id)
+        if image_id in self.published_ids:
+            # already linked by the previous publish
+            return
+        if self.previous_master_dir is None:
+            target_base = os.path.join(self.get_web_directory(), image_id)
+        else:
+            # no published metadata refers to the image until the metadata files
+            # are replaced, so it can be linked straight into the published tree
+            target_base = os.path.join(self.previous_master_dir, 'web', image_id)
+            if os.path.lexists(target_base):
+                # left by a publish that failed
+                shutil.rmtree(target_base)
         files = ['ancestry', 'json', 'layer']
-        for file_name in files:
-            self._create_symlink(os.path.join(unit.storage_path, file_name),
-                                 os.path.join(target_base, file_name))
+        if self.link_builder is None:
+            links.link_image(unit.storage_path, target_base, files)
+        else:
+            self.link_builder.add(unit.storage_path, target_base, files)
 
     def finalize(self):
         """
-        Close & finalize each the metadata context
+        Close & finalize each the metadata context, and write the static API
+        files for the repository's tags
         """
         if self.redirect_context:
             self.redirect_context.finalize()
+        if self.images_context:
+            self.images_context.finalize()
+            metadata.write_api_files(self.get_web_directory(), self.redirect_context.registry,
+                                     self.redirect_context.tags)
 
     def get_web_directory(self):
         """
         Get the directory where the files published to the web have been linked
         """
         return os.path.join(self.get_working_dir(), 'web')
+
+
+class UpdatePublishedStep(PublishStep):
+    """
+    Update a previous publish in place with the files in the working directory.
+    The images that are new have already been linked into the published tree,
+    so only the metadata files are moved into it, each replacing the published
+    file with a rename. Then the images that are no longer in the repository
+    are removed, and the state of the publish is saved last, so that a publish
+    that fails part way is updated again in full by the next one.
+    """
+
+    def __init__(self, master_dir):
+        """
+        :param master_dir: full path to the master directory of the publish to update
+        :type  master_dir: str
+        """
+        super(UpdatePublishedStep, self).__init__(constants.PUBLISH_STEP_OVER_HTTP)
+        self.description = _('Making files available via web.')
+        self.master_dir = master_dir
+
+    def process_main(self):
+        """
+        Move the metadata files into the published tree, remove the metadata
+        files and images that are no longer published, then save the state
+        """
+        working_dir = self.get_working_dir()
+        state_files = (fingerprint.FINGERPRINT_FILE, fingerprint.PUBLISHED_STATE_FILE)
+        web_dir = os.path.join(self.master_dir, 'web')
+        for source_dir, dir_names, file_names in os.walk(working_dir):
+            relative_dir = os.path.relpath(source_dir, working_dir)
+            target_dir = os.path.normpath(os.path.join(self.master_dir, relative_dir))
+            if not os.path.isdir(target_dir):
+                os.makedirs(target_dir)
+            for file_name in file_names:
+                if relative_dir != os.curdir or file_name not in state_files:
+                    os.rename(os.path.join(source_dir, file_name),
+                              os.path.join(target_dir, file_name))
+            if target_dir in (self.master_dir, web_dir):
+                # these also hold images and the state, which are handled below
+                continue
+            for name in set(os.listdir(target_dir)) - set(dir_names) - set(file_names):
+                _remove(os.path.join(target_dir, name))
+
+        image_ids = self.parent.images_step.image_ids
+        for name in os.listdir(web_dir):
+            if name != metadata.V1_API_DIRECTORY and name not in image_ids:
+                _remove(os.path.join(web_dir, name))
+
+        for file_name in state_files:
+            source_path = os.path.join(working_dir, file_name)
+            if os.path.exists(source_path):
+                os.rename(source_path, os.path.join(self.master_dir, file_name))
+        # only the directories are left
+        shutil.rmtree(working_dir)
+        os.makedirs(working_dir)
+
+
+def _remove(path):
+    """
+    Remove a file, link or directory tree.
+
+    :param path: full path to remove
+    :type  path: str
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+class ExportImagesStep(metrics.TimedStepMixin, PublishImagesStep):
+    """
+    Write the metadata files to the working directory as they are when
+    publishing to the web, and collect the images whose files are to be
+    exported. Nothing is linked into the working directory; the files are
+    copied straight from where they are stored when the tar file is written.
+    For a delta export, only the images that the parent's manifest selects are
+    collected.
+    """
+
+    def initialize(self):
+        """
+        Clear the working directory and read the base manifest, then
+        initialize the metadata contexts
+        """
+        # everything in the working directory is added to the tar file, so
+        # nothing may be left from an earlier export that failed
+        working_dir = self.get_working_dir()
+        if os.path.exists(working_dir):
+            shutil.rmtree(working_dir)
+        os.makedirs(working_dir)
+        self.parent.manifest.load_base()
+        super(ExportImagesStep, self).initialize()
+        self.parent.manifest.tags = self.redirect_context.tags
+
+    def process_main(self):
+        """
+        Process each unit. Nothing is linked, so no threads are needed.
+        """
+        super(PublishImagesStep, self).process_main()
+
+    def process_unit(self, unit):
+        """
+        Add the unit to the metadata files, and to the images to export unless
+        it is in the base of a delta export
+
+        :param unit: The unit to process
+        :type unit: pulp_docker.common.models.DockerImage
+        """
+        self.redirect_context.add_unit_metadata(unit)
+        self.images_context.add_unit_metadata(unit)
+        if not self.parent.manifest.add_unit(unit):
+            return
+        self.parent.images.append(volumes.ExportImage(unit.unit_key['image_id'],
+                                                      unit.metadata.get('parent_id'),
+                                                      unit.storage_path))
+        self.metrics.units += 1
+
+
+class SaveTarFileStep(metrics.TimedStepMixin, PublishStep):
+    """
+    Write the parent's manifest, then write the tar file in a single pass,
+    copying each image's files from where they are stored and the metadata
+    files from the working directory. If a volume size is configured, the
+    images are divided among as many tar files as are needed, which are written
+    concurrently. Each volume holds the metadata files and an index of the
+    images it contains, so that it can be used on its own.
+
+    The files are laid out for crane, or as "docker save" does if that format
+    is configured. A docker save export has the images' layers uncompressed;
+    their sizes are found before any tar file is written, because a file's
+    size is needed for its header, and the next few layers are decompressed
+    concurrently while each tar file is written. Its
+    volumes must be loaded in order, as an image's parent is never in a later
+    volume.
+
+    A copy of the manifest is published next to the tar file, to be the base of
+    a later delta export.
+    """
+
+    def __init__(self):
+        super(SaveTarFileStep, self).__init__(constants.PUBLISH_STEP_TAR)
+        self.description = _('Saving tar file.')
+        self.layout = None
+        # the tar files, written in the working directory and moved into place
+        # once they are complete
+        self.writers = []
+
+    def process_main(self):
+        """
+        Write the tar files and publish them along with the manifest, which
+        lists them, then remove the files that the previous export's manifest
+        lists and that were not replaced
+        """
+        repo = self.get_repo()
+        config = self.parent.config
+        working_dir = self.get_working_dir()
+        manifest_path = os.path.join(working_dir, manifest.MANIFEST_FILE)
+        self.parent.manifest.write(manifest_path)
+
+        images = self.parent.images
+        if configuration.get_export_format(config) == constants.EXPORT_FORMAT_DOCKER_SAVE:
+            self.layout = layouts.DockerSaveLayout(
+                working_dir, configuration.get_repo_registry_id(repo, config),
+                self.parent.manifest.tags, images, metadata_files=[manifest.MANIFEST_FILE])
+        else:
+            self.layout = layouts.CraneLayout(working_dir)
+        threads.run(self._set_size, images, workers=volumes.DEFAULT_WORKERS)
+
+        volume_size = configuration.get_export_volume_size(config)
+        if volume_size is None:
+            publish_files = [configuration.get_export_repo_file_with_path(repo, config)]
+            contents = [(images, None)]
+        else:
+            # every volume holds the metadata files, its index and the end of
+            # archive marker as well as its images. The images' entries in the
+            # index are counted in their sizes, but may add a block of padding.
+            index_size = len(volumes.get_index(repo.id, len(images), len(images), []))
+            reserved = self.layout.get_metadata_size([]) + tarstream.END_SIZE + \
+                tarstream.get_member_size(index_size, volumes.VOLUME_INDEX_FILE) + \
+                tarstream.get_member_size(0)
+            plan = volumes.plan_volumes(images, volume_size - reserved,
+                                        ancestry=self.layout.ancestry) or [[]]
+            publish_files = [configuration.get_export_volume_file_with_path(repo, config, i + 1)
+                             for i in range(len(plan))]
+            contents = [(volume_images,
+                         volumes.get_index(repo.id, i + 1, len(plan), volume_images))
+                        for i, volume_images in enumerate(plan)]
+
+        self.writers = [tarstream.TarStreamWriter(os.path.join(working_dir, os.path.basename(path)))
+                        for path in publish_files]
+        last = len(self.writers) - 1
+        threads.run(self._write, [(writer, volume_images, index, i == last)
+                                  for i, (writer, (volume_images, index))
+                                  in enumerate(zip(self.writers, contents))],
+                    workers=volumes.DEFAULT_WORKERS)
+        self.metrics.bytes = sum(writer.bytes_written for writer in self.writers)
+
+        published_manifest_path = configuration.get_export_manifest_file_with_path(repo, config)
+        # only files that an earlier export of this repository wrote are removed
+        stale_files = manifest.get_published_files(published_manifest_path)
+        for writer, publish_file in zip(self.writers, publish_files):
+            publish_dir = os.path.dirname(publish_file)
+            if not os.path.exists(publish_dir):
+                os.makedirs(publish_dir, 0750)
+            # a rename when the working directory is on the same filesystem
+            shutil.move(writer.path, publish_file)
+        self.parent.manifest.files = [os.path.basename(path) for path in publish_files]
+        self.parent.manifest.write(published_manifest_path)
+
+        for path in stale_files:
+            if path not in publish_files and os.path.exists(path):
+                os.unlink(path)
+
+    def _set_size(self, image):
+        """
+        Calculate how many bytes an image takes in a volume
+
+        :param image: image to export
+        :type  image: pulp_docker.plugins.distributors.volumes.ExportImage
+        """
+        # the image's entry in a volume's index is its quoted ID and a separator
+        image.size = self.layout.get_image_size(image) + len(image.image_id) + 4
+
+    def _write(self, job):
+        """
+        Write one tar file. The job is a tuple of the tar file to write, the
+        images whose files are to be written to it, the content of the volume's
+        index, which is None if the export is not split into volumes, and
+        whether it is the last tar file of the export.
+
+        :param job: tar file, images, index and whether it is the last
+        :type  job: tuple
+        """
+        writer, images, index, last = job
+        writer.open()
+        self.layout.add_images(writer, images)
+        if index is not None:
+            writer.add_data(volumes.VOLUME_INDEX_FILE, index)
+        # the other tar files are being written to the working directory too
+        self.layout.add_metadata(writer, images, last,
+                                 [other.path for other in self.writers])
+        writer.close()
@@ -0,0 +1,296 @@
+import os
+import stat
+import tarfile
+import time
+
+
+# number of bytes read from a source file and written to the archive at a time
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+# the most that closing an archive can add to it: the end of archive marker,
+# then padding to a whole number of records
+END_SIZE = tarfile.BLOCKSIZE * 2 + tarfile.RECORDSIZE
+
+
+def get_header_size(name, member_type=tarfile.REGTYPE, linkname=''):
+    """
+    :param name:        path of a member within an archive
+    :type  name:        str
+    :param member_type: type of the member, such as tarfile.DIRTYPE
+    :type  member_type: str
+    :param linkname:    path that the member points to, if it is a link
+    :type  linkname:    str
+
+    :return:    number of bytes the member's header takes in an archive that
+                TarStreamWriter writes. A name or link name that does not fit
+                in one header block takes extra GNU longname blocks.
+    :rtype:     int
+    """
+    # a directory's name is written with a trailing slash
+    if len(name) < tarfile.LENGTH_NAME and len(linkname) <= tarfile.LENGTH_LINK:
+        return tarfile.BLOCKSIZE
+    info = tarfile.TarInfo(name)
+    info.type = member_type
+    info.linkname = linkname
+    return len(info.tobuf(tarfile.GNU_FORMAT))
+
+
+def get_member_size(size, name='', member_type=tarfile.REGTYPE, linkname=''):
+    """
+    :param size:        number of bytes of content in a member of an archive
+    :type  size:        int
+    :param name:        path of the member within the archive
+    :type  name:        str
+    :param member_type: type of the member, such as tarfile.DIRTYPE
+    :type  member_type: str
+    :param linkname:    path that the member points to, if it is a link
+    :type  linkname:    str
+
+    :return:    number of bytes the member takes in the archive, including its
+                header and padding
+    :rtype:     int
+    """
+    blocks = (size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE
+    return get_header_size(name, member_type, linkname) + tarfile.BLOCKSIZE * blocks
+
+
+def get_tree_size(source_dir, exclude=(), arcname=''):
+    """
+    :param source_dir:  full path to a directory
+    :type  source_dir:  str
+    :param exclude:     full paths to files or directories that would not be added
+    :type  exclude:     collection
+    :param arcname:     path of the directory within the archive, as it would
+                        be passed to TarStreamWriter.add_tree
+    :type  arcname:     str
+
+    :return:    number of bytes that TarStreamWriter.add_tree would add to an
+                archive for the directory's contents
+    :rtype:     int
+    """
+    size = 0
+    if arcname:
+        size += get_member_size(0, arcname, tarfile.DIRTYPE)
+    for name in os.listdir(source_dir):
+        path = os.path.join(source_dir, name)
+        if path in exclude:
+            continue
+        member_name = '%s/%s' % (arcname, name) if arcname else name
+        if os.path.islink(path):
+            size += get_member_size(0, member_name, tarfile.SYMTYPE, os.readlink(path))
+        elif os.path.isdir(path):
+            size += get_tree_size(path, exclude, member_name)
+        else:
+            size += get_member_size(os.path.getsize(path), member_name)
+    return size
+
+
+class TarStreamWriter(object):
+    """
+    Writes a tar file in a single pass, copying the content of each member
+    straight from the file it is stored in. Unlike tarfile.TarFile, nothing has
+    to be arranged on the filesystem before the archive is written, and content
+    is copied with a buffer large enough for the copy to be limited by disk
+    throughput rather than by the number of system calls.
+    """
+
+    def __init__(self, path, buffer_size=COPY_BUFFER_SIZE):
+        """
+        :param path:        full path to the tar file to write
+        :type  path:        str
+        :param buffer_size: number of bytes to copy at a time
+        :type  buffer_size: int
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        # number of bytes written to the archive, including headers and padding
+        self.bytes_written = 0
+        self.members = 0
+        self._file = None
+
+    def open(self):
+        """
+        Create the tar file, replacing any file that already exists at its path
+        """
+        parent_dir = os.path.dirname(self.path)
+        if parent_dir and not os.path.exists(parent_dir):
+            os.makedirs(parent_dir, 0750)
+        self._file = open(self.path, 'wb', self.buffer_size)
+
+    def add_directory(self, name, mtime=None):
+        """
+        Add a directory entry to the archive
+
+        :param name:    path of the directory within the archive
+        :type  name:    str
+        :param mtime:   modification time of the directory, or None for now
+        :type  mtime:   int or NoneType
+        """
+        info = self._make_info(name, tarfile.DIRTYPE, 0755, mtime)
+        self._write_header(info)
+
+    def add_symlink(self, name, target, mtime=None):
+        """
+        Add a symbolic link to the archive. The link is stored as a link rather
+        than as the file it points to.
+
+        :param name:    path of the link within the archive
+        :type  name:    str
+        :param target:  path that the link points to
+        :type  target:  str
+        :param mtime:   modification time of the link, or None for now
+        :type  mtime:   int or NoneType
+        """
+        info = self._make_info(name, tarfile.SYMTYPE, 0777, mtime)
+        info.linkname = target
+        self._write_header(info)
+
+    def add_file(self, name, path):
+        """
+        Add a regular file to the archive, copying its content from the given
+        path. Symbolic links are followed.
+
+        :param name:    path of the file within the archive
+        :type  name:    str
+        :param path:    full path to the file whose content should be added
+        :type  path:    str
+
+        :raises IOError: if the file's size changes while it is being copied
+        """
+        with open(path, 'rb') as source:
+            file_stat = os.fstat(source.fileno())
+            self.add_stream(name, source, file_stat.st_size, stat.S_IMODE(file_stat.st_mode),
+                            int(file_stat.st_mtime))
+
+    def add_stream(self, name, source, size, mode=0644, mtime=None):
+        """
+        Add a regular file to the archive, copying its content from a file
+        object. The size must be known in advance, because it is written in the
+        file's header.
+
+        :param name:    path of the file within the archive
+        :type  name:    str
+        :param source:  file object to read the content from
+        :type  source:  file
+        :param size:    number of bytes that source will return
+        :type  size:    int
+        :param mode:    permissions of the file
+        :type  mode:    int
+        :param mtime:   modification time of the file, or None for now
+        :type  mtime:   int or NoneType
+
+        :raises IOError: if source does not return exactly size bytes
+        """
+        info = self._make_info(name, tarfile.REGTYPE, mode, mtime)
+        info.size = size
+        self._write_header(info)
+        remaining = size
+        while remaining > 0:
+            data = source.read(min(self.buffer_size, remaining))
+            if not data:
+                break
+            self._file.write(data)
+            remaining -= len(data)
+        if remaining or source.read(1):
+            raise IOError('%s changed size while it was being archived' % name)
+        self._write_padding(size)
+        self.bytes_written += size
+
+    def add_data(self, name, data, mtime=None):
+        """
+        Add a regular file to the archive with the given content
+
+        :param name:    path of the file within the archive
+        :type  name:    str
+        :param data:    content of the file
+        :type  data:    str
+        :param mtime:   modification time of the file, or None for now
+        :type  mtime:   int or NoneType
+        """
+        info = self._make_info(name, tarfile.REGTYPE, 0644, mtime)
+        info.size = len(data)
+        self._write_header(info)
+        self._file.write(data)
+        self._write_padding(info.size)
+        self.bytes_written += info.size
+
+    def add_tree(self, source_dir, arcname, exclude=()):
+        """
+        Add a directory and everything in it to the archive. Symbolic links are
+        stored as links, so that links within the tree cannot cause it to be
+        added more than once.
+
+        :param source_dir:  full path to the directory to add
+        :type  source_dir:  str
+        :param arcname:     path of the directory within the archive. If empty,
+                            the directory's contents are added at the top of
+                            the archive.
+        :type  arcname:     str
+        :param exclude:     full paths to files or directories that should not
+                            be added
+        :type  exclude:     collection
+        """
+        if arcname:
+            self.add_directory(arcname, int(os.stat(source_dir).st_mtime))
+        for name in sorted(os.listdir(source_dir)):
+            path = os.path.join(source_dir, name)
+            if path in exclude:
+                continue
+            member_name = '%s/%s' % (arcname, name) if arcname else name
+            if os.path.islink(path):
+                self.add_symlink(member_name, os.readlink(path), int(os.lstat(path).st_mtime))
+            elif os.path.isdir(path):
+                self.add_tree(path, member_name, exclude)
+            else:
+                self.add_file(member_name, path)
+
+    def close(self):
+        """
+        Write the end of archive marker and close the tar file
+        """
+        # two empty blocks mark the end of the archive, which is then padded to
+        # a whole number of records, the same way tarfile.TarFile does
+        end = tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+        self._file.write(end)
+        self.bytes_written += len(end)
+        remainder = self.bytes_written % tarfile.RECORDSIZE
+        if remainder:
+            self._file.write(tarfile.NUL * (tarfile.RECORDSIZE - remainder))
+            self.bytes_written += tarfile.RECORDSIZE - remainder
+        self._file.close()
+        self._file = None
+
+    @staticmethod
+    def _make_info(name, member_type, mode, mtime):
+        """
+        :return:    header describing a member of the archive
+        :rtype:     tarfile.TarInfo
+        """
+        info = tarfile.TarInfo(name)
+        info.type = member_type
+        info.mode = mode
+        info.mtime = int(time.time()) if mtime is None else mtime
+        return info
+
+    def _write_header(self, info):
+        """
+        Write the header for one member of the archive
+
+        :param info:    header to write
+        :type  info:    tarfile.TarInfo
+        """
+        header = info.tobuf(tarfile.GNU_FORMAT)
+        self._file.write(header)
+        self.bytes_written += len(header)
+        self.members += 1
+
+    def _write_padding(self, size):
+        """
+        Pad the content of a member to a whole number of blocks
+
+        :param size:    number of bytes of content that were written
+        :type  size:    int
+        """
+        remainder = size % tarfile.BLOCKSIZE
+        if remainder:
+            self._file.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+            self.bytes_written += tarfile.BLOCKSIZE - remainder
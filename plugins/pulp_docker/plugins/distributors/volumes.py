@@ -0,0 +1,132 @@
+import json
+import logging
+
+
+_LOG = logging.getLogger(__name__)
+
+# number of threads that size the images and write the volumes of an export
+DEFAULT_WORKERS = 4
+# name of the file within each volume that describes it
+VOLUME_INDEX_FILE = 'volume.json'
+VOLUME_TYPE = 'pulp-docker-export-volume'
+
+
+class ExportImage(object):
+    """
+    An image whose files are to be exported
+    """
+
+    __slots__ = ('image_id', 'parent_id', 'storage_path', 'size')
+
+    def __init__(self, image_id, parent_id, storage_path):
+        """
+        :param image_id:        ID of the image
+        :type  image_id:        basestring
+        :param parent_id:       ID of the image's parent, or None for a base image
+        :type  parent_id:       basestring or NoneType
+        :param storage_path:    full path to the directory holding the image's files
+        :type  storage_path:    str
+        """
+        self.image_id = image_id
+        self.parent_id = parent_id
+        self.storage_path = storage_path
+        # number of bytes the image takes in a volume, including its entry in
+        # the volume's index, as calculated by the export's layout
+        self.size = None
+
+
+def plan_volumes(images, capacity, ancestry=False):
+    """
+    Divide images among as few volumes as possible, using first fit
+    decreasing. An image that is larger than the capacity is put in a volume
+    of its own.
+
+    If ancestry is True, images are placed parents first instead, and each
+    image is put in the same volume as its parent or a later one, so that
+    loading the volumes in order never needs an image from a later volume.
+
+    :param images:      images to divide, whose sizes have been calculated
+    :type  images:      list of ExportImage
+    :param capacity:    number of bytes of images that each volume may hold
+    :type  capacity:    int
+    :param ancestry:    True if parents must not be in a later volume than
+                        their children
+    :type  ancestry:    bool
+
+    :return:    list of volumes, each of which is a list of images
+    :rtype:     list
+    """
+    if ancestry:
+        images = sort_by_ancestry(images)
+    else:
+        images = sorted(images, key=lambda image: image.size, reverse=True)
+    volumes = []
+    free = []
+    # keys are image IDs, values are the index of the volume holding the image
+    placed = {}
+    for image in images:
+        first = placed.get(image.parent_id, 0) if ancestry else 0
+        for i in range(first, len(free)):
+            if image.size <= free[i]:
+                break
+        else:
+            if image.size > capacity:
+                _LOG.warning('image %s is larger than the export volume size' % image.image_id)
+            volumes.append([])
+            free.append(capacity)
+            i = len(volumes) - 1
+        volumes[i].append(image)
+        free[i] -= image.size
+        placed[image.image_id] = i
+    return volumes
+
+
+def sort_by_ancestry(images):
+    """
+    :param images:  images to sort
+    :type  images:  list of ExportImage
+
+    :return:    the images, ordered so that each image's parent comes before it
+    :rtype:     list of ExportImage
+    """
+    parents = dict((image.image_id, image.parent_id) for image in images)
+    depths = {}
+
+    def get_depth(image_id):
+        # iterative, as ancestry can be deeper than the recursion limit
+        chain = []
+        seen = set()
+        while image_id in parents and image_id not in depths and image_id not in seen:
+            chain.append(image_id)
+            seen.add(image_id)
+            image_id = parents[image_id]
+        depth = depths.get(image_id, -1)
+        for image_id in reversed(chain):
+            depth += 1
+            depths[image_id] = depth
+        return depth
+
+    return sorted(images, key=lambda image: get_depth(image.image_id))
+
+
+def get_index(repo_id, number, count, images):
+    """
+    :param repo_id: ID of the exported repository
+    :type  repo_id: basestring
+    :param number:  number of the volume, starting at 1
+    :type  number:  int
+    :param count:   number of volumes in the export
+    :type  count:   int
+    :param images:  images in the volume
+    :type  images:  list of ExportImage
+
+    :return:    content of the file that describes a volume
+    :rtype:     str
+    """
+    return json.dumps({
+        'type': VOLUME_TYPE,
+        'repository': repo_id,
+        'volume': number,
+        'volumes': count,
+        'images': [image.image_id for image in images],
+    })
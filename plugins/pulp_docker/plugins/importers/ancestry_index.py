@@ -0,0 +1,279 @@
+from pulp.server.db import connection
+
+from pulp_docker.common import ancestry
+from pulp_docker.plugins.importers import associations
+
+
+# Each image in a repository's ancestry index, as returned by ancestry.build_index,
+# is kept in its own document in this collection, so that no repository is limited
+# by the size of a single document and each change writes only the images it
+# affects. A marker document, whose image_id is None, records that a repository's
+# index has been built.
+COLLECTION_NAME = 'docker_ancestry_index'
+
+# fields of an image's document that hold its ancestry index entry
+ENTRY_FIELDS = ('parent', 'size', 'depth', 'virtual_size', 'children')
+
+
+def _get_collection():
+    """
+    :return:    the collection in which ancestry indexes are stored
+    :rtype:     pymongo.collection.Collection
+    """
+    collection = connection.get_collection(COLLECTION_NAME, create=True)
+    collection.ensure_index([('repo_id', 1), ('image_id', 1)], unique=True)
+    collection.ensure_index([('repo_id', 1), ('parent', 1)])
+    return collection
+
+
+def get_index(repo_id, save=True):
+    """
+    Get a repository's ancestry index, building it if it does not exist yet.
+
+    :param repo_id: unique ID of a repository
+    :type  repo_id: basestring
+    :param save:    if False, an index that has to be built is not saved, so
+                    that nothing is written to the database
+    :type  save:    bool
+
+    :return:    ancestry index as returned by ancestry.build_index
+    :rtype:     dict
+    """
+    index = {}
+    built = False
+    for document in _get_collection().find({'repo_id': repo_id}):
+        if document['image_id'] is None:
+            built = True
+        else:
+            index[document['image_id']] = _to_entry(document)
+    if built:
+        return index
+    if not save:
+        return ancestry.build_index(associations.get_repo_images(repo_id))
+    return rebuild_index(repo_id)
+
+
+def rebuild_index(repo_id):
+    """
+    Build a repository's ancestry index from the images currently in the
+    repository, and save it.
+
+    :param repo_id: unique ID of a repository
+    :type  repo_id: basestring
+
+    :return:    ancestry index as returned by ancestry.build_index
+    :rtype:     dict
+    """
+    index = ancestry.build_index(associations.get_repo_images(repo_id))
+    collection = _get_collection()
+    collection.remove({'repo_id': repo_id}, safe=True)
+    _insert_entries(repo_id, index)
+    # last, so that an interrupted rebuild is started over
+    collection.insert({'repo_id': repo_id, 'image_id': None}, safe=True)
+    return index
+
+
+def add_images(repo_id, images):
+    """
+    Add images to a repository's ancestry index. Images that are already in
+    the index are skipped, so adding nothing but existing images takes a single
+    query. Only the new images' entries, their parents' lists of children, and
+    the depth and virtual size of existing images below a new image are written.
+
+    :param repo_id: unique ID of a repository
+    :type  repo_id: basestring
+    :param images:  dictionary where keys are image IDs and values are
+                    dictionaries with keys "parent_id" and "size"
+    :type  images:  dict
+    """
+    collection = _get_collection()
+    spec = {'repo_id': repo_id, 'image_id': {'$in': list(images) + [None]}}
+    found = set(document['image_id'] for document in collection.find(spec, fields=['image_id']))
+    if None not in found:
+        # the images are already in the repository, so the new index includes them
+        rebuild_index(repo_id)
+        return
+    images = dict((image_id, image) for image_id, image in images.iteritems()
+                  if image_id not in found)
+    if not images:
+        return
+
+    parent_ids = set(image.get('parent_id') for image in images.itervalues())
+    parent_ids.difference_update(images)
+    parent_ids.discard(None)
+    parents = _find_entries(repo_id, parent_ids)
+    entries = {}
+    for image_id, rollup in ancestry.get_rollups(images, parents).iteritems():
+        entries[image_id] = {
+            'parent': images[image_id].get('parent_id'),
+            'size': images[image_id].get('size') or 0,
+            'depth': rollup['depth'],
+            'virtual_size': rollup['virtual_size'],
+            'children': [],
+        }
+    new_children = {}
+    for image_id, entry in entries.iteritems():
+        if entry['parent'] in entries:
+            entries[entry['parent']]['children'].append(image_id)
+        elif entry['parent'] in parents:
+            new_children.setdefault(entry['parent'], []).append(image_id)
+    # images that were treated as base images because their parent was missing
+    orphans = list(collection.find({'repo_id': repo_id, 'parent': {'$in': list(entries)}}))
+    for document in orphans:
+        entries[document['parent']]['children'].append(document['image_id'])
+    for entry in entries.itervalues():
+        entry['children'].sort()
+
+    _insert_entries(repo_id, entries)
+    for parent_id, child_ids in new_children.iteritems():
+        collection.update({'repo_id': repo_id, 'image_id': parent_id},
+                          {'$addToSet': {'children': {'$each': child_ids}}}, safe=True)
+    _update_rollups(repo_id, orphans, entries)
+
+
+def remove_images(repo_id, image_ids):
+    """
+    Remove images from a repository's ancestry index. Only the removed images'
+    entries, their parents' lists of children, and the depth and virtual size
+    of the images below a removed image are written.
+
+    :param repo_id:     unique ID of a repository
+    :type  repo_id:     basestring
+    :param image_ids:   IDs of the images to remove
+    :type  image_ids:   iterable
+    """
+    collection = _get_collection()
+    spec = {'repo_id': repo_id, 'image_id': {'$in': list(image_ids)}}
+    removed = list(collection.find(spec, fields=['image_id', 'parent']))
+    if not removed:
+        return
+    removed_ids = [document['image_id'] for document in removed]
+    collection.remove({'repo_id': repo_id, 'image_id': {'$in': removed_ids}}, safe=True)
+
+    parent_ids = set(document['parent'] for document in removed)
+    parent_ids.difference_update(removed_ids)
+    parent_ids.discard(None)
+    if parent_ids:
+        collection.update({'repo_id': repo_id, 'image_id': {'$in': list(parent_ids)}},
+                          {'$pullAll': {'children': removed_ids}}, multi=True, safe=True)
+    orphans = list(collection.find({'repo_id': repo_id, 'parent': {'$in': removed_ids}}))
+    _update_rollups(repo_id, orphans, {})
+
+
+def get_ancestors(repo_id, image_ids):
+    """
+    Find the ancestors of the given images that are in a repository. The parent
+    of every image in the repository's ancestry index is read with a single
+    query, and the ancestors are found from those.
+
+    :param repo_id:     unique ID of a repository
+    :type  repo_id:     basestring
+    :param image_ids:   IDs of the images whose ancestors should be found
+    :type  image_ids:   iterable
+
+    :return:    set of the IDs of the ancestors that are in the repository, not
+                including the given images
+    :rtype:     set
+    """
+    image_ids = set(image_ids)
+    parents = {}
+    built = False
+    for document in _get_collection().find({'repo_id': repo_id}, fields=['image_id', 'parent']):
+        if document['image_id'] is None:
+            built = True
+        else:
+            parents[document['image_id']] = document['parent']
+    if not built:
+        index = rebuild_index(repo_id)
+        parents = dict((image_id, entry['parent']) for image_id, entry in index.iteritems())
+    return ancestry.get_closure(image_ids, parents).intersection(parents) - image_ids
+
+
+def delete_index(repo_id):
+    """
+    Delete a repository's ancestry index.
+
+    :param repo_id: unique ID of a repository
+    :type  repo_id: basestring
+    """
+    _get_collection().remove({'repo_id': repo_id}, safe=True)
+
+
+def _to_entry(document):
+    """
+    :param document:    an image's document from the collection
+    :type  document:    dict
+
+    :return:    the image's ancestry index entry
+    :rtype:     dict
+    """
+    entry = dict((field, document.get(field)) for field in ENTRY_FIELDS)
+    entry['children'] = sorted(entry['children'] or [])
+    return entry
+
+
+def _find_entries(repo_id, image_ids):
+    """
+    :param repo_id:     unique ID of a repository
+    :type  repo_id:     basestring
+    :param image_ids:   IDs of the images whose entries should be retrieved
+    :type  image_ids:   iterable
+
+    :return:    dictionary where keys are the IDs of those images that are in
+                the index and values are their entries
+    :rtype:     dict
+    """
+    image_ids = list(image_ids)
+    if not image_ids:
+        return {}
+    spec = {'repo_id': repo_id, 'image_id': {'$in': image_ids}}
+    return dict((document['image_id'], _to_entry(document))
+                for document in _get_collection().find(spec))
+
+
+def _insert_entries(repo_id, entries):
+    """
+    Insert one document per image, in batches.
+
+    :param repo_id: unique ID of a repository
+    :type  repo_id: basestring
+    :param entries: dictionary where keys are image IDs and values are their
+                    entries, as returned by ancestry.build_index
+    :type  entries: dict
+    """
+    collection = _get_collection()
+    documents = (dict(entry, repo_id=repo_id, image_id=image_id)
+                 for image_id, entry in entries.iteritems())
+    for batch in associations.get_batches(documents):
+        collection.insert(batch, safe=True)
+
+
+def _update_rollups(repo_id, documents, known):
+    """
+    Recalculate the depth and virtual size of some images and all of their
+    descendants, one generation per query, after their ancestors changed.
+    Only images whose values changed are written.
+
+    :param repo_id:     unique ID of a repository
+    :type  repo_id:     basestring
+    :param documents:   documents of the images whose parent was added or removed
+    :type  documents:   list of dict
+    :param known:       dictionary where keys are image IDs and values are
+                        dictionaries with keys "depth" and "virtual_size", which
+                        includes the parents of the given images that are in
+                        the index
+    :type  known:       dict
+    """
+    collection = _get_collection()
+    while documents:
+        images = dict((document['image_id'], {'parent_id': document['parent'],
+                                              'size': document['size']})
+                      for document in documents)
+        known = ancestry.get_rollups(images, known)
+        for document in documents:
+            rollup = known[document['image_id']]
+            if rollup['depth'] != document['depth'] or \
+                    rollup['virtual_size'] != document['virtual_size']:
+                collection.update({'repo_id': repo_id, 'image_id': document['image_id']},
+                                  {'$set': rollup}, safe=True)
+        documents = list(collection.find({'repo_id': repo_id, 'parent': {'$in': list(images)}}))
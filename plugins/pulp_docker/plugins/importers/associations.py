@@ -0,0 +1,150 @@
+from gettext import gettext as _
+import itertools
+import logging
+import time
+
+from pulp.plugins.conduits.mixins import UnitAssociationCriteria
+from pulp.server.managers import factory
+from pulp.server.managers.repo.unit_association import OWNER_TYPE_IMPORTER
+
+from pulp_docker.common import constants
+
+
+_logger = logging.getLogger(__name__)
+
+# number of units to associate with each database call
+BATCH_SIZE = 500
+
+
+def get_batches(iterable, size=BATCH_SIZE):
+    """
+    Split an iterable into lists of at most "size" items each.
+
+    :param iterable:    items to split
+    :type  iterable:    iterable
+    :param size:        maximum number of items in each batch
+    :type  size:        int
+
+    :return:    generator of lists
+    :rtype:     types.GeneratorType
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def get_associated_image_ids(conduit):
+    """
+    Get the IDs of all images that are already in the destination repository,
+    retrieving nothing but the image IDs.
+
+    :param conduit: provides access to relevant Pulp functionality
+    :type  conduit: pulp.plugins.conduits.unit_import.ImportUnitConduit
+
+    :return:    set of image IDs
+    :rtype:     set
+    """
+    criteria = UnitAssociationCriteria(type_ids=[constants.IMAGE_TYPE_ID],
+                                       unit_fields=['image_id'])
+    return set(unit.unit_key['image_id'] for unit in conduit.get_destination_units(criteria))
+
+
+def associate_units(repo_id, conduit, units, batch_size=BATCH_SIZE):
+    """
+    Associate units with a repository in batches. Units that are already in the
+    repository are skipped. Each batch is associated with a single call to the
+    platform's bulk association API, or one unit at a time through the conduit
+    if the units were not loaded from the database and so have no ID.
+
+    :param repo_id:     unique ID of the repository the units are added to
+    :type  repo_id:     basestring
+    :param conduit:     provides access to relevant Pulp functionality
+    :type  conduit:     pulp.plugins.conduits.unit_import.ImportUnitConduit
+    :param units:       units to associate
+    :type  units:       list of pulp.plugins.model.Unit
+    :param batch_size:  maximum number of units to associate with each call
+    :type  batch_size:  int
+
+    :return:    list of units that were newly associated
+    :rtype:     list of pulp.plugins.model.Unit
+    """
+    start = time.time()
+    existing = get_associated_image_ids(conduit)
+    requested_count = len(units)
+    units = [unit for unit in units if unit.unit_key['image_id'] not in existing]
+
+    association_manager = factory.repo_unit_association_manager()
+    for batch in get_batches(units, batch_size):
+        unit_ids = [unit.id for unit in batch]
+        if None in unit_ids:
+            for unit in batch:
+                conduit.associate_unit(unit)
+        else:
+            association_manager.associate_all_by_ids(repo_id, constants.IMAGE_TYPE_ID, unit_ids,
+                                                     OWNER_TYPE_IMPORTER,
+                                                     constants.IMPORTER_TYPE_ID)
+
+    elapsed = time.time() - start
+    rate = len(units) / elapsed if elapsed > 0 else 0
+    _logger.info(_('associated %(count)d units with repository %(repo)s in %(seconds).2f '
+                   'seconds (%(rate)d units per second); %(skipped)d were already present') %
+                 {'count': len(units), 'repo': repo_id, 'seconds': elapsed, 'rate': rate,
+                  'skipped': requested_count - len(units)})
+    return units
+
+
+def get_repo_images(repo_id):
+    """
+    Get the parent ID and size of every image in a repository, retrieving
+    nothing else from the database.
+
+    :param repo_id: unique ID of a repository
+    :type  repo_id: basestring
+
+    :return:    dictionary where keys are image IDs and values are dictionaries
+                with keys "parent_id" and "size"
+    :rtype:     dict
+    """
+    criteria = UnitAssociationCriteria(type_ids=[constants.IMAGE_TYPE_ID],
+                                       unit_fields=['image_id', 'parent_id', 'size'])
+    query_manager = factory.repo_unit_association_query_manager()
+    images = {}
+    for unit in query_manager.get_units_by_type(repo_id, constants.IMAGE_TYPE_ID,
+                                                criteria=criteria):
+        metadata = unit['metadata']
+        images[metadata['image_id']] = {'parent_id': metadata.get('parent_id'),
+                                        'size': metadata.get('size')}
+    return images
+
+
+def unassociate_images(repo_id, image_ids):
+    """
+    Remove images from a repository with a single bulk unassociation. The
+    importer is not notified, so the caller is responsible for any cleanup,
+    such as removing tags.
+
+    :param repo_id:     unique ID of a repository
+    :type  repo_id:     basestring
+    :param image_ids:   IDs of the images to remove
+    :type  image_ids:   iterable
+    """
+    unit_filter = {'image_id': {'$in': list(image_ids)}}
+    criteria = UnitAssociationCriteria(type_ids=[constants.IMAGE_TYPE_ID],
+                                       unit_filters=unit_filter)
+    factory.repo_unit_association_manager().unassociate_by_criteria(
+        repo_id, criteria, OWNER_TYPE_IMPORTER, constants.IMPORTER_TYPE_ID,
+        notify_plugins=False)
+
+
+def get_total_size(images):
+    """
+    :param images:  dictionaries with a "size" key, which may be None
+    :type  images:  iterable
+
+    :return:    sum of the sizes
+    :rtype:     int
+    """
+    return sum(image.get('size') or 0 for image in images)
@@ -0,0 +1,175 @@
+import collections
+import logging
+import posixpath
+import urlparse
+
+from pulp_docker.plugins.metrics import get_duration
+
+
+_logger = logging.getLogger(__name__)
+
+# upper bound on concurrent downloads if none is configured
+DEFAULT_MAX_CONCURRENCY = 20
+# a window whose failure rate exceeds this fraction halves the concurrency
+ERROR_RATE_THRESHOLD = 0.05
+# a window whose latency exceeds the usual latency by this factor indicates
+# that the upstream is queueing or throttling requests
+LATENCY_FACTOR = 2.0
+# weight of each window's latency in the usual latency, which is a moving
+# average so that it follows gradual changes in the upstream
+LATENCY_WEIGHT = 0.2
+# number of the most recent windows included in the sync report
+MAX_REPORTED_WINDOWS = 100
+# a window is considered to have improved throughput unless it falls this far
+# below the previous window
+THROUGHPUT_TOLERANCE = 0.1
+
+
+class AIMDController(object):
+    """
+    Chooses how many downloads should run concurrently, using additive increase
+    and multiplicative decrease. Downloads are processed in windows; after each
+    window, the concurrency grows by one if the window was healthy, or is halved
+    if the upstream returned errors or slowed down markedly.
+
+    Latency is compared per kind of file, named by the last part of the URL,
+    such as "json" or "layer", because a small metadata file always downloads
+    faster than a layer. Each kind's usual latency is a moving average of its
+    windows' latencies.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=DEFAULT_MAX_CONCURRENCY):
+        """
+        :param initial: number of concurrent downloads to start with
+        :type  initial: int
+        :param minimum: lowest number of concurrent downloads to use
+        :type  minimum: int
+        :param maximum: highest number of concurrent downloads to use
+        :type  maximum: int
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.initial = min(max(initial, self.minimum), self.maximum)
+        self.concurrency = self.initial
+        # keys are kinds of file, values are their usual latencies
+        self.usual_latencies = {}
+        self.last_throughput = None
+        # one entry per recently completed window, for the sync report
+        self.windows = collections.deque(maxlen=MAX_REPORTED_WINDOWS)
+        self.min_used = None
+        self.max_used = None
+        self._reset_window()
+
+    def _reset_window(self):
+        """
+        Forget the statistics gathered for the current window.
+        """
+        self.requests = 0
+        self.failures = 0
+        self.bytes_downloaded = 0
+        self.total_latency = 0.0
+        # keys are kinds of file, values are lists of the number of requests
+        # and their total latency
+        self.latencies = {}
+
+    def record(self, report, succeeded=True):
+        """
+        Record the outcome of one download in the current window.
+
+        :param report:      report for a finished download
+        :type  report:      nectar.report.DownloadReport
+        :param succeeded:   True if the download succeeded
+        :type  succeeded:   bool
+        """
+        self.requests += 1
+        if not succeeded:
+            self.failures += 1
+        self.bytes_downloaded += report.bytes_downloaded or 0
+        latency = get_duration(report.start_time, report.finish_time)
+        self.total_latency += latency
+        kind = posixpath.basename(urlparse.urlsplit(report.url).path)
+        totals = self.latencies.setdefault(kind, [0, 0.0])
+        totals[0] += 1
+        totals[1] += latency
+
+    def adjust(self, elapsed):
+        """
+        Close the current window and choose the concurrency for the next one.
+
+        :param elapsed: wall time in seconds that the window took
+        :type  elapsed: float
+
+        :return:    number of concurrent downloads to use for the next window
+        :rtype:     int
+        """
+        if not self.requests:
+            return self.concurrency
+
+        error_rate = float(self.failures) / self.requests
+        latency = self.total_latency / self.requests
+        throughput = self.bytes_downloaded / elapsed if elapsed > 0 else 0.0
+        self.windows.append({
+            'concurrency': self.concurrency,
+            'requests': self.requests,
+            'failures': self.failures,
+            'bytes_per_second': int(throughput),
+            'mean_latency': round(latency, 3),
+        })
+
+        self.min_used = min(self.min_used or self.concurrency, self.concurrency)
+        self.max_used = max(self.max_used, self.concurrency)
+
+        previous = self.concurrency
+        if error_rate > ERROR_RATE_THRESHOLD:
+            self.concurrency = max(self.minimum, self.concurrency // 2)
+        elif self._get_latency_ratio() > LATENCY_FACTOR:
+            self.concurrency = max(self.minimum, self.concurrency // 2)
+        elif self.last_throughput is None or \
+                throughput >= self.last_throughput * (1 - THROUGHPUT_TOLERANCE):
+            self.concurrency = min(self.maximum, self.concurrency + 1)
+
+        if self.concurrency != previous:
+            _logger.debug('changing download concurrency from %d to %d' %
+                          (previous, self.concurrency))
+        for kind, (requests, total) in self.latencies.iteritems():
+            usual = self.usual_latencies.get(kind)
+            if usual is None:
+                self.usual_latencies[kind] = total / requests
+            else:
+                self.usual_latencies[kind] = \
+                    usual + LATENCY_WEIGHT * (total / requests - usual)
+        self.last_throughput = throughput
+        self._reset_window()
+        return self.concurrency
+
+    def _get_latency_ratio(self):
+        """
+        :return:    how many times the current window's latency is the usual
+                    latency, averaged over the requests for the kinds of file
+                    whose usual latency is known, or 0 if none is
+        :rtype:     float
+        """
+        weighted = 0.0
+        compared = 0
+        for kind, (requests, total) in self.latencies.iteritems():
+            usual = self.usual_latencies.get(kind)
+            if usual:
+                weighted += total / usual
+                compared += requests
+        if not compared:
+            return 0.0
+        return weighted / compared
+
+    def get_report(self):
+        """
+        :return:    summary of the concurrency values chosen during the sync,
+                    suitable for inclusion in a sync report
+        :rtype:     dict
+        """
+        return {
+            'initial_concurrency': self.initial,
+            'final_concurrency': self.concurrency,
+            'min_concurrency_used': self.min_used or self.concurrency,
+            'max_concurrency_used': self.max_used or self.concurrency,
+            'windows': list(self.windows),
+        }
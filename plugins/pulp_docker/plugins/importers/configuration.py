@@ -0,0 +1,147 @@
+import re
+
+from pulp.server.exceptions import PulpCodedValidationException
+
+from pulp_docker.common import constants, error_codes
+from pulp_docker.plugins.importers import concurrency
+
+
+# values that may be given for the cascade_remove config
+CASCADE_VALUES = (constants.CASCADE_DESCENDANTS, constants.CASCADE_UNREACHABLE)
+
+
+def validate_config(config):
+    """
+    Validate a configuration
+
+    :param config: Pulp configuration for the importer
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :raises: PulpCodedValidationException if any validations failed
+    """
+    errors = []
+    for key in (constants.CONFIG_KEY_TAG_FILTER_REGEX, constants.CONFIG_KEY_ADAPTIVE_DOWNLOADS,
+                constants.CONFIG_KEY_DRY_RUN, constants.CONFIG_KEY_GARBAGE_COLLECT,
+                constants.CONFIG_KEY_COPY_TAGS):
+        value = config.get(key)
+        if value and config.get_boolean(key) is None:
+            errors.append(PulpCodedValidationException(error_code=error_codes.DKR1004,
+                                                       field=key, value=value))
+
+    for key, getter in ((constants.CONFIG_KEY_MAX_TAGS, get_max_tags),
+                        (constants.CONFIG_KEY_MAX_ADAPTIVE_DOWNLOADS, get_max_adaptive_downloads)):
+        value = config.get(key)
+        if value is not None:
+            try:
+                getter(config)
+            except (TypeError, ValueError):
+                errors.append(PulpCodedValidationException(error_code=error_codes.DKR1008,
+                                                           field=key, value=value))
+
+    if config.get_boolean(constants.CONFIG_KEY_TAG_FILTER_REGEX):
+        for key in (constants.CONFIG_KEY_INCLUDE_TAGS, constants.CONFIG_KEY_EXCLUDE_TAGS):
+            for pattern in get_list_config(config, key):
+                try:
+                    re.compile(pattern)
+                except re.error:
+                    errors.append(PulpCodedValidationException(error_code=error_codes.DKR1010,
+                                                               field=key, value=pattern))
+
+    for value in get_list_config(config, constants.CONFIG_KEY_CASCADE_REMOVE):
+        if value not in CASCADE_VALUES:
+            errors.append(PulpCodedValidationException(
+                error_code=error_codes.DKR1011, field=constants.CONFIG_KEY_CASCADE_REMOVE,
+                value=value, values=', '.join(CASCADE_VALUES)))
+
+    if errors:
+        raise PulpCodedValidationException(validation_exceptions=errors)
+
+    return True, None
+
+
+def get_list_config(config, key):
+    """
+    Get a config value that is a list of strings. The value may be given either
+    as a list or as a single comma-separated string, which is what the CLI and
+    most REST clients send.
+
+    :param config:  config object for the sync
+    :type  config:  pulp.plugins.config.PluginCallConfiguration
+    :param key:     config key to look up
+    :type  key:     basestring
+
+    :return:    list of strings, which is empty if the key is not set
+    :rtype:     list
+    """
+    value = config.get(key)
+    if not value:
+        return []
+    if isinstance(value, basestring):
+        value = value.split(',')
+    return [item.strip() for item in value if item.strip()]
+
+
+def get_max_tags(config):
+    """
+    Get the largest number of tags that a sync should keep.
+
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+    :return: the number of tags, or None to keep every tag
+    :rtype:  int or NoneType
+    :raises ValueError: if the configured value is not a positive integer
+    """
+    return _get_positive_integer(config, constants.CONFIG_KEY_MAX_TAGS, None)
+
+
+def get_max_adaptive_downloads(config):
+    """
+    Get the largest number of concurrent downloads that adaptive downloads may
+    choose.
+
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+    :return: the number of concurrent downloads
+    :rtype:  int
+    :raises ValueError: if the configured value is not a positive integer
+    """
+    return _get_positive_integer(config, constants.CONFIG_KEY_MAX_ADAPTIVE_DOWNLOADS,
+                                 concurrency.DEFAULT_MAX_CONCURRENCY)
+
+
+def get_cascade_remove(config):
+    """
+    Get what else should be removed from a repository along with removed images.
+
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+    :return: any of CASCADE_VALUES
+    :rtype:  list
+    :raises ValueError: if a configured value is not one of CASCADE_VALUES
+    """
+    cascade = get_list_config(config, constants.CONFIG_KEY_CASCADE_REMOVE)
+    for value in cascade:
+        if value not in CASCADE_VALUES:
+            raise ValueError('unsupported cascade_remove value: %s' % value)
+    return cascade
+
+
+def _get_positive_integer(config, key, default):
+    """
+    :param config: configuration instance
+    :type  config: pulp.plugins.config.PluginCallConfiguration or dict
+    :param key: key of an integer value, which may be a string
+    :type  key: str
+    :param default: value to return if the key is not set
+    :type  default: int or NoneType
+
+    :return: the value of the key, or the default if it is not set
+    :rtype:  int or NoneType
+    :raises ValueError: if the value is not a positive integer
+    """
+    value = config.get(key)
+    if value is None:
+        return default
+    value = int(value)
+    if value <= 0:
+        raise ValueError('%s must be positive: %d' % (key, value))
+    return value
@@ -8,8 +8,10 @@ from pulp.plugins.importer import Importer
 import pulp.server.managers.factory as manager_factory
 import shutil
 
-from pulp_docker.common import constants, tarutils
-from pulp_docker.plugins.importers import upload
+from pulp_docker.common import ancestry, constants, tarutils
+from pulp_docker.common import tags as docker_tags
+from pulp_docker.plugins.importers import ancestry_index, associations, configuration, tags, \
+    upload
 from pulp_docker.plugins.importers import sync
 
 
@@ -134,10 +136,12 @@ class DockerImporter(Importer):
         # turn that metadata into a collection of models
         mask_id = config.get(constants.CONFIG_KEY_MASK_ID)
         models = upload.get_models(metadata, mask_id)
-        ancestry = tarutils.get_ancestry(models[0].image_id, metadata)
+        image_ancestry = tarutils.get_ancestry(models[0].image_id, metadata)
         # save those models as units in pulp
-        upload.save_models(conduit, models, ancestry, file_path)
+        upload.save_models(conduit, models, image_ancestry, file_path)
         upload.update_tags(repo.id, file_path)
+        ancestry_index.add_images(repo.id, dict((model.image_id, model.unit_metadata)
+                                                for model in models))
 
     def import_units(self, source_repo, dest_repo, import_conduit, config, units=None):
         """
@@ -182,48 +186,107 @@ class DockerImporter(Importer):
         :param units: optional list of pre-filtered units to import
         :type  units: list of pulp.plugins.model.Unit
 
-        :return: list of Unit instances that were saved to the destination repository
+        :return: list of Unit instances that were saved to the destination repository.
+                 Units that were already in the destination repository are not included.
         :rtype:  list
         """
         # Determine which units are being copied
         if units is None:
             criteria = UnitAssociationCriteria(type_ids=[constants.IMAGE_TYPE_ID])
             units = import_conduit.get_source_units(criteria=criteria)
+        else:
+            units = list(units) + self._get_missing_ancestors(source_repo.id, import_conduit,
+                                                              units)
 
         # Associate to the new repository
-        known_units = set()
-        units_added = []
-
-        while True:
-            units_to_add = set()
-
-            # Associate the units to the repository
-            for u in units:
-                import_conduit.associate_unit(u)
-                units_added.append(u)
-                known_units.add(u.unit_key['image_id'])
-                parent_id = u.metadata.get('parent_id')
-                if parent_id:
-                    units_to_add.add(parent_id)
-            # Filter out units we have already added
-            units_to_add.difference_update(known_units)
-            # Find any new units to add to the repository
-            if units_to_add:
-                unit_filter = {'image_id': {'$in': list(units_to_add)}}
-                criteria = UnitAssociationCriteria(type_ids=[constants.IMAGE_TYPE_ID],
-                                                   unit_filters=unit_filter)
-                units = import_conduit.get_source_units(criteria=criteria)
-            else:
-                # Break out of the loop since there were no units to add to the list
-                break
-
+        units_added = associations.associate_units(dest_repo.id, import_conduit, units)
+        ancestry_index.add_images(dest_repo.id, dict((u.unit_key['image_id'], u.metadata)
+                                                     for u in units_added))
+
+        # only once the images are in the repository, so that no tag can point
+        # at an image that failed to be associated
+        if config.get_boolean(constants.CONFIG_KEY_COPY_TAGS):
+            self._copy_tags(source_repo.id, dest_repo.id, units)
         return units_added
 
+    @staticmethod
+    def _copy_tags(source_repo_id, dest_repo_id, units):
+        """
+        Add the source repository's tags that point at any of the given units to
+        the destination repository, with a single scratchpad update.
+
+        :param source_repo_id:  unique ID of the repository the units are copied from
+        :type  source_repo_id:  basestring
+        :param dest_repo_id:    unique ID of the repository the units are copied to
+        :type  dest_repo_id:    basestring
+        :param units:           units being copied
+        :type  units:           list of pulp.plugins.model.Unit
+        """
+        scratchpad = manager_factory.repo_manager().get_repo_scratchpad(source_repo_id)
+        source_tags = docker_tags.TagIndex(scratchpad.get(u'tags', []))
+        new_tags = {}
+        for u in units:
+            image_id = u.unit_key['image_id']
+            for tag in source_tags.get_tags(image_id):
+                new_tags[tag] = image_id
+        if new_tags:
+            tags.update_tags(dest_repo_id, new_tags)
+
+    @staticmethod
+    def _get_missing_ancestors(source_repo_id, import_conduit, units):
+        """
+        Find the ancestors of the given units that are in the source repository
+        but not among the given units. The ancestry is walked up the source
+        repository's ancestry index, and then the missing units are retrieved
+        with a single query.
+
+        :param source_repo_id:  unique ID of the repository the units are copied from
+        :type  source_repo_id:  basestring
+        :param import_conduit:  provides access to relevant Pulp functionality
+        :type  import_conduit:  pulp.plugins.conduits.unit_import.ImportUnitConduit
+        :param units:           units being imported
+        :type  units:           list of pulp.plugins.model.Unit
+
+        :return:    list of units that must be imported along with the given units
+        :rtype:     list of pulp.plugins.model.Unit
+        """
+        image_ids = set(u.unit_key['image_id'] for u in units)
+        missing_ids = ancestry_index.get_ancestors(source_repo_id, image_ids)
+        if not missing_ids:
+            return []
+        unit_filter = {'image_id': {'$in': list(missing_ids)}}
+        criteria = UnitAssociationCriteria(type_ids=[constants.IMAGE_TYPE_ID],
+                                           unit_filters=unit_filter)
+        return list(import_conduit.get_source_units(criteria=criteria))
+
+    def importer_removed(self, repo, config):
+        """
+        Called when the importer is removed from a repository, which includes
+        when the repository is deleted. This deletes the repository's ancestry
+        index.
+
+        :param repo:    metadata describing the repository
+        :type  repo:    pulp.plugins.model.Repository
+        :param config:  plugin configuration
+        :type  config:  pulp.plugins.config.PluginCallConfiguration
+        """
+        ancestry_index.delete_index(repo.id)
+
     def validate_config(self, repo, config):
         """
-        We don't have a config yet, so it's always valid
+        Check the importer's configuration before it is saved, so that a bad
+        value fails here rather than part of the way through a sync.
+
+        :param repo:    metadata describing the repository
+        :type  repo:    pulp.plugins.model.Repository
+        :param config:  plugin configuration
+        :type  config:  pulp.plugins.config.PluginCallConfiguration
+
+        :return:    tuple of (bool, str) to describe the result
+        :rtype:     tuple
+        :raises:    PulpCodedValidationException if any validations failed
         """
-        return True, ''
+        return configuration.validate_config(config)
 
     def remove_units(self, repo, units, config):
         """
@@ -243,13 +306,58 @@ class DockerImporter(Importer):
         :param config: plugin configuration
         :type  config: pulp.plugins.config.PluginCallConfiguration
         """
-        repo_manager = manager_factory.repo_manager()
-        scratchpad = repo_manager.get_repo_scratchpad(repo.id)
-        tags = scratchpad.get(u'tags', [])
         unit_ids = set([unit.unit_key[u'image_id'] for unit in units])
-        for tag_dict in tags[:]:
-            if tag_dict[constants.IMAGE_ID_KEY] in unit_ids:
-                tags.remove(tag_dict)
-
-        scratchpad[u'tags'] = tags
-        repo_manager.set_repo_scratchpad(repo.id, scratchpad)
+        cascade = configuration.get_cascade_remove(config)
+        if cascade:
+            unit_ids.update(self._cascade_remove(repo.id, units, cascade))
+        tags.remove_image_tags(repo.id, unit_ids)
+        ancestry_index.remove_images(repo.id, unit_ids)
+
+    @staticmethod
+    def _cascade_remove(repo_id, units, cascade):
+        """
+        Remove the images that depend on, or only existed to support, images that
+        were just removed from a repository. Images are removed in one bulk
+        unassociation, based on the repository's ancestry index.
+
+        :param repo_id:     unique ID of the repository
+        :type  repo_id:     basestring
+        :param units:       units that were removed
+        :type  units:       list of pulp.plugins.model.AssociatedUnit
+        :param cascade:     any of constants.CASCADE_DESCENDANTS, to also remove
+                            all descendants of the removed images, and
+                            constants.CASCADE_UNREACHABLE, to also remove their
+                            ancestors that no tag reaches any more
+        :type  cascade:     list
+
+        :return:    IDs of the images that were additionally removed
+        :rtype:     set
+        """
+        removed = dict((u.unit_key['image_id'], u.metadata) for u in units)
+        images = ancestry_index.get_index(repo_id)
+        parents = dict((image_id, image['parent']) for image_id, image in images.iteritems()
+                       if image_id not in removed)
+
+        to_remove = set()
+        if constants.CASCADE_DESCENDANTS in cascade:
+            children = ancestry.get_children(parents)
+            to_remove.update(ancestry.get_descendants(removed, children))
+            to_remove.difference_update(removed)
+        if constants.CASCADE_UNREACHABLE in cascade:
+            for image_id in to_remove:
+                del parents[image_id]
+            removed_parents = [metadata.get('parent_id') for metadata in removed.values()]
+            candidates = ancestry.get_closure(filter(None, removed_parents), parents)
+            candidates.intersection_update(parents)
+            scratchpad = manager_factory.repo_manager().get_repo_scratchpad(repo_id)
+            tagged = set(docker_tags.TagIndex(scratchpad.get(u'tags', [])).to_dict().values())
+            to_remove.update(ancestry.get_unreachable(candidates, tagged, parents))
+
+        if to_remove:
+            associations.unassociate_images(repo_id, to_remove)
+        freed = associations.get_total_size(removed.values()) + \
+            associations.get_total_size(images[image_id] for image_id in to_remove)
+        _logger.info(_('removed %(count)d images from repository %(repo)s, freeing %(bytes)d '
+                       'bytes') % {'count': len(removed) + len(to_remove), 'repo': repo_id,
+                                   'bytes': freed})
+        return to_remove
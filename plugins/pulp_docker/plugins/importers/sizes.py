@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+from pulp.server.managers import factory
+
+from pulp_docker.common import ancestry, constants
+
+
+# number of bytes read at a time when calculating a checksum
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_rollups(images):
+    """
+    Calculate the depth and virtual size of new images. Ancestors that are not
+    among the new images are loaded from the database, typically with a single
+    query for their parents. Further queries are only needed for ancestors that
+    were saved without these values.
+
+    :param images:  dictionary where keys are image IDs and values are
+                    dictionaries with keys "parent_id" and "size"
+    :type  images:  dict
+
+    :return:    dictionary where keys are the image IDs in "images" and values are
+                dictionaries with keys "depth" and "virtual_size"
+    :rtype:     dict
+    """
+    images = dict(images)
+    known = {}
+    new_ids = set(images)
+    to_load = set(image['parent_id'] for image in images.itervalues()
+                  if image.get('parent_id') and image['parent_id'] not in images)
+    query_manager = factory.content_query_manager()
+    while to_load:
+        units = query_manager.get_multiple_units_by_keys_dicts(
+            constants.IMAGE_TYPE_ID, [{'image_id': image_id} for image_id in to_load],
+            model_fields=['image_id', 'parent_id', 'size', 'virtual_size', 'depth'])
+        to_load = set()
+        for unit in units:
+            if unit.get('depth') is not None and unit.get('virtual_size') is not None:
+                known[unit['image_id']] = {'depth': unit['depth'],
+                                           'virtual_size': unit['virtual_size']}
+            else:
+                images[unit['image_id']] = {'parent_id': unit.get('parent_id'),
+                                            'size': unit.get('size')}
+                parent_id = unit.get('parent_id')
+                if parent_id and parent_id not in images and parent_id not in known:
+                    to_load.add(parent_id)
+
+    rollups = ancestry.get_rollups(images, known)
+    return dict((image_id, rollups[image_id]) for image_id in new_ids)
+
+
+def get_stored_size(path):
+    """
+    :param path:    full path to a directory that holds an image's files
+    :type  path:    basestring
+
+    :return:    total size in bytes of the files in the directory
+    :rtype:     int
+    """
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def get_layer_details(path):
+    """
+    :param path:    full path to a directory that holds an image's files
+    :type  path:    basestring
+
+    :return:    dictionary with keys "layer_size", the size in bytes of the stored
+                layer file, and "checksum", which is "sha256:" followed by the hex
+                digest of the stored layer file
+    :rtype:     dict
+    """
+    layer_path = os.path.join(path, 'layer')
+    digest = hashlib.sha256()
+    with open(layer_path, 'rb') as layer_file:
+        for chunk in iter(lambda: layer_file.read(CHUNK_SIZE), ''):
+            digest.update(chunk)
+    return {'layer_size': os.path.getsize(layer_path),
+            'checksum': 'sha256:%s' % digest.hexdigest()}
@@ -1,24 +1,59 @@
 import errno
 from gettext import gettext as _
+import itertools
 import json
 import logging
 import os
 import shutil
+import time
+import urlparse
+
+from nectar.downloaders.local import LocalFileDownloader
+from nectar.downloaders.threaded import HTTPThreadedDownloader
 
 from pulp.common.plugins import importer_constants
 from pulp.plugins.util import nectar_config
 from pulp.plugins.util.publish_step import PluginStep, DownloadStep, \
     GetLocalUnitsStep
 
-from pulp_docker.common import constants
+from pulp_docker.common import ancestry, constants
+from pulp_docker.common import tags as docker_tags
 from pulp_docker.common.models import DockerImage
-from pulp_docker.plugins.importers import tags
+from pulp_docker.plugins.importers import ancestry_index, associations, concurrency, \
+    configuration, sizes, tags
+from pulp_docker.plugins import metrics, threads
 from pulp_docker.plugins.registry import Repository
 
 
 _logger = logging.getLogger(__name__)
 
 
+def get_upstreams(config):
+    """
+    Get the upstream repositories to sync from. The "upstream_name" value may be
+    a single name, a list of names, or a list of dictionaries that each have a
+    "name" key and optionally a "feed" key, which overrides the importer's feed
+    for that upstream repository.
+
+    :param config:  config object for the sync
+    :type  config:  pulp.plugins.config.PluginCallConfiguration
+
+    :return:    list of (name, feed) tuples, where feed is None if the importer's
+                feed should be used. There is always at least one entry.
+    :rtype:     list
+    """
+    value = config.get(constants.CONFIG_KEY_UPSTREAM_NAME)
+    if isinstance(value, basestring):
+        value = configuration.get_list_config(config, constants.CONFIG_KEY_UPSTREAM_NAME)
+    upstreams = []
+    for entry in value or []:
+        if isinstance(entry, dict):
+            upstreams.append((entry.get('name'), entry.get('feed')))
+        else:
+            upstreams.append((entry, None))
+    return upstreams or [(value or None, None)]
+
+
 class SyncStep(PluginStep):
     def __init__(self, repo=None, conduit=None, config=None,
                  working_dir=None):
@@ -43,12 +78,19 @@ class SyncStep(PluginStep):
         self.available_units = []
         # populated by GetMetadataStep
         self.tags = {}
+        # a dry run only reports what a sync would download, without changing the repo
+        self.dry_run = config.get_boolean(constants.CONFIG_KEY_DRY_RUN) or False
 
-        # create a Repository object to interact with
+        # create a Repository object to interact with for each upstream repository
         download_config = nectar_config.importer_config_to_nectar_config(config.flatten())
-        upstream_name = config.get(constants.CONFIG_KEY_UPSTREAM_NAME)
         url = config.get(importer_constants.KEY_FEED)
-        self.index_repository = Repository(upstream_name, download_config, url, working_dir)
+        self.index_repositories = [Repository(name, download_config, feed or url, working_dir)
+                                   for name, feed in get_upstreams(config)]
+        # the first upstream repository; most syncs only have one
+        self.index_repository = self.index_repositories[0]
+        # keys are image IDs, values are the Repository object each image should
+        # be downloaded from. Populated by GetMetadataStep.
+        self.image_sources = {}
 
         self.add_child(GetMetadataStep(working_dir=working_dir))
         # save this step so its "units_to_download" attribute can be accessed later
@@ -56,18 +98,35 @@ class SyncStep(PluginStep):
                                                        constants.IMAGE_TYPE_ID,
                                                        ['image_id'], working_dir)
         self.add_child(self.step_get_local_units)
-        self.add_child(DownloadStep(constants.SYNC_STEP_DOWNLOAD,
-                                    downloads=self.generate_download_requests(),
-                                    repo=repo, config=config, working_dir=working_dir,
-                                    description=_('Downloading remote files')))
-        self.add_child(SaveUnits(working_dir))
-
-    def generate_download_requests(self):
+        if self.dry_run:
+            # only retrieve the json documents, which are enough to plan the sync
+            self.step_download = DockerDownloadStep(
+                constants.SYNC_STEP_DOWNLOAD,
+                downloads=self.generate_download_requests(metadata_only=True),
+                repo=repo, config=config, working_dir=working_dir,
+                description=_('Downloading image metadata'))
+            self.add_child(self.step_download)
+            self.add_child(PlanSyncStep(working_dir))
+        else:
+            self.step_download = DockerDownloadStep(
+                constants.SYNC_STEP_DOWNLOAD, downloads=self.generate_download_requests(),
+                repo=repo, config=config, working_dir=working_dir,
+                description=_('Downloading remote files'))
+            self.add_child(self.step_download)
+            self.add_child(SaveUnits(working_dir))
+        if config.get_boolean(constants.CONFIG_KEY_GARBAGE_COLLECT):
+            self.add_child(GarbageCollectStep(working_dir))
+
+    def generate_download_requests(self, metadata_only=False):
         """
         a generator that yields DownloadRequest objects based on which units
         were determined to be needed. This looks at the GetLocalUnits step's
         output, which includes a list of units that need their files downloaded.
 
+        :param metadata_only:   if True, only yield requests for the "json"
+                                files, and none for ancestry or layers
+        :type  metadata_only:   bool
+
         :return:    generator of DownloadRequest instances
         :rtype:     types.GeneratorType
         """
@@ -82,12 +141,16 @@ class SyncStep(PluginStep):
                     raise
             # we already retrieved the ancestry files for the tagged images, so
             # some of these will already exist
-            if not os.path.exists(os.path.join(destination_dir, 'ancestry')):
-                yield self.index_repository.create_download_request(image_id, 'ancestry',
-                                                                    destination_dir)
+            source = self.image_sources.get(image_id, self.index_repository)
+            if not metadata_only and \
+                    not os.path.exists(os.path.join(destination_dir, 'ancestry')):
+                yield source.create_download_request(image_id, 'ancestry', destination_dir)
 
-            yield self.index_repository.create_download_request(image_id, 'json', destination_dir)
-            yield self.index_repository.create_download_request(image_id, 'layer', destination_dir)
+            # the json files of tagged images may have been retrieved while filtering tags
+            if not os.path.exists(os.path.join(destination_dir, 'json')):
+                yield source.create_download_request(image_id, 'json', destination_dir)
+            if not metadata_only:
+                yield source.create_download_request(image_id, 'layer', destination_dir)
 
     def sync(self):
         """
@@ -97,10 +160,11 @@ class SyncStep(PluginStep):
         :rtype:     pulp.plugins.model.SyncReport
         """
         self.process_lifecycle()
+        metrics.report_metrics(self, 'sync')
         return self._build_final_report()
 
 
-class GetMetadataStep(PluginStep):
+class GetMetadataStep(metrics.TimedStepMixin, PluginStep):
     def __init__(self, repo=None, conduit=None, config=None, working_dir=None):
         """
         :param repo:        repository to sync
@@ -128,24 +192,111 @@ class GetMetadataStep(PluginStep):
         download_dir = self.get_working_dir()
         _logger.debug(self.description)
 
-        # determine what images are available by querying the upstream source
-        available_images = self.parent.index_repository.get_image_ids()
-        # get remote tags and save them on the parent
-        self.parent.tags.update(self.parent.index_repository.get_tags())
-        # transform the tags so they contain full image IDs instead of abbreviations
-        self.expand_tag_abbreviations(available_images, self.parent.tags)
-
-        tagged_image_ids = self.parent.tags.values()
+        repositories = self.parent.index_repositories
+        # retrieve the tags of all upstream repositories concurrently
+        upstream_tags = threads.run(
+            lambda repository: self.get_upstream_tags(repository, download_dir), repositories,
+            workers=len(repositories))
+
+        # keys are image IDs, values are the Repository to retrieve each image
+        # from. An image shared by several upstream repositories is only
+        # retrieved from the first of them. If upstream repositories have a tag
+        # with the same name, the one listed first keeps it, but the images the
+        # others tag are still retrieved.
+        sources = {}
+        for repository, remote_tags in zip(repositories, upstream_tags):
+            for tag, image_id in remote_tags.items():
+                existing = self.parent.tags.setdefault(tag, image_id)
+                if existing != image_id:
+                    _logger.warning(_('tag %(tag)s from %(name)s conflicts with an earlier '
+                                      'upstream repository, which takes priority') %
+                                    {'tag': tag, 'name': repository.name})
+                sources.setdefault(image_id, repository)
+
+        tagged_image_ids = list(sources)
 
         # retrieve ancestry files and then parse them to determine the full
         # collection of upstream images that we should ensure are obtained.
-        self.parent.index_repository.get_ancestry(tagged_image_ids)
+        threads.run(
+            lambda repository: repository.get_ancestry(
+                [i for i in tagged_image_ids if sources[i] is repository]),
+            repositories, workers=len(repositories))
         images_we_need = set(tagged_image_ids)
         for image_id in tagged_image_ids:
-            images_we_need.update(set(self.find_and_read_ancestry_file(image_id, download_dir)))
+            for ancestor in self.find_and_read_ancestry_file(image_id, download_dir):
+                images_we_need.add(ancestor)
+                sources.setdefault(ancestor, sources[image_id])
 
         # generate unit keys and save them on the parent
         self.parent.available_units = [dict(image_id=i) for i in images_we_need]
+        self.parent.image_sources.update(sources)
+        self.metrics.units = len(images_we_need)
+        for repository in repositories:
+            self.metrics.merge(repository.metrics)
+
+    def get_upstream_tags(self, repository, download_dir):
+        """
+        Get the tags that should be synced from one upstream repository.
+
+        :param repository:      upstream repository to query
+        :type  repository:      pulp_docker.plugins.registry.Repository
+        :param download_dir:    full path to the directory in which image files
+                                are downloaded
+        :type  download_dir:    basestring
+
+        :return:    dictionary of tag:image_id, with full image IDs
+        :rtype:     dict
+        """
+        # determine what images are available by querying the upstream source
+        available_images = repository.get_image_ids()
+        # get remote tags
+        remote_tags = repository.get_tags()
+        # transform the tags so they contain full image IDs instead of abbreviations
+        self.expand_tag_abbreviations(available_images, remote_tags)
+        # keep only the tags this repository mirrors. This happens before any
+        # ancestry is retrieved, so unwanted tags cost no further downloads.
+        return self.filter_tags(remote_tags, download_dir, repository)
+
+    def filter_tags(self, tags, download_dir, repository=None):
+        """
+        Apply the tag filters from the importer config to the given tags. Tags
+        are first selected by the include and exclude patterns, and then, if a
+        maximum number of tags is configured, only the tags pointing to the most
+        recently created images are kept. Determining creation times requires
+        the "json" file of each remaining tagged image, which is much smaller
+        than its ancestry and layers.
+
+        :param tags:            dictionary of tag:image_id, with full image IDs
+        :type  tags:            dict
+        :param download_dir:    full path to the directory in which image files
+                                are downloaded
+        :type  download_dir:    basestring
+        :param repository:      upstream repository the tags came from. Defaults
+                                to the parent step's first upstream repository.
+        :type  repository:      pulp_docker.plugins.registry.Repository
+
+        :return:    dictionary of tag:image_id for the tags that should be synced
+        :rtype:     dict
+        """
+        config = self.get_config()
+        include = configuration.get_list_config(config, constants.CONFIG_KEY_INCLUDE_TAGS)
+        exclude = configuration.get_list_config(config, constants.CONFIG_KEY_EXCLUDE_TAGS)
+        regex = config.get_boolean(constants.CONFIG_KEY_TAG_FILTER_REGEX) or False
+        tags = docker_tags.filter_tags(tags, include, exclude, regex)
+
+        max_tags = configuration.get_max_tags(config)
+        if max_tags is not None and len(tags) > max_tags:
+            tagged_image_ids = list(set(tags.values()))
+            repository = repository or self.parent.index_repository
+            repository.get_image_json(tagged_image_ids)
+            created = {}
+            for image_id in tagged_image_ids:
+                created[image_id] = self.find_and_read_json_file(image_id,
+                                                                 download_dir).get('created')
+            tags = docker_tags.get_newest_tags(tags, created, max_tags)
+
+        _logger.debug('syncing tags: %s' % ', '.join(sorted(tags)))
+        return tags
 
     @staticmethod
     def expand_tag_abbreviations(image_ids, tags):
@@ -191,8 +342,53 @@ class GetMetadataStep(PluginStep):
         with open(os.path.join(parent_dir, image_id, 'ancestry')) as ancestry_file:
             return json.load(ancestry_file)
 
+    @staticmethod
+    def find_and_read_json_file(image_id, parent_dir):
+        """
+        Given an image ID, find it's file directory in the given parent directory
+        (it will be a directory whose name in the image_id), open the "json"
+        file within it, deserialize its contents, and return the result.
+
+        :param image_id:    unique ID of a docker image
+        :type  image_id:    basestring
+        :param parent_dir:  full path to the parent directory in which we should
+                            look for a directory whose name is the image_id
+        :type  parent_dir:  basestring
+
+        :return:    docker metadata for the image
+        :rtype:     dict
+        """
+        with open(os.path.join(parent_dir, image_id, 'json')) as json_file:
+            return json.load(json_file)
+
+
+class GetLocalImagesStep(metrics.TimedStepMixin, GetLocalUnitsStep):
+    def __init__(self, *args, **kwargs):
+        super(GetLocalImagesStep, self).__init__(*args, **kwargs)
+        # keys are the IDs of available images that already exist in pulp, and
+        # values are dictionaries with keys "parent_id" and "size"
+        self.existing_images = {}
+
+    def process_main(self):
+        """
+        Determine which of the available units already exist in pulp. During a
+        dry run, the units that already exist are not added to the repository,
+        but the units that would need to be downloaded are still determined.
+        """
+        if not getattr(self.parent, 'dry_run', False):
+            super(GetLocalImagesStep, self).process_main()
+            self.metrics.units = len(self.parent.available_units) - len(self.units_to_download)
+            return
+
+        existing_ids = set()
+        for unit_dict in self.content_query_manager.get_multiple_units_by_keys_dicts(
+                self.unit_type, self.parent.available_units, self.unit_key_fields):
+            existing_ids.add(unit_dict['image_id'])
+        for unit_key in self.parent.available_units:
+            if unit_key['image_id'] not in existing_ids:
+                self.units_to_download.append(unit_key)
+        self.metrics.units = len(existing_ids)
 
-class GetLocalImagesStep(GetLocalUnitsStep):
     def _dict_to_unit(self, unit_dict):
         """
         convert a unit dictionary (a flat dict that has all unit key, metadata,
@@ -208,13 +404,207 @@ class GetLocalImagesStep(GetLocalUnitsStep):
         :return:    a unit instance
         :rtype:     pulp.plugins.model.Unit
         """
+        self.existing_images[unit_dict['image_id']] = {'parent_id': unit_dict.get('parent_id'),
+                                                       'size': unit_dict.get('size')}
         model = DockerImage(unit_dict['image_id'], unit_dict.get('parent_id'),
-                            unit_dict.get('size'))
+                            unit_dict.get('size'), unit_dict.get('virtual_size'),
+                            unit_dict.get('depth'), unit_dict.get('stored_size'),
+                            unit_dict.get('layer_size'), unit_dict.get('checksum'))
         return self.get_conduit().init_unit(model.TYPE_ID, model.unit_key, model.unit_metadata,
                                             model.relative_path)
 
 
-class SaveUnits(PluginStep):
+class DockerDownloadStep(metrics.TimedStepMixin, DownloadStep):
+    """
+    Downloads image files. If the importer config enables adaptive downloads,
+    the requests are processed in windows, and the number of concurrent
+    downloads is adjusted after each window based on the throughput, latency
+    and error rate observed. The chosen values are included in the progress
+    report.
+    """
+
+    # each window contains this many requests per concurrent download
+    WINDOW_FACTOR = 4
+
+    def __init__(self, step_type, downloads=None, repo=None, config=None, working_dir=None,
+                 description=''):
+        """
+        :param step_type:   unique ID of this step
+        :type  step_type:   basestring
+        :param downloads:   iterable of DownloadRequest instances
+        :type  downloads:   iterable
+        :param repo:        repository to sync
+        :type  repo:        pulp.plugins.model.Repository
+        :param config:      config object for the sync
+        :type  config:      pulp.plugins.config.PluginCallConfiguration
+        :param working_dir: full path to the directory in which files are downloaded
+        :type  working_dir: basestring
+        :param description: user-friendly description of this step
+        :type  description: basestring
+        """
+        super(DockerDownloadStep, self).__init__(step_type, downloads=downloads, repo=repo,
+                                                 config=config, working_dir=working_dir,
+                                                 description=description)
+        self.controller = None
+        # wall time spent downloading, not counting initialization
+        self.elapsed = 0.0
+
+    def _process_block(self, item=None):
+        """
+        Download all of the requests, keeping track of how long it takes.
+        """
+        start = time.time()
+        try:
+            self._download_all()
+        finally:
+            self.elapsed = time.time() - start
+
+    def _download_all(self):
+        """
+        Download all of the requests, either with the fixed concurrency from the
+        importer config, or adaptively.
+        """
+        config = self.get_config()
+        if not config.get_boolean(constants.CONFIG_KEY_ADAPTIVE_DOWNLOADS):
+            return super(DockerDownloadStep, self)._process_block()
+
+        flat_config = config.flatten()
+        initial = nectar_config.importer_config_to_nectar_config(flat_config).max_concurrent
+        maximum = configuration.get_max_adaptive_downloads(config)
+        self.controller = concurrency.AIMDController(initial or 1, maximum=maximum)
+
+        downloads = iter(self.downloads)
+        while not self.canceled:
+            window = list(itertools.islice(downloads,
+                                           self.controller.concurrency * self.WINDOW_FACTOR))
+            if not window:
+                break
+            flat_config[importer_constants.KEY_MAX_DOWNLOADS] = self.controller.concurrency
+            download_config = nectar_config.importer_config_to_nectar_config(flat_config)
+            self.downloader = self._get_downloader(download_config, window[0].url)
+            start = time.time()
+            self.downloader.download(window)
+            self.controller.adjust(time.time() - start)
+            self.progress_details = self.controller.get_report()
+
+    def _get_downloader(self, download_config, url):
+        """
+        :param download_config: configuration for the downloader
+        :type  download_config: nectar.config.DownloaderConfig
+        :param url:             URL of one of the files to download
+        :type  url:             basestring
+
+        :return:    a downloader that reads local files if the URL is a file://
+                    URL, else one that downloads over HTTP
+        :rtype:     nectar.downloaders.base.Downloader
+        """
+        if urlparse.urlsplit(url).scheme == 'file':
+            return LocalFileDownloader(download_config, self)
+        return HTTPThreadedDownloader(download_config, self)
+
+    def get_throughput(self):
+        """
+        :return:    bytes per second downloaded by this step, or 0 if it has not
+                    downloaded anything
+        :rtype:     float
+        """
+        if not self.elapsed:
+            return 0.0
+        return self.metrics.bytes / self.elapsed
+
+    def download_succeeded(self, report):
+        """
+        Record the download with the concurrency controller, if there is one.
+
+        :param report:  report for the finished download
+        :type  report:  nectar.report.DownloadReport
+        """
+        self.metrics.record_download(report)
+        if self.controller is not None:
+            self.controller.record(report)
+        super(DockerDownloadStep, self).download_succeeded(report)
+
+    def download_failed(self, report):
+        """
+        Record the download with the concurrency controller, if there is one.
+
+        :param report:  report for the failed download
+        :type  report:  nectar.report.DownloadReport
+        """
+        self.metrics.record_download(report, succeeded=False)
+        if self.controller is not None:
+            self.controller.record(report, succeeded=False)
+        super(DockerDownloadStep, self).download_failed(report)
+
+
+class PlanSyncStep(metrics.TimedStepMixin, PluginStep):
+    def __init__(self, working_dir):
+        """
+        :param working_dir: full path to the directory into which the json files
+                            of the missing images were downloaded. This directory
+                            should contain one directory for each docker image,
+                            with the ID of the docker image as its name.
+        :type  working_dir: basestring
+        """
+        super(PlanSyncStep, self).__init__(step_type=constants.SYNC_STEP_PLAN,
+                                           plugin_type=constants.IMPORTER_TYPE_ID,
+                                           working_dir=working_dir)
+        self.description = _('Planning sync')
+
+    def process_main(self):
+        """
+        Report how many images a sync would download, their total size as
+        reported by docker, which tags point at them, and about how long the
+        transfer would take. No layers are downloaded and the repository is not
+        changed.
+        """
+        _logger.debug(self.description)
+        missing_ids = set(unit_key['image_id'] for unit_key in
+                          self.parent.step_get_local_units.units_to_download)
+
+        total_size = 0
+        for image_id in missing_ids:
+            with open(os.path.join(self.working_dir, image_id, 'json')) as json_file:
+                metadata = json.load(json_file)
+            # at least one old docker image did not have a size specified in
+            # its metadata
+            total_size += metadata.get('Size') or 0
+
+        affected_tags = []
+        for tag, image_id in self.parent.tags.items():
+            ancestry = GetMetadataStep.find_and_read_ancestry_file(image_id, self.working_dir)
+            if missing_ids.intersection(ancestry):
+                affected_tags.append(tag)
+
+        self.progress_details = {
+            'images_to_download': len(missing_ids),
+            'total_size': total_size,
+            'affected_tags': sorted(affected_tags),
+            'estimated_seconds': self.estimate_seconds(total_size),
+        }
+
+    def estimate_seconds(self, total_size):
+        """
+        Estimate how long downloading the given number of bytes would take. This
+        uses the importer's max_speed if it is set, and otherwise the throughput
+        observed while downloading the json files. The latter mostly measures
+        latency, so treat the result as a rough upper bound.
+
+        :param total_size:  number of bytes to download
+        :type  total_size:  int
+
+        :return:    estimated number of seconds, or None if no rate is known
+        :rtype:     int or NoneType
+        """
+        rate = self.get_config().get(importer_constants.KEY_MAX_SPEED)
+        if not rate:
+            rate = self.parent.step_download.get_throughput()
+        if not rate:
+            return None
+        return int(total_size / float(rate))
+
+
+class SaveUnits(metrics.TimedStepMixin, PluginStep):
     def __init__(self, working_dir):
         """
         :param working_dir: full path to the directory into which image files
@@ -235,6 +625,7 @@ class SaveUnits(PluginStep):
         the database and into the repository.
         """
         _logger.debug(self.description)
+        images = {}
         for unit_key in self.parent.step_get_local_units.units_to_download:
             image_id = unit_key['image_id']
             with open(os.path.join(self.working_dir, image_id, 'json')) as json_file:
@@ -244,16 +635,28 @@ class SaveUnits(PluginStep):
             size = metadata.get('Size')
             # an older version of docker used a lowercase "p"
             parent = metadata.get('parent', metadata.get('Parent'))
-            model = DockerImage(image_id, parent, size)
+            images[image_id] = {'parent_id': parent, 'size': size}
+        for image_id, rollup in sizes.get_rollups(images).iteritems():
+            images[image_id].update(rollup)
+            image_dir = os.path.join(self.working_dir, image_id)
+            images[image_id]['stored_size'] = sizes.get_stored_size(image_dir)
+            images[image_id].update(sizes.get_layer_details(image_dir))
+
+        for model in DockerImage.from_metadata(images):
             unit = self.get_conduit().init_unit(model.TYPE_ID, model.unit_key, model.unit_metadata,
                                                 model.relative_path)
 
             self.move_files(unit)
-            _logger.debug('saving image %s' % image_id)
+            _logger.debug('saving image %s' % model.image_id)
             self.get_conduit().save_unit(unit)
+            self.metrics.units += 1
 
         _logger.debug('updating tags for repo %s' % self.get_repo().id)
         tags.update_tags(self.get_repo().id, self.parent.tags)
+        # images that already existed in pulp were associated too, and any of
+        # them that are already in the index are skipped
+        images.update(self.parent.step_get_local_units.existing_images)
+        ancestry_index.add_images(self.get_repo().id, images)
 
     def move_files(self, unit):
         """
@@ -276,3 +679,47 @@ class SaveUnits(PluginStep):
 
         for name in ('json', 'ancestry', 'layer'):
             shutil.move(os.path.join(source_dir, name), os.path.join(unit.storage_path, name))
+
+
+class GarbageCollectStep(metrics.TimedStepMixin, PluginStep):
+    def __init__(self, working_dir):
+        """
+        :param working_dir: full path to the working directory of the sync
+        :type  working_dir: basestring
+        """
+        super(GarbageCollectStep, self).__init__(step_type=constants.SYNC_STEP_GARBAGE_COLLECT,
+                                                 plugin_type=constants.IMPORTER_TYPE_ID,
+                                                 working_dir=working_dir)
+        self.description = _('Removing unreachable images')
+
+    def process_main(self):
+        """
+        Remove every image in the repository that is neither tagged nor an
+        ancestor of a tagged image, including the images and tags this sync is
+        adding. In a dry run, only report what would be removed.
+        """
+        _logger.debug(self.description)
+        repo_id = self.get_repo().id
+        # a dry run must not write anything, including an index that has to be built
+        images = ancestry_index.get_index(repo_id, save=not self.parent.dry_run)
+        parents = dict((image_id, image['parent']) for image_id, image in images.iteritems())
+
+        scratchpad = self.get_conduit().get_repo_scratchpad() or {}
+        roots = set(docker_tags.TagIndex(scratchpad.get(u'tags', [])).to_dict().values())
+        roots.update(self.parent.tags.values())
+        # every image the synced tags need, which in a dry run may not be in
+        # the repository yet
+        roots.update(unit_key['image_id'] for unit_key in self.parent.available_units)
+
+        unreachable = ancestry.get_unreachable(set(images), roots, parents)
+        self.metrics.units = len(unreachable)
+        self.progress_details = {
+            'images_removed': len(unreachable),
+            'bytes_freed': associations.get_total_size(images[i] for i in unreachable),
+            'dry_run': self.parent.dry_run,
+        }
+        if unreachable and not self.parent.dry_run:
+            _logger.info(_('removing %(count)d unreachable images from repository %(repo)s') %
+                         {'count': len(unreachable), 'repo': repo_id})
+            associations.unassociate_images(repo_id, unreachable)
+            ancestry_index.remove_images(repo_id, unreachable)
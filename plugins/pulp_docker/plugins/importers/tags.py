@@ -1,17 +1,122 @@
+from gettext import gettext as _
+
+from pulp.server.db.model.repository import Repo
+from pulp.server.exceptions import PulpExecutionException
 from pulp.server.managers import factory
-from pulp_docker.common import tags
+from pulp_docker.common import constants
+
+
+# path of the tag list within a repository document
+TAGS_FIELD = 'scratchpad.tags'
+# number of times the tags are read and written before giving up, if other
+# processes keep changing them in between
+UPDATE_ATTEMPTS = 3
 
 
 def update_tags(repo_id, new_tags):
     """
-    Gets the current scratchpad's tags and updates them with the new_tags
+    Point each of the new tags at its image. Only the tags that are new or that
+    point at a different image are written, all in a single atomic update, so
+    the rest of the tag list is never rewritten. That update only applies if
+    the tag list has not changed since it was read; otherwise it is read again
+    and the update is retried.
+
+    :param repo_id:     unique ID of a repository
+    :type  repo_id:     basestring
+    :param new_tags:    dictionary of tag:image_id
+    :type  new_tags:    dict
+
+    :raises pulp.server.exceptions.MissingResource: if the repository does not exist
+    :raises pulp.server.exceptions.PulpExecutionException: if other processes
+            kept changing the tags
+    """
+    collection = Repo.get_collection()
+    for attempt in range(UPDATE_ATTEMPTS):
+        scratchpad = factory.repo_manager().get_repo_scratchpad(repo_id)
+        spec, document = _get_tags_update(repo_id, scratchpad.get(u'tags') or [], new_tags)
+        if document is None:
+            return
+        if collection.update(spec, document, safe=True).get('n'):
+            return
+    raise PulpExecutionException(_('The tags of repository %(repo)s changed while they were '
+                                   'being updated') % {'repo': repo_id})
+
+
+def _get_tags_update(repo_id, tag_list, new_tags):
+    """
+    Build the update that changes the tags that point at a different image in
+    place, by their positions in the tag list, and appends the new tags. The
+    update only matches the repository while its tag list has the same length,
+    still has each changed tag at the same position, and has none of the new
+    tags.
 
     :param repo_id:     unique ID of a repository
     :type  repo_id:     basestring
+    :param tag_list:    the repository's tags, as stored on its scratchpad
+    :type  tag_list:    list of dict
     :param new_tags:    dictionary of tag:image_id
     :type  new_tags:    dict
+
+    :return:    the spec and document of the update, or None for both if no tag
+                needs to change
+    :rtype:     tuple
+    """
+    # keys are tag names, values are their positions in the list
+    positions = dict((tag_dict[constants.IMAGE_TAG_KEY], position)
+                     for position, tag_dict in enumerate(tag_list))
+    spec = {'id': repo_id}
+    changes = {}
+    added = []
+    for tag, image_id in sorted(new_tags.iteritems()):
+        position = positions.get(tag)
+        if position is None:
+            position = len(tag_list) + len(added)
+            changes['%s.%d' % (TAGS_FIELD, position)] = {constants.IMAGE_TAG_KEY: tag,
+                                                         constants.IMAGE_ID_KEY: image_id}
+            added.append(tag)
+        elif tag_list[position][constants.IMAGE_ID_KEY] != image_id:
+            spec['%s.%d.%s' % (TAGS_FIELD, position, constants.IMAGE_TAG_KEY)] = tag
+            changes['%s.%d.%s' % (TAGS_FIELD, position, constants.IMAGE_ID_KEY)] = image_id
+    if not changes:
+        return None, None
+
+    if not tag_list:
+        # there is no list to set positions in, if the repository has never had tags
+        spec['$or'] = [{TAGS_FIELD: {'$exists': False}}, {TAGS_FIELD: {'$size': 0}}]
+        return spec, {'$set': {TAGS_FIELD: [changes['%s.%d' % (TAGS_FIELD, index)]
+                                            for index in range(len(added))]}}
+    spec[TAGS_FIELD] = {'$size': len(tag_list)}
+    if added:
+        spec['%s.%s' % (TAGS_FIELD, constants.IMAGE_TAG_KEY)] = {'$nin': added}
+    return spec, {'$set': changes}
+
+
+def remove_image_tags(repo_id, image_ids):
+    """
+    Remove all tags that point to any of the given images with a single atomic
+    update.
+
+    :param repo_id:     unique ID of a repository
+    :type  repo_id:     basestring
+    :param image_ids:   IDs of the images whose tags should be removed
+    :type  image_ids:   iterable
+    """
+    _pull_tags(repo_id, constants.IMAGE_ID_KEY, image_ids)
+
+
+def _pull_tags(repo_id, key, values):
+    """
+    Remove the tags whose value for the given key is one of the given values.
+
+    :param repo_id: unique ID of a repository
+    :type  repo_id: basestring
+    :param key:     either constants.IMAGE_TAG_KEY or constants.IMAGE_ID_KEY
+    :type  key:     basestring
+    :param values:  values of the key to remove tags for
+    :type  values:  iterable
     """
-    repo_manager = factory.repo_manager()
-    scratchpad = repo_manager.get_repo_scratchpad(repo_id)
-    new_tags = tags.generate_updated_tags(scratchpad, new_tags)
-    repo_manager.update_repo_scratchpad(repo_id, {'tags': new_tags})
+    values = list(values)
+    if values:
+        Repo.get_collection().update({'id': repo_id},
+                                     {'$pull': {TAGS_FIELD: {key: {'$in': values}}}},
+                                     safe=True)
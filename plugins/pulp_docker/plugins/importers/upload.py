@@ -6,7 +6,7 @@ import os
 import tarfile
 
 from pulp_docker.common import models, tarutils
-from pulp_docker.plugins.importers import tags
+from pulp_docker.plugins.importers import sizes, tags
 
 
 def get_models(metadata, mask_id=''):
@@ -68,10 +68,14 @@ def save_models(conduit, models, ancestry, tarfile_path):
                             of "docker save"
     :type  tarfile_path:    basestring
     """
+    images = dict((model.image_id, {'parent_id': model.parent_id, 'size': model.size})
+                  for model in models)
+    rollups = sizes.get_rollups(images)
     with contextlib.closing(tarfile.open(tarfile_path)) as archive:
         for i, model in enumerate(models):
+            metadata = dict(model.unit_metadata, **rollups[model.image_id])
             unit = conduit.init_unit(model.TYPE_ID, model.unit_key,
-                                     model.unit_metadata, model.relative_path)
+                                     metadata, model.relative_path)
 
             # skip saving files if they already exist, which could happen if the
             # unit already existed in pulp
@@ -94,6 +98,8 @@ def save_models(conduit, models, ancestry, tarfile_path):
                         for chunk in iter(reader, ''):
                             layer_dest.write(chunk)
 
+            unit.metadata['stored_size'] = sizes.get_stored_size(unit.storage_path)
+            unit.metadata.update(sizes.get_layer_details(unit.storage_path))
             conduit.save_unit(unit)
 
 
@@ -0,0 +1,184 @@
+import datetime
+import json
+import logging
+import time
+import urlparse
+
+
+# structured metrics are logged here, one json document per line, so they can
+# be routed to their own log file
+_metrics_logger = logging.getLogger('pulp_docker.metrics')
+
+
+class Metrics(object):
+    """
+    Counters describing the work done by one phase of an operation: how long it
+    took, how many requests it made and how many bytes it transferred, both in
+    total and for each remote endpoint.
+    """
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.bytes = 0
+        self.units = 0
+        # keys are host names, values are dicts of counters for that host
+        self.endpoints = {}
+
+    def record_download(self, report, succeeded=True):
+        """
+        Record one finished download.
+
+        :param report:      report for the finished download
+        :type  report:      nectar.report.DownloadReport
+        :param succeeded:   True if the download succeeded
+        :type  succeeded:   bool
+        """
+        size = report.bytes_downloaded or 0
+        host = urlparse.urlsplit(report.url).netloc
+        endpoint = self.endpoints.setdefault(host, {'requests': 0, 'failures': 0,
+                                                    'bytes': 0, 'seconds': 0.0})
+        self.requests += 1
+        self.bytes += size
+        endpoint['requests'] += 1
+        endpoint['bytes'] += size
+        endpoint['seconds'] += get_duration(report.start_time, report.finish_time)
+        if not succeeded:
+            self.failures += 1
+            endpoint['failures'] += 1
+
+    def merge(self, other):
+        """
+        Add the counters from another Metrics instance to this one, except for
+        the wall time, which is measured independently.
+
+        :param other:   metrics to add
+        :type  other:   Metrics
+        """
+        self.requests += other.requests
+        self.failures += other.failures
+        self.bytes += other.bytes
+        self.units += other.units
+        for host, counters in other.endpoints.items():
+            endpoint = self.endpoints.setdefault(host, {'requests': 0, 'failures': 0,
+                                                        'bytes': 0, 'seconds': 0.0})
+            for key, value in counters.items():
+                endpoint[key] += value
+
+    def to_dict(self):
+        """
+        :return:    json-serializable representation of these metrics, suitable
+                    for inclusion in a report
+        :rtype:     dict
+        """
+        endpoints = {}
+        for host, counters in self.endpoints.items():
+            endpoint = dict(counters)
+            endpoint['seconds'] = round(endpoint['seconds'], 3)
+            endpoint['bytes_per_second'] = _rate(counters['bytes'], counters['seconds'])
+            endpoints[host] = endpoint
+        return {
+            'wall_time': round(self.wall_time, 3),
+            'requests': self.requests,
+            'failures': self.failures,
+            'bytes': self.bytes,
+            'bytes_per_second': _rate(self.bytes, self.wall_time),
+            'units': self.units,
+            'endpoints': endpoints,
+        }
+
+
+class TimedStepMixin(object):
+    """
+    Mix into a step to measure the wall time between its initialization and
+    finalization. The step's "metrics" attribute can be used to record any
+    other counters.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TimedStepMixin, self).__init__(*args, **kwargs)
+        self.metrics = Metrics()
+        self._start_time = None
+
+    def initialize(self):
+        """
+        Start the clock, then initialize the step.
+        """
+        self._start_time = time.time()
+        super(TimedStepMixin, self).initialize()
+
+    def finalize(self):
+        """
+        Finalize the step, then stop the clock.
+        """
+        super(TimedStepMixin, self).finalize()
+        if self._start_time is not None:
+            self.metrics.wall_time += time.time() - self._start_time
+            self._start_time = None
+
+
+def report_metrics(step, operation):
+    """
+    Collect the metrics recorded by each child of a step, add them to the
+    step's progress details so they are included in its final report, and
+    write them to the structured metrics log.
+
+    :param step:        step whose children are the phases of the operation
+    :type  step:        pulp.plugins.util.publish_step.Step
+    :param operation:   name of the operation, such as "sync"
+    :type  operation:   basestring
+    """
+    phases = {}
+    for child in step.children:
+        if hasattr(child, 'metrics'):
+            phases[child.step_id] = child.metrics.to_dict()
+    step.progress_details = {'metrics': phases}
+    log_metrics(operation, step.get_repo().id, phases)
+
+
+def log_metrics(operation, repo_id, phases):
+    """
+    Write metrics to the structured metrics log as a single json document.
+
+    :param operation:   name of the operation, such as "sync"
+    :type  operation:   basestring
+    :param repo_id:     ID of the repository the operation ran on
+    :type  repo_id:     basestring
+    :param phases:      dictionary where keys are phase names and values are
+                        dictionaries as returned by Metrics.to_dict
+    :type  phases:      dict
+    """
+    document = {'operation': operation, 'repo_id': repo_id, 'phases': phases}
+    _metrics_logger.info(json.dumps(document, sort_keys=True))
+
+
+def get_duration(start_time, finish_time):
+    """
+    Return the number of seconds between two points in time, as found on a
+    nectar download report. Missing values count as no time having passed.
+
+    :param start_time:  when the download started
+    :type  start_time:  datetime.datetime, float or NoneType
+    :param finish_time: when the download finished
+    :type  finish_time: datetime.datetime, float or NoneType
+
+    :return:    number of seconds between the two
+    :rtype:     float
+    """
+    if start_time is None or finish_time is None:
+        return 0.0
+    delta = finish_time - start_time
+    if isinstance(delta, datetime.timedelta):
+        return delta.days * 86400 + delta.seconds + delta.microseconds / 1000000.0
+    return float(delta)
+
+
+def _rate(count, seconds):
+    """
+    :return:    count divided by seconds, rounded to an int, or 0 if no time passed
+    :rtype:     int
+    """
+    if seconds <= 0:
+        return 0
+    return int(count / seconds)
@@ -3,12 +3,15 @@ import errno
 import json
 import logging
 import os
+import tempfile
 import urlparse
 
 from nectar.downloaders.threaded import HTTPThreadedDownloader
 from nectar.listener import AggregatingEventListener
 from nectar.request import DownloadRequest
 
+from pulp_docker.plugins.metrics import Metrics
+
 
 _logger = logging.getLogger(__name__)
 
@@ -17,6 +20,7 @@ class Repository(object):
     IMAGES_PATH = '/v1/repositories/%s/images'
     TAGS_PATH = '/v1/repositories/%s/tags'
     ANCESTRY_PATH = '/v1/images/%s/ancestry'
+    JSON_PATH = '/v1/images/%s/json'
 
     DOCKER_TOKEN_HEADER = 'x-docker-token'
     DOCKER_ENDPOINT_HEADER = 'x-docker-endpoints'
@@ -41,6 +45,8 @@ class Repository(object):
         self.working_dir = working_dir
         self.token = None
         self.endpoint = None
+        # counts the requests made and bytes transferred by this object
+        self.metrics = Metrics()
 
     def _get_single_path(self, path):
         """
@@ -64,7 +70,9 @@ class Repository(object):
         report = self.downloader.download_one(request)
 
         if report.state == report.DOWNLOAD_FAILED:
+            self.metrics.record_download(report, succeeded=False)
             raise IOError(report.error_msg)
+        self.metrics.record_download(report)
 
         self._parse_response_headers(report.headers)
         return json.loads(report.destination.getvalue())
@@ -134,23 +142,73 @@ class Repository(object):
 
         :raises IOError:    if a download fails
         """
+        _logger.debug('retrieving ancestry files from remote registry')
+        self._get_image_files(image_ids, self.ANCESTRY_PATH)
+
+    def get_image_json(self, image_ids):
+        """
+        Retrieve the "json" metadata file for each provided image ID, and save
+        each in a directory whose name is the image ID.
+
+        :param image_ids:   list of image IDs for which the json file should be
+                            retrieved
+        :type  image_ids:   list
+
+        :raises IOError:    if a download fails
+        """
+        _logger.debug('retrieving json files from remote registry')
+        self._get_image_files(image_ids, self.JSON_PATH)
+
+    def _get_image_files(self, image_ids, path_template):
+        """
+        Retrieve one file for each provided image ID, and save each in a
+        directory whose name is the image ID. The file is named after the last
+        component of the path template. Each file is downloaded to a temporary
+        file of its own and then renamed into place, since other repositories
+        that share the working directory may be retrieving the same file at the
+        same time.
+
+        :param image_ids:       list of image IDs for which the file should be
+                                retrieved
+        :type  image_ids:       list
+        :param path_template:   path on the registry with one "%s" placeholder
+                                for the image ID, such as ANCESTRY_PATH
+        :type  path_template:   basestring
+
+        :raises IOError:    if a download fails
+        """
+        file_name = path_template.rsplit('/', 1)[-1]
         requests = []
         for image_id in image_ids:
-            path = self.ANCESTRY_PATH % image_id
+            path = path_template % image_id
             url = urlparse.urljoin(self.get_image_url(), path)
-            destination = os.path.join(self.working_dir, image_id, 'ancestry')
+            destination = os.path.join(self.working_dir, image_id, file_name)
             try:
                 os.mkdir(os.path.split(destination)[0])
             except OSError, e:
                 # it's ok if the directory already exists
                 if e.errno != errno.EEXIST:
                     raise
-            request = DownloadRequest(url, destination)
+            temp_fd, temp_path = tempfile.mkstemp(prefix=file_name + '.',
+                                                  dir=os.path.split(destination)[0])
+            os.close(temp_fd)
+            request = DownloadRequest(url, temp_path, data=destination)
             self.add_auth_header(request)
             requests.append(request)
 
-        _logger.debug('retrieving ancestry files from remote registry')
-        self.downloader.download(requests)
+        succeeded_count = len(self.listener.succeeded_reports)
+        failed_count = len(self.listener.failed_reports)
+        try:
+            self.downloader.download(requests)
+            for report in self.listener.succeeded_reports[succeeded_count:]:
+                self.metrics.record_download(report)
+                os.rename(report.destination, report.data)
+            for report in self.listener.failed_reports[failed_count:]:
+                self.metrics.record_download(report, succeeded=False)
+        finally:
+            for request in requests:
+                if os.path.exists(request.destination):
+                    os.remove(request.destination)
         if len(self.listener.failed_reports):
             raise IOError(self.listener.failed_reports[0].error_msg)
 
@@ -0,0 +1,123 @@
+import Queue
+import sys
+import threading
+
+
+# number of threads that are started if none is specified
+DEFAULT_WORKERS = 4
+# number of items that may be waiting for each thread before adding another
+# item blocks
+QUEUE_DEPTH = 4
+
+
+class WorkerPool(object):
+    """
+    Calls a function with each item that is added, in a bounded number of
+    threads. Items are queued with "add", which blocks if the threads have
+    fallen too far behind, so that items can be produced while earlier ones
+    are processed. Once any call raises an exception, the items that have not
+    been started are skipped.
+    """
+
+    def __init__(self, function, workers=DEFAULT_WORKERS):
+        """
+        :param function:    function to call with the arguments of each item
+        :type  function:    callable
+        :param workers:     number of threads
+        :type  workers:     int
+        """
+        self.function = function
+        self.workers = max(1, workers)
+        self._queue = Queue.Queue(maxsize=self.workers * QUEUE_DEPTH)
+        self._threads = []
+        self._errors = []
+
+    def start(self):
+        """
+        Start the threads.
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def add(self, *args):
+        """
+        Queue a call of the function with the given arguments. If any earlier
+        call failed, its exception is raised instead.
+        """
+        self.check()
+        self._queue.put(args)
+
+    def join(self):
+        """
+        Wait for every queued item to be processed or skipped, then stop the
+        threads.
+        """
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def check(self):
+        """
+        Re-raise the first exception raised by a call, if any.
+        """
+        if self._errors:
+            raise self._errors[0][0], self._errors[0][1], self._errors[0][2]
+
+    def _work(self):
+        """
+        Process queued items until told to stop.
+        """
+        while True:
+            args = self._queue.get()
+            if args is None:
+                return
+            if self._errors:
+                # the work is going to fail, so don't bother
+                continue
+            try:
+                self.function(*args)
+            except Exception:
+                self._errors.append(sys.exc_info())
+
+
+def run(function, items, workers=DEFAULT_WORKERS):
+    """
+    Call a function with each item, in a bounded number of threads, and wait
+    for all of the calls to finish. If any call raises an exception, the items
+    that have not been started are skipped, and the first exception is
+    re-raised once every thread has stopped.
+
+    :param function:    function to call with one argument
+    :type  function:    callable
+    :param items:       arguments to call the function with
+    :type  items:       list
+    :param workers:     number of threads
+    :type  workers:     int
+
+    :return:    return values of the calls, in the same order as the items
+    :rtype:     list
+    """
+    if len(items) == 1:
+        # no need for a thread
+        return [function(items[0])]
+
+    results = [None] * len(items)
+
+    def call(index, item):
+        results[index] = function(item)
+
+    pool = WorkerPool(call, min(workers, len(items)))
+    pool.start()
+    try:
+        for index, item in enumerate(items):
+            pool.add(index, item)
+    finally:
+        # no thread may be left running
+        pool.join()
+    pool.check()
+    return results
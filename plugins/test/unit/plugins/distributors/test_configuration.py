@@ -1,3 +1,4 @@
+import datetime
 import os
 import shutil
 import tempfile
@@ -71,6 +72,104 @@ class TestValidateConfig(unittest.TestCase):
         assert_validation_exception(configuration.validate_config,
                                     [error_codes.DKR1004], config)
 
+    def test_configuration_force_publish_bad_str(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_FORCE_PUBLISH: 'apple'
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1004], config)
+
+    def test_configuration_redirect_file_version(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_REDIRECT_FILE_VERSION: '2'
+        }, {})
+
+        self.assertEquals((True, None), configuration.validate_config(config))
+
+    def test_configuration_redirect_file_version_unsupported(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_REDIRECT_FILE_VERSION: 3
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1005], config)
+
+    def test_configuration_export_base_manifest_missing(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXPORT_BASE_MANIFEST: '/does/not/exist.json'
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1006], config)
+
+    def test_configuration_export_since(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXPORT_SINCE: '2014-10-01T12:00:00Z'
+        }, {})
+
+        self.assertEquals((True, None), configuration.validate_config(config))
+
+    def test_configuration_export_since_bad_str(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXPORT_SINCE: 'apple'
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1007], config)
+
+    def test_configuration_export_volume_size(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXPORT_VOLUME_SIZE: '1048576'
+        }, {})
+
+        self.assertEquals((True, None), configuration.validate_config(config))
+
+    def test_configuration_export_volume_size_not_positive(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXPORT_VOLUME_SIZE: 0
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1008], config)
+
+    def test_configuration_export_volume_size_bad_str(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXPORT_VOLUME_SIZE: 'apple'
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1008], config)
+
+    def test_configuration_export_format(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXPORT_FORMAT: constants.EXPORT_FORMAT_DOCKER_SAVE
+        }, {})
+
+        self.assertEquals((True, None), configuration.validate_config(config))
+
+    def test_configuration_export_format_unsupported(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXPORT_FORMAT: 'apple'
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1009], config)
+
+    def test_configuration_redirect_file_version_bad_str(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_REDIRECT_FILE_VERSION: 'apple'
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1005], config)
+
+    def test_configuration_extended_redirect_bad_str(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_EXTENDED_REDIRECT: 'apple'
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1004], config)
+
+    def test_configuration_incremental_publish_bad_str(self):
+        config = PluginCallConfiguration({
+            constants.CONFIG_KEY_INCREMENTAL_PUBLISH: 'apple'
+        }, {})
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1004], config)
+
 
 class TestConfigurationGetters(unittest.TestCase):
 
@@ -99,6 +198,53 @@ class TestConfigurationGetters(unittest.TestCase):
         directory = configuration.get_web_publish_dir(self.repo, self.config)
         self.assertEquals(directory, os.path.join(self.publish_dir, 'web', self.repo.id))
 
+    def test_get_previous_web_dir(self):
+        previous_dir = os.path.join(self.publish_dir, 'master', 'foo', '1234', 'web')
+        os.makedirs(previous_dir)
+        os.makedirs(os.path.join(self.publish_dir, 'web'))
+        os.symlink(previous_dir, os.path.join(self.publish_dir, 'web', 'foo'))
+
+        directory = configuration.get_previous_web_dir(self.repo, self.config)
+        self.assertEquals(directory, previous_dir)
+
+    def test_get_previous_web_dir_not_published(self):
+        directory = configuration.get_previous_web_dir(self.repo, self.config)
+        self.assertTrue(directory is None)
+
+    def test_get_previous_web_dir_dangling_link(self):
+        os.makedirs(os.path.join(self.publish_dir, 'web'))
+        os.symlink('/does/not/exist', os.path.join(self.publish_dir, 'web', 'foo'))
+
+        directory = configuration.get_previous_web_dir(self.repo, self.config)
+        self.assertTrue(directory is None)
+
+    def test_get_incremental_publish(self):
+        self.assertFalse(configuration.get_incremental_publish({}))
+        self.assertFalse(configuration.get_incremental_publish(
+            {constants.CONFIG_KEY_INCREMENTAL_PUBLISH: 'false'}))
+        self.assertTrue(configuration.get_incremental_publish(
+            {constants.CONFIG_KEY_INCREMENTAL_PUBLISH: 'True'}))
+        self.assertTrue(configuration.get_incremental_publish(
+            {constants.CONFIG_KEY_INCREMENTAL_PUBLISH: True}))
+
+    def test_get_redirect_file_version(self):
+        self.assertEquals(configuration.get_redirect_file_version({}), 1)
+        self.assertEquals(configuration.get_redirect_file_version(
+            {constants.CONFIG_KEY_REDIRECT_FILE_VERSION: '2'}), 2)
+
+    def test_get_redirect_shard_dir_name(self):
+        self.assertEquals(configuration.get_redirect_shard_dir_name(self.repo), 'foo')
+
+    def test_get_force_publish(self):
+        self.assertFalse(configuration.get_force_publish({}))
+        self.assertTrue(configuration.get_force_publish(
+            {constants.CONFIG_KEY_FORCE_PUBLISH: 'true'}))
+
+    def test_get_extended_redirect(self):
+        self.assertFalse(configuration.get_extended_redirect({}))
+        self.assertTrue(configuration.get_extended_redirect(
+            {constants.CONFIG_KEY_EXTENDED_REDIRECT: 'true'}))
+
     def test_get_repo_relative_path(self):
         directory = configuration.get_repo_relative_path(self.repo, self.config)
         self.assertEquals(directory, self.repo.id)
@@ -137,6 +283,35 @@ class TestConfigurationGetters(unittest.TestCase):
         result = configuration.get_export_repo_file_with_path(self.repo, config)
         self.assertEquals(result, '/tmp/foo.tar')
 
+    def test_get_export_manifest_file_with_path(self):
+        config = PluginCallConfiguration(None, {constants.CONFIG_KEY_EXPORT_FILE: '/tmp/foo.tar'})
+        result = configuration.get_export_manifest_file_with_path(self.repo, config)
+        self.assertEquals(result, '/tmp/foo-manifest.json')
+
+    def test_get_export_volume_size(self):
+        self.assertEquals(configuration.get_export_volume_size({}), None)
+        self.assertEquals(configuration.get_export_volume_size(
+            {constants.CONFIG_KEY_EXPORT_VOLUME_SIZE: '1024'}), 1024)
+
+    def test_get_export_format(self):
+        self.assertEquals(configuration.get_export_format({}), constants.EXPORT_FORMAT_CRANE)
+        self.assertEquals(configuration.get_export_format(
+            {constants.CONFIG_KEY_EXPORT_FORMAT: constants.EXPORT_FORMAT_DOCKER_SAVE}),
+            constants.EXPORT_FORMAT_DOCKER_SAVE)
+        self.assertRaises(ValueError, configuration.get_export_format,
+                          {constants.CONFIG_KEY_EXPORT_FORMAT: 'apple'})
+
+    def test_get_export_volume_file_with_path(self):
+        result = configuration.get_export_volume_file_with_path(self.repo, self.config, 2)
+        self.assertEquals(result, os.path.join(self.publish_dir, 'export', 'repo', 'foo.002.tar'))
+
+    def test_get_export_since(self):
+        self.assertEquals(configuration.get_export_since({}), None)
+        since = configuration.get_export_since(
+            {constants.CONFIG_KEY_EXPORT_SINCE: '2014-10-01T14:00:00+02:00'})
+        self.assertEquals(since.utcoffset(), datetime.timedelta(0))
+        self.assertEquals(since.replace(tzinfo=None), datetime.datetime(2014, 10, 1, 12))
+
     def test_get_export_repo_file_with_path_default(self):
         result = configuration.get_export_repo_file_with_path(self.repo, self.config)
         expected_result = os.path.join(configuration.get_export_repo_directory(self.config),
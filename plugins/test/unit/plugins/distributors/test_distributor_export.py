@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 import tempfile
@@ -11,6 +12,7 @@ from pulp.plugins.model import Repository
 from pulp.plugins.distributor import Distributor
 
 from pulp_docker.common import constants
+from pulp_docker.plugins.distributors import manifest
 from pulp_docker.plugins.distributors.distributor_export import DockerExportDistributor, entry_point
 
 
@@ -59,11 +61,30 @@ class TestBasics(unittest.TestCase):
         config = {}
         touch(os.path.join(working_dir, 'bar.json'))
         touch(os.path.join(mock_repo_dir.return_value, 'bar.tar'))
+        touch(os.path.join(mock_repo_dir.return_value, 'bar-manifest.json'))
         self.distributor.distributor_removed(repo, config)
 
         self.assertEquals(0, len(os.listdir(mock_repo_dir.return_value)))
         self.assertEquals(1, len(os.listdir(self.working_dir)))
 
+    @patch('pulp_docker.plugins.distributors.distributor_export.configuration.'
+           'get_export_repo_directory')
+    def test_distributor_removed_volumes(self, mock_repo_dir):
+        repo_dir = os.path.join(self.working_dir, 'repo')
+        mock_repo_dir.return_value = repo_dir
+        repo = Mock(id='bar', working_dir=os.path.join(self.working_dir, 'working'))
+        touch(os.path.join(repo_dir, 'bar.001.tar'))
+        touch(os.path.join(repo_dir, 'bar.002.tar'))
+        touch(os.path.join(repo_dir, 'other.tar'))
+        with open(os.path.join(repo_dir, 'bar-manifest.json'), 'w') as manifest_file:
+            json.dump({'type': manifest.MANIFEST_TYPE,
+                       'files': ['bar.001.tar', 'bar.002.tar']}, manifest_file)
+
+        self.distributor.distributor_removed(repo, {})
+
+        # only the volumes that the manifest lists are removed, with the manifest
+        self.assertEquals(os.listdir(repo_dir), ['other.tar'])
+
     @patch('pulp_docker.plugins.distributors.distributor_export.configuration.'
            'get_export_repo_directory')
     def test_distributor_removed_files_missing(self, mock_repo_dir):
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock
+
+from pulp_docker.common import constants
+from pulp_docker.plugins.distributors import fingerprint
+
+
+class TestGetFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.repo = Mock(id='foo')
+        self.conduit = Mock()
+        self.conduit.get_units.return_value = [Mock(unit_key={'image_id': 'abc'}),
+                                               Mock(unit_key={'image_id': 'def'})]
+        self.conduit.get_repo_scratchpad.return_value = {
+            u'tags': [{constants.IMAGE_TAG_KEY: 'latest', constants.IMAGE_ID_KEY: 'abc'}]}
+        self.config = {constants.CONFIG_KEY_REDIRECT_URL: 'http://pulpproject.org/foo/'}
+
+    def test_stable(self):
+        first = fingerprint.get_fingerprint(self.repo, self.conduit, self.config)
+        self.conduit.get_units.return_value.reverse()
+        second = fingerprint.get_fingerprint(self.repo, self.conduit, self.config)
+
+        self.assertEqual(first, second)
+        criteria = self.conduit.get_units.call_args[0][0]
+        self.assertEqual(criteria.type_ids, [constants.IMAGE_TYPE_ID])
+
+    def test_images_changed(self):
+        first = fingerprint.get_fingerprint(self.repo, self.conduit, self.config)
+        self.conduit.get_units.return_value.pop()
+        second = fingerprint.get_fingerprint(self.repo, self.conduit, self.config)
+
+        self.assertNotEqual(first, second)
+
+    def test_tags_changed(self):
+        first = fingerprint.get_fingerprint(self.repo, self.conduit, self.config)
+        self.conduit.get_repo_scratchpad.return_value = {
+            u'tags': [{constants.IMAGE_TAG_KEY: 'latest', constants.IMAGE_ID_KEY: 'def'}]}
+        second = fingerprint.get_fingerprint(self.repo, self.conduit, self.config)
+
+        self.assertNotEqual(first, second)
+
+    def test_config_changed(self):
+        first = fingerprint.get_fingerprint(self.repo, self.conduit, self.config)
+        self.config[constants.CONFIG_KEY_PROTECTED] = True
+        second = fingerprint.get_fingerprint(self.repo, self.conduit, self.config)
+
+        self.assertNotEqual(first, second)
+
+
+class TestPublishedFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.publish_dir = os.path.join(self.working_directory, 'publish')
+        self.repo = Mock(id='foo')
+        self.config = {constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir}
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def _publish(self, fingerprint_value=None):
+        master_dir = os.path.join(self.publish_dir, 'master', 'foo', '1234')
+        os.makedirs(os.path.join(master_dir, 'web'))
+        os.makedirs(os.path.join(self.publish_dir, 'web'))
+        os.symlink(os.path.join(master_dir, 'web'), os.path.join(self.publish_dir, 'web', 'foo'))
+        if fingerprint_value is not None:
+            fingerprint.save_fingerprint(master_dir, fingerprint_value)
+
+    def test_saved(self):
+        self._publish('abc')
+
+        self.assertEqual(fingerprint.get_published_fingerprint(self.repo, self.config), 'abc')
+
+    def test_not_saved(self):
+        self._publish()
+
+        self.assertTrue(fingerprint.get_published_fingerprint(self.repo, self.config) is None)
+
+    def test_not_published(self):
+        self.assertTrue(fingerprint.get_published_fingerprint(self.repo, self.config) is None)
+
+    def test_save_creates_directory(self):
+        working_dir = os.path.join(self.working_directory, 'working')
+
+        fingerprint.save_fingerprint(working_dir, 'abc')
+
+        with open(os.path.join(working_dir, fingerprint.FINGERPRINT_FILE)) as fingerprint_file:
+            self.assertEqual(fingerprint_file.read(), 'abc')
+
+
+class TestPublishedState(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def test_saved(self):
+        layout = fingerprint.get_publish_layout(Mock(id='foo'), {})
+
+        fingerprint.save_published_state(self.working_directory, layout, set(['def', 'abc']))
+
+        state = fingerprint.get_published_state(self.working_directory)
+        self.assertEqual(state, dict(layout, images=['abc', 'def']))
+
+    def test_not_saved(self):
+        self.assertTrue(fingerprint.get_published_state(self.working_directory) is None)
+
+    def test_invalid(self):
+        with open(os.path.join(self.working_directory, fingerprint.PUBLISHED_STATE_FILE),
+                  'w') as state_file:
+            state_file.write('{"images": ')
+
+        self.assertTrue(fingerprint.get_published_state(self.working_directory) is None)
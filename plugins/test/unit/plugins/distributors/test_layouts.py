@@ -0,0 +1,283 @@
+import contextlib
+import gzip
+import json
+import os
+import shutil
+from cStringIO import StringIO
+import struct
+import tarfile
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from pulp_docker.plugins.distributors import layouts, tarstream, volumes
+
+
+class LayoutTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.working_dir = os.path.join(self.temp_dir, 'working')
+        os.makedirs(self.working_dir)
+        self.tar_path = os.path.join(self.temp_dir, 'foo.tar')
+        self.writer = tarstream.TarStreamWriter(self.tar_path, buffer_size=7)
+        self.writer.open()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _make_image(self, image_id, layer, parent_id=None, compress=True):
+        storage_path = os.path.join(self.temp_dir, 'content', image_id)
+        os.makedirs(storage_path)
+        for file_name, content in (('ancestry', '["%s"]' % image_id), ('json', '{}')):
+            with open(os.path.join(storage_path, file_name), 'w') as image_file:
+                image_file.write(content)
+        layer_path = os.path.join(storage_path, 'layer')
+        if compress:
+            with contextlib.closing(gzip.open(layer_path, 'wb')) as layer_file:
+                layer_file.write(layer)
+        else:
+            with open(layer_path, 'wb') as layer_file:
+                layer_file.write(layer)
+        return volumes.ExportImage(image_id, parent_id, storage_path)
+
+    def _read(self):
+        archive = tarfile.open(self.tar_path)
+        try:
+            members = dict((member.name, member) for member in archive.getmembers())
+            contents = dict((member.name, archive.extractfile(member).read())
+                            for member in members.itervalues() if member.isfile())
+        finally:
+            archive.close()
+        return members, contents
+
+
+class TestCraneLayout(LayoutTest):
+    def test_add_image(self):
+        image = self._make_image('abc', 'a' * 1000)
+        layout = layouts.CraneLayout(self.working_dir)
+
+        size = layout.get_image_size(image)
+        layout.add_image(self.writer, image)
+
+        self.assertEqual(self.writer.bytes_written, size)
+        self.writer.close()
+        members, contents = self._read()
+        self.assertEqual(sorted(members), ['web/abc', 'web/abc/ancestry', 'web/abc/json',
+                                           'web/abc/layer'])
+        self.assertEqual(contents['web/abc/ancestry'], '["abc"]')
+
+    def test_add_metadata(self):
+        with open(os.path.join(self.working_dir, 'foo.json'), 'w') as redirect_file:
+            redirect_file.write('{}')
+        layout = layouts.CraneLayout(self.working_dir)
+
+        layout.add_metadata(self.writer, [], True, [self.tar_path])
+
+        self.assertEqual(self.writer.bytes_written, layout.get_metadata_size([]))
+        self.writer.close()
+        members, contents = self._read()
+        self.assertEqual(contents, {'foo.json': '{}'})
+
+
+class TestDockerSaveLayout(LayoutTest):
+    def setUp(self):
+        super(TestDockerSaveLayout, self).setUp()
+        with open(os.path.join(self.working_dir, 'export-manifest.json'), 'w') as manifest_file:
+            manifest_file.write('{}')
+        with open(os.path.join(self.working_dir, 'foo.json'), 'w') as redirect_file:
+            redirect_file.write('{}')
+
+    def test_add_image(self):
+        image = self._make_image('abc', 'a' * 1000)
+        layout = layouts.DockerSaveLayout(self.working_dir, 'redhat/foo', {}, [image])
+
+        size = layout.get_image_size(image)
+        layout.add_image(self.writer, image)
+
+        self.assertEqual(self.writer.bytes_written, size)
+        self.writer.close()
+        members, contents = self._read()
+        self.assertEqual(sorted(members), ['abc', 'abc/VERSION', 'abc/json', 'abc/layer.tar'])
+        self.assertEqual(contents['abc/VERSION'], '1.0')
+        # the layer is decompressed
+        self.assertEqual(contents['abc/layer.tar'], 'a' * 1000)
+
+    def test_add_image_uncompressed(self):
+        image = self._make_image('abc', 'a' * 1000, compress=False)
+        layout = layouts.DockerSaveLayout(self.working_dir, 'redhat/foo', {}, [image])
+
+        layout.get_image_size(image)
+        layout.add_image(self.writer, image)
+        self.writer.close()
+
+        members, contents = self._read()
+        self.assertEqual(contents['abc/layer.tar'], 'a' * 1000)
+
+    def test_add_images(self):
+        images = [self._make_image(image_id, image_id * 100, compress=image_id != 'c')
+                  for image_id in 'abcde']
+        layout = layouts.DockerSaveLayout(self.working_dir, 'redhat/foo', {}, images,
+                                          buffer_size=7, workers=2)
+
+        size = sum(layout.get_image_size(image) for image in images)
+        layout.add_images(self.writer, images)
+
+        self.assertEqual(self.writer.bytes_written, size)
+        self.writer.close()
+        members, contents = self._read()
+        for image_id in 'abcde':
+            self.assertEqual(contents['%s/layer.tar' % image_id], image_id * 100)
+        # every decompressing thread has stopped
+        self.assertEqual(threading.active_count(), 1)
+
+    def test_add_images_corrupt(self):
+        images = [self._make_image('abc', 'a' * 1000), self._make_image('def', 'd' * 1000)]
+        layout = layouts.DockerSaveLayout(self.working_dir, 'redhat/foo', {}, images,
+                                          buffer_size=7)
+        for image in images:
+            layout.get_image_size(image)
+        layer_path = os.path.join(images[1].storage_path, 'layer')
+        with open(layer_path, 'r+b') as layer_file:
+            layer_file.seek(20)
+            layer_file.write('garbage')
+
+        self.assertRaises(Exception, layout.add_images, self.writer, images)
+        self.assertEqual(threading.active_count(), 1)
+
+    def test_add_metadata(self):
+        images = [self._make_image('abc', ''), self._make_image('def', '', 'abc')]
+        tags = {'latest': 'def', 'old': 'abc', 'base': 'ghi'}
+        layout = layouts.DockerSaveLayout(self.working_dir, 'redhat/foo', tags, images,
+                                          metadata_files=['export-manifest.json'])
+
+        layout.add_metadata(self.writer, images[1:], False, [])
+
+        self.assertTrue(self.writer.bytes_written <= layout.get_metadata_size([]))
+        self.writer.close()
+        members, contents = self._read()
+        # only the files that docker load reads or ignores, with the tags of
+        # the images in the tar file
+        self.assertEqual(sorted(members), ['export-manifest.json', 'repositories'])
+        self.assertEqual(json.loads(contents['repositories']),
+                         {'redhat/foo': {'latest': 'def'}})
+
+    def test_add_metadata_last(self):
+        images = [self._make_image('abc', '')]
+        tags = {'latest': 'abc', 'base': 'ghi'}
+        layout = layouts.DockerSaveLayout(self.working_dir, 'redhat/foo', tags, images)
+
+        layout.add_metadata(self.writer, [], True, [])
+        self.writer.close()
+
+        members, contents = self._read()
+        # tags of images that are not exported are in the last tar file
+        self.assertEqual(json.loads(contents['repositories']), {'redhat/foo': {'base': 'ghi'}})
+
+
+class TestGetLayerSize(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'layer')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_members(self, *contents):
+        with open(self.path, 'wb') as layer_file:
+            for content in contents:
+                with contextlib.closing(gzip.GzipFile(fileobj=layer_file, mode='wb')) as member:
+                    member.write(content)
+
+    def test_uncompressed(self):
+        with open(self.path, 'wb') as layer_file:
+            layer_file.write('a' * 1000)
+
+        self.assertEqual(layouts.get_layer_size(self.path), 1000)
+
+    def test_from_trailer(self):
+        # a layer whose trailer records a size, but whose content could not be
+        # decompressed
+        with open(self.path, 'wb') as layer_file:
+            layer_file.write(layouts.GZIP_MAGIC + 'garbage' + struct.pack('<I', 1000))
+
+        self.assertEqual(layouts.get_layer_size(self.path), 1000)
+
+    def test_several_members(self):
+        self._write_members('a' * 1000, 'b')
+
+        # the trailer only records the last member's size
+        self.assertEqual(layouts.get_layer_size(self.path, buffer_size=7), 1001)
+
+    @mock.patch('os.path.getsize')
+    def test_may_wrap(self, mock_getsize):
+        self._write_members('a' * 1000)
+        # large enough for the trailer's size to have wrapped around
+        mock_getsize.return_value = layouts.GZIP_ISIZE_LIMIT // layouts.GZIP_MAX_RATIO + 1
+
+        with mock.patch.object(layouts, 'open_layer', wraps=layouts.open_layer) as mock_open:
+            self.assertEqual(layouts.get_layer_size(self.path), 1000)
+        mock_open.assert_called_once_with(self.path)
+
+    def test_wrapped(self):
+        # a layer whose trailer has wrapped around to a size that seems plausible
+        content = os.urandom(layouts.GZIP_ISIZE_LIMIT // layouts.GZIP_MAX_RATIO + 1)
+        self._write_members(content)
+        with open(self.path, 'r+b') as layer_file:
+            layer_file.seek(-4, os.SEEK_END)
+            layer_file.write(struct.pack('<I', len(content) * 2))
+
+        with mock.patch.object(layouts, 'open_layer') as mock_open:
+            mock_open.return_value = StringIO(content)
+            self.assertEqual(layouts.get_layer_size(self.path), len(content))
+        mock_open.assert_called_once_with(self.path)
+
+
+class TestLayerReader(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'layer')
+        with contextlib.closing(gzip.open(self.path, 'wb')) as layer_file:
+            layer_file.write('a' * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_read(self):
+        reader = layouts.LayerReader(self.path, buffer_size=300)
+        thread = threading.Thread(target=reader.decompress)
+        thread.start()
+
+        sizes = []
+        while True:
+            data = reader.read(200)
+            if not data:
+                break
+            sizes.append(len(data))
+        thread.join()
+
+        self.assertEqual(sizes, [200, 100, 200, 100, 200, 100, 100])
+        self.assertEqual(reader.read(200), '')
+
+    @mock.patch.object(layouts, 'LAYER_QUEUE_TIMEOUT', 0.01)
+    def test_close(self):
+        reader = layouts.LayerReader(self.path, buffer_size=7)
+        thread = threading.Thread(target=reader.decompress)
+        thread.start()
+        self.assertEqual(reader.read(7), 'a' * 7)
+
+        reader.close()
+
+        # decompressing stops without waiting for the rest to be read
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_error(self):
+        with open(self.path, 'wb') as layer_file:
+            layer_file.write(layouts.GZIP_MAGIC + 'garbage')
+        reader = layouts.LayerReader(self.path)
+
+        reader.decompress()
+
+        self.assertRaises(IOError, reader.read, 7)
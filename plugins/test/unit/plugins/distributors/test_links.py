@@ -0,0 +1,94 @@
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp_docker.plugins.distributors import links
+
+
+FILE_NAMES = ['ancestry', 'json', 'layer']
+
+
+class LinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.content_dir = os.path.join(self.temp_dir, 'content')
+        self.web_dir = os.path.join(self.temp_dir, 'web')
+        os.makedirs(self.content_dir)
+        for file_name in FILE_NAMES:
+            open(os.path.join(self.content_dir, file_name), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assert_linked(self, image_id):
+        for file_name in FILE_NAMES:
+            link = os.path.join(self.web_dir, image_id, file_name)
+            self.assertEqual(os.readlink(link), os.path.join(self.content_dir, file_name))
+
+
+class TestLinkImage(LinkTestCase):
+    def test_link(self):
+        links.link_image(self.content_dir, os.path.join(self.web_dir, 'abc'), FILE_NAMES)
+
+        self.assert_linked('abc')
+
+    def test_directory_exists(self):
+        os.makedirs(os.path.join(self.web_dir, 'abc'))
+
+        links.link_image(self.content_dir, os.path.join(self.web_dir, 'abc'), FILE_NAMES)
+
+        self.assert_linked('abc')
+
+    @mock.patch('os.makedirs', side_effect=OSError(errno.EACCES, 'denied'))
+    def test_directory_error(self, mock_makedirs):
+        self.assertRaises(OSError, links.link_image, self.content_dir,
+                          os.path.join(self.web_dir, 'abc'), FILE_NAMES)
+
+
+class TestLinkBuilder(LinkTestCase):
+    def test_many_images(self):
+        builder = links.LinkBuilder(workers=4)
+        builder.start()
+        for i in range(100):
+            builder.add(self.content_dir, os.path.join(self.web_dir, str(i)), FILE_NAMES)
+        builder.join()
+        builder.check()
+
+        self.assertEqual(builder.images, 100)
+        self.assertEqual(len(os.listdir(self.web_dir)), 100)
+        for i in range(100):
+            self.assert_linked(str(i))
+
+    def test_minimum_workers(self):
+        builder = links.LinkBuilder(workers=0)
+
+        self.assertEqual(builder.workers, 1)
+
+    def test_error_raised(self):
+        builder = links.LinkBuilder(workers=2)
+        builder.start()
+        target_dir = os.path.join(self.web_dir, 'abc')
+        builder.add(self.content_dir, target_dir, FILE_NAMES)
+        # the links already exist
+        builder.add(self.content_dir, target_dir, FILE_NAMES)
+        builder.join()
+
+        self.assertRaises(OSError, builder.check)
+
+    def test_add_after_error(self):
+        builder = links.LinkBuilder(workers=1)
+        builder._errors.append((ValueError, ValueError('fail'), None))
+
+        self.assertRaises(ValueError, builder.add, self.content_dir, self.web_dir, FILE_NAMES)
+
+    def test_join_without_images(self):
+        builder = links.LinkBuilder(workers=3)
+        builder.start()
+        builder.join()
+
+        builder.check()
+        self.assertEqual(builder.images, 0)
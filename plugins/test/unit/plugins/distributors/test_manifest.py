@@ -0,0 +1,161 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock
+from pulp.common import dateutils
+
+from pulp_docker.plugins.distributors import manifest
+
+
+def make_unit(image_id, checksum=None, created='2014-10-01T12:00:00Z'):
+    return Mock(unit_key={'image_id': image_id}, metadata={'checksum': checksum},
+                created=created)
+
+
+class TestExportManifest(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.working_dir, 'base.json')
+        base = {
+            'type': manifest.MANIFEST_TYPE,
+            'version': 1,
+            'repository': 'foo',
+            'created': '2014-10-01T00:00:00Z',
+            'images': {'abc': 'sha256:1', 'def': 'sha256:2'},
+            'tags': {'latest': 'def', 'old': 'abc'},
+            'delta': None,
+        }
+        with open(self.base_path, 'w') as base_file:
+            json.dump(base, base_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_full(self):
+        export_manifest = manifest.ExportManifest('foo')
+        export_manifest.load_base()
+
+        self.assertTrue(export_manifest.add_unit(make_unit('abc', 'sha256:1')))
+        export_manifest.tags = {'latest': 'abc'}
+        data = export_manifest.to_dict()
+
+        self.assertFalse(export_manifest.is_delta)
+        self.assertEqual(data['type'], manifest.MANIFEST_TYPE)
+        self.assertEqual(data['repository'], 'foo')
+        self.assertEqual(data['images'], {'abc': 'sha256:1'})
+        self.assertEqual(data['tags'], {'latest': 'abc'})
+        self.assertEqual(data['delta'], None)
+
+    def test_delta_from_base(self):
+        export_manifest = manifest.ExportManifest('foo', base_path=self.base_path)
+        export_manifest.load_base()
+
+        self.assertFalse(export_manifest.add_unit(make_unit('def', 'sha256:2')))
+        self.assertTrue(export_manifest.add_unit(make_unit('ghi', 'sha256:3')))
+        export_manifest.tags = {'latest': 'ghi', 'stable': 'def'}
+        data = export_manifest.to_dict()
+
+        self.assertEqual(data['images'], {'def': 'sha256:2', 'ghi': 'sha256:3'})
+        self.assertEqual(data['delta'], {
+            'base': '2014-10-01T00:00:00Z',
+            'since': None,
+            'images': ['ghi'],
+            'removed-images': ['abc'],
+            'tags': {'latest': 'ghi', 'stable': 'def'},
+            'removed-tags': ['old'],
+        })
+
+    def test_delta_since(self):
+        since = dateutils.parse_iso8601_datetime('2014-10-02T00:00:00Z')
+        export_manifest = manifest.ExportManifest('foo', since=since)
+        export_manifest.load_base()
+
+        self.assertFalse(export_manifest.add_unit(make_unit('abc')))
+        self.assertTrue(export_manifest.add_unit(make_unit('def',
+                                                           created='2014-10-03T00:00:00Z')))
+        data = export_manifest.to_dict()
+
+        self.assertEqual(data['delta']['images'], ['def'])
+        self.assertEqual(data['delta']['removed-images'], [])
+        self.assertEqual(dateutils.parse_iso8601_datetime(data['delta']['since']), since)
+
+    def test_base_not_a_manifest(self):
+        with open(self.base_path, 'w') as base_file:
+            json.dump(['abc'], base_file)
+        export_manifest = manifest.ExportManifest('foo', base_path=self.base_path)
+
+        self.assertRaises(ValueError, export_manifest.load_base)
+
+    def test_write(self):
+        export_manifest = manifest.ExportManifest('foo')
+        export_manifest.add_unit(make_unit('abc'))
+        path = os.path.join(self.working_dir, 'manifest.json')
+
+        export_manifest.write(path)
+
+        with open(path) as manifest_file:
+            data = json.load(manifest_file)
+        self.assertEqual(data['images'], {'abc': None})
+        created = dateutils.parse_iso8601_datetime(data['created'])
+        self.assertTrue(isinstance(created, datetime.datetime))
+
+    def test_write_files(self):
+        export_manifest = manifest.ExportManifest('foo')
+        path = os.path.join(self.working_dir, 'manifest.json')
+        export_manifest.write(path)
+        with open(path) as manifest_file:
+            first = json.load(manifest_file)
+
+        export_manifest.files = ['foo.001.tar', 'foo.002.tar']
+        export_manifest.write(path)
+
+        with open(path) as manifest_file:
+            data = json.load(manifest_file)
+        self.assertFalse('files' in first)
+        self.assertEqual(data['files'], ['foo.001.tar', 'foo.002.tar'])
+        # both copies describe the same export
+        self.assertEqual(data['created'], first['created'])
+
+
+class TestGetPublishedFiles(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, 'foo-manifest.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _write(self, data):
+        with open(self.path, 'w') as manifest_file:
+            json.dump(data, manifest_file)
+
+    def test_files(self):
+        self._write({'type': manifest.MANIFEST_TYPE, 'files': ['foo.001.tar', 'foo.002.tar']})
+
+        self.assertEqual(manifest.get_published_files(self.path),
+                         [os.path.join(self.working_dir, 'foo.001.tar'),
+                          os.path.join(self.working_dir, 'foo.002.tar')])
+
+    def test_only_export_directory(self):
+        self._write({'type': manifest.MANIFEST_TYPE,
+                     'files': ['../foo.tar', '/etc/foo.tar', 'a/foo.tar', '..', 5, 'foo.tar']})
+
+        self.assertEqual(manifest.get_published_files(self.path),
+                         [os.path.join(self.working_dir, 'foo.tar')])
+
+    def test_no_files(self):
+        self._write({'type': manifest.MANIFEST_TYPE})
+
+        self.assertEqual(manifest.get_published_files(self.path), [])
+
+    def test_not_a_manifest(self):
+        self._write({'files': ['foo.tar']})
+
+        self.assertEqual(manifest.get_published_files(self.path), [])
+
+    def test_missing(self):
+        self.assertEqual(manifest.get_published_files(self.path), [])
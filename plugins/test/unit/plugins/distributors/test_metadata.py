@@ -1,3 +1,6 @@
+import contextlib
+import gzip
+import os
 import shutil
 import tempfile
 import unittest
@@ -49,6 +52,27 @@ class TestRedirectFileContext(unittest.TestCase):
         self.context.add_unit_metadata(unit)
         self.context.metadata_file_handle.write.assert_called_once_with(result_json)
 
+    def test_add_unit_metadata_extended(self):
+        self.context.extended = True
+        unit = Mock(unit_key={'image_id': 'foo_image'},
+                    metadata={'parent_id': 'foo_parent', 'size': 2048, 'layer_size': 1024,
+                              'checksum': 'sha256:abc'})
+
+        self.context.add_unit_metadata(unit)
+
+        written = self.context.metadata_file_handle.write.call_args[0][0]
+        self.assertEqual(json.loads(written), {'id': 'foo_image', 'parent': 'foo_parent',
+                                               'size': 2048, 'layer_size': 1024,
+                                               'checksum': 'sha256:abc'})
+
+    def test_extended_from_config(self):
+        self.assertFalse(self.context.extended)
+        config = PluginCallConfiguration({constants.CONFIG_KEY_EXTENDED_REDIRECT: True}, {})
+        context = metadata.RedirectFileContext(self.working_directory, self.conduit, config,
+                                               self.repo)
+
+        self.assertTrue(context.extended)
+
     def test_write_file_header(self):
         self.context.repo_id = 'bar'
         self.context.redirect_url = 'http://www.pulpproject.org/foo/'
@@ -92,3 +116,139 @@ class TestRedirectFileContext(unittest.TestCase):
         tag_dict = self.context.convert_tag_list_to_dict(tag_list)
         expected_tag_dict = {'tag1': 'image1', 'tag2': 'image2'}
         self.assertEqual(tag_dict, expected_tag_dict)
+
+
+class TestImagesFileContext(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def test_images(self):
+        context = metadata.ImagesFileContext(self.working_directory, 'redhat/foo')
+        context.initialize()
+        context.add_unit_metadata(DockerImage('foo_image', 'bar_image', 2048))
+        context.add_unit_metadata(DockerImage('bar_image', None, 1024))
+        context.finalize()
+
+        path = os.path.join(self.working_directory, 'v1', 'repositories', 'redhat', 'foo',
+                            'images')
+        with open(path) as images_file:
+            self.assertEqual(json.load(images_file), [{'id': 'foo_image'}, {'id': 'bar_image'}])
+
+
+class TestWriteAPIFiles(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.tags_dir = os.path.join(self.working_directory, 'v1', 'repositories', 'foo', 'tags')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def test_tags(self):
+        metadata.write_api_files(self.working_directory, 'foo', {'latest': 'foo_image',
+                                                                 '1.0': 'bar_image'})
+
+        with open(os.path.join(self.tags_dir, 'index.json')) as tags_file:
+            self.assertEqual(json.load(tags_file), {'latest': 'foo_image', '1.0': 'bar_image'})
+        with open(os.path.join(self.tags_dir, 'latest')) as tag_file:
+            self.assertEqual(json.load(tag_file), 'foo_image')
+        with open(os.path.join(self.tags_dir, '1.0')) as tag_file:
+            self.assertEqual(json.load(tag_file), 'bar_image')
+
+    def test_tag_named_like_index(self):
+        metadata.write_api_files(self.working_directory, 'foo', {'index.json': 'foo_image',
+                                                                 'latest': 'bar_image'})
+
+        with open(os.path.join(self.tags_dir, 'index.json')) as tags_file:
+            self.assertEqual(json.load(tags_file), {'index.json': 'foo_image',
+                                                    'latest': 'bar_image'})
+
+    def test_no_links(self):
+        os.makedirs(os.path.join(self.working_directory, 'foo_image'))
+
+        metadata.write_api_files(self.working_directory, 'foo', {'latest': 'foo_image'})
+
+        # the web server maps v1/images to the image directories
+        self.assertFalse(os.path.lexists(os.path.join(self.working_directory, 'v1', 'images')))
+        for dir_path, dir_names, file_names in os.walk(self.working_directory):
+            for name in dir_names + file_names:
+                self.assertFalse(os.path.islink(os.path.join(dir_path, name)))
+        # writing again does not fail
+        metadata.write_api_files(self.working_directory, 'foo', {'latest': 'foo_image'})
+
+
+class TestShardedRedirectFileContext(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+        self.repo = Repository('foo_repo_id', working_dir=self.working_directory)
+        self.config = PluginCallConfiguration(None, {
+            constants.CONFIG_KEY_REDIRECT_URL: 'http://www.pulpproject.org/foo/',
+            constants.CONFIG_KEY_REDIRECT_FILE_VERSION: 2})
+        self.conduit = RepoPublishConduit(self.repo.id, 'foo_repo')
+        self.conduit.get_repo_scratchpad = Mock(return_value={u'tags': [
+            {constants.IMAGE_TAG_KEY: u'latest', constants.IMAGE_ID_KEY: u'foo_image'},
+            {constants.IMAGE_TAG_KEY: u'1.0', constants.IMAGE_ID_KEY: u'bar_image'}]})
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def _load(self, relative_path):
+        path = os.path.join(self.working_directory, relative_path)
+        if path.endswith('.gz'):
+            with contextlib.closing(gzip.open(path)) as data_file:
+                return json.load(data_file)
+        with open(path) as data_file:
+            return json.load(data_file)
+
+    def test_publish(self):
+        context = metadata.ShardedRedirectFileContext(self.working_directory, self.conduit,
+                                                      self.config, self.repo)
+        context.initialize()
+        context.add_unit_metadata(DockerImage('foo_image', 'bar_image', 2048))
+        context.add_unit_metadata(DockerImage('bar_image', None, 1024))
+        context.finalize()
+
+        redirect_data = self._load('foo_repo_id.json')
+        self.assertEqual(redirect_data['version'], 2)
+        self.assertEqual(redirect_data['repository'], 'foo_repo_id')
+        self.assertEqual(redirect_data['url'], 'http://www.pulpproject.org/foo/')
+        self.assertEqual(redirect_data['protected'], False)
+        self.assertEqual(redirect_data['image-count'], 2)
+        self.assertEqual(redirect_data['tag-count'], 2)
+        self.assertEqual(redirect_data['shards']['prefix-length'], 1)
+        self.assertEqual(redirect_data['extended'], False)
+
+        # everything is in the compressed version 1 file
+        full_data = self._load(redirect_data['full'])
+        self.assertEqual(full_data['images'], [{'id': 'foo_image'}, {'id': 'bar_image'}])
+        self.assertEqual(full_data['tags'], {'latest': 'foo_image', '1.0': 'bar_image'})
+
+        # every shard exists, and each image and tag is in the shard for its digest
+        images = []
+        tags = {}
+        for prefix in metadata.get_shard_prefixes():
+            shard = self._load(redirect_data['shards']['images'].format(prefix=prefix))
+            for image in shard:
+                self.assertEqual(metadata.get_shard(image['id']), prefix)
+            images.extend(shard)
+            shard = self._load(redirect_data['shards']['tags'].format(prefix=prefix))
+            for tag in shard:
+                self.assertEqual(metadata.get_shard(tag), prefix)
+            tags.update(shard)
+        self.assertEqual(sorted(image['id'] for image in images), ['bar_image', 'foo_image'])
+        self.assertEqual(tags, {'latest': 'foo_image', '1.0': 'bar_image'})
+
+
+class TestGetShard(unittest.TestCase):
+    def test_prefixes(self):
+        prefixes = metadata.get_shard_prefixes()
+
+        self.assertEqual(len(prefixes), 16)
+        self.assertEqual(prefixes[0], '0')
+        self.assertEqual(prefixes[-1], 'f')
+
+    def test_get_shard(self):
+        # the first hex digit of the md5 digest of "latest" is 7
+        self.assertEqual(metadata.get_shard(u'latest'), '7')
@@ -1,5 +1,7 @@
+import json
 import os
 import shutil
+import tarfile
 import tempfile
 import unittest
 
@@ -9,10 +11,10 @@ from pulp.devel.unit.util import touch
 from pulp.plugins.conduits.repo_publish import RepoPublishConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.model import Repository
-from pulp.plugins.util.publish_step import PublishStep
+from pulp.plugins.util.publish_step import PublishStep, UnitPublishStep
 
 from pulp_docker.common import constants
-from pulp_docker.plugins.distributors import publish_steps
+from pulp_docker.plugins.distributors import fingerprint, publish_steps
 
 
 class TestPublishImagesStep(unittest.TestCase):
@@ -35,6 +37,7 @@ class TestPublishImagesStep(unittest.TestCase):
 
     @patch('pulp_docker.plugins.distributors.publish_steps.RedirectFileContext')
     def test_initialize_metdata(self, mock_context):
+        mock_context.return_value.registry = 'foo_repo_id'
         step = publish_steps.PublishImagesStep()
         step.parent = self.parent
         step.initialize()
@@ -44,6 +47,7 @@ class TestPublishImagesStep(unittest.TestCase):
         step = publish_steps.PublishImagesStep()
         step.parent = self.parent
         step.redirect_context = Mock()
+        step.images_context = Mock()
         file_list = ['ancestry', 'layer', 'json']
         for file_name in file_list:
             touch(os.path.join(self.content_directory, file_name))
@@ -51,16 +55,176 @@ class TestPublishImagesStep(unittest.TestCase):
         step.get_working_dir = Mock(return_value=self.publish_directory)
         step.process_unit(unit)
         step.redirect_context.add_unit_metadata.assert_called_once_with(unit)
+        step.images_context.add_unit_metadata.assert_called_once_with(unit)
         for file_name in file_list:
             self.assertTrue(os.path.exists(os.path.join(self.publish_directory, 'web',
                                                         'foo_image', file_name)))
 
+    def _publish_previous(self, image_ids):
+        master_dir = os.path.join(self.temp_dir, 'master', '1234')
+        for image_id in image_ids:
+            os.makedirs(os.path.join(master_dir, 'web', image_id))
+            for file_name in ('ancestry', 'layer', 'json'):
+                os.symlink(os.path.join(self.content_directory, file_name),
+                           os.path.join(master_dir, 'web', image_id, file_name))
+        return master_dir
+
+    @patch('pulp_docker.plugins.distributors.publish_steps.ShardedRedirectFileContext')
+    def test_initialize_sharded(self, mock_context):
+        mock_context.return_value.registry = 'foo_repo_id'
+        self.parent.config = PluginCallConfiguration(
+            None, {constants.CONFIG_KEY_REDIRECT_FILE_VERSION: 2})
+        step = publish_steps.PublishImagesStep()
+        step.parent = self.parent
+
+        step.initialize()
+
+        self.assertTrue(step.redirect_context is mock_context.return_value)
+        mock_context.return_value.initialize.assert_called_once_with()
+
+    @patch('pulp_docker.plugins.distributors.publish_steps.RedirectFileContext')
+    def test_initialize_incremental(self, mock_context):
+        mock_context.return_value.registry = 'foo_repo_id'
+        master_dir = self._publish_previous(['foo_image'])
+        touch(os.path.join(self.working_directory, 'web', 'left_over'))
+        step = publish_steps.PublishImagesStep(master_dir, ['foo_image'])
+        step.parent = self.parent
+
+        step.initialize()
+
+        self.assertEqual(step.published_ids, set(['foo_image']))
+        # nothing is left from an earlier publish
+        self.assertEqual(os.listdir(step.get_web_directory()), ['v1'])
+
+    @patch('pulp_docker.plugins.distributors.publish_steps.RedirectFileContext')
+    def test_initialize_keeps_working_dir(self, mock_context):
+        mock_context.return_value.registry = 'foo_repo_id'
+        touch(os.path.join(self.working_directory, 'web', 'left_over'))
+        step = publish_steps.PublishImagesStep()
+        step.parent = self.parent
+
+        step.initialize()
+
+        self.assertEqual(step.published_ids, set())
+        self.assertEqual(sorted(os.listdir(step.get_web_directory())), ['left_over', 'v1'])
+
+    def test_process_unit_already_published(self):
+        master_dir = self._publish_previous(['foo_image'])
+        step = publish_steps.PublishImagesStep(master_dir, ['foo_image'])
+        step.parent = self.parent
+        step.redirect_context = Mock()
+        step.images_context = Mock()
+        unit = Mock(unit_key={'image_id': 'foo_image'}, storage_path=self.content_directory)
+
+        with patch('pulp_docker.plugins.distributors.links.link_image') as mock_link_image:
+            step.process_unit(unit)
+
+        step.redirect_context.add_unit_metadata.assert_called_once_with(unit)
+        step.images_context.add_unit_metadata.assert_called_once_with(unit)
+        # the image is published, but nothing is linked again
+        self.assertEqual(step.image_ids, set(['foo_image']))
+        self.assertEqual(mock_link_image.call_count, 0)
+
+    def test_process_unit_partly_linked(self):
+        master_dir = self._publish_previous([])
+        # linked by a publish that failed
+        os.makedirs(os.path.join(master_dir, 'web', 'new_image'))
+        os.symlink(os.path.join(self.content_directory, 'layer'),
+                   os.path.join(master_dir, 'web', 'new_image', 'layer'))
+        step = publish_steps.PublishImagesStep(master_dir, [])
+        step.parent = self.parent
+        step.redirect_context = Mock()
+        step.images_context = Mock()
+        unit = Mock(unit_key={'image_id': 'new_image'}, storage_path=self.content_directory)
+
+        step.process_unit(unit)
+
+        self.assertEqual(sorted(os.listdir(os.path.join(master_dir, 'web', 'new_image'))),
+                         ['ancestry', 'json', 'layer'])
+
+    @patch.object(UnitPublishStep, 'get_unit_generator')
+    @patch('pulp_docker.plugins.distributors.publish_steps.RedirectFileContext')
+    def test_process_main_incremental(self, mock_context, mock_get_unit_generator):
+        mock_context.return_value.registry = 'foo_repo_id'
+        for file_name in ('ancestry', 'layer', 'json'):
+            touch(os.path.join(self.content_directory, file_name))
+        master_dir = self._publish_previous(['foo_image', 'bar_image'])
+        units = [Mock(unit_key={'image_id': image_id}, storage_path=self.content_directory)
+                 for image_id in ('foo_image', 'new_image')]
+        mock_get_unit_generator.return_value = iter(units)
+        step = publish_steps.PublishImagesStep(master_dir, ['foo_image', 'bar_image'])
+        step.parent = self.parent
+        step.initialize()
+
+        with patch('pulp_docker.plugins.distributors.links.os.makedirs',
+                   side_effect=os.makedirs) as mock_makedirs:
+            step.process_main()
+
+        # only the new image is linked, straight into the published tree
+        mock_makedirs.assert_called_once_with(os.path.join(master_dir, 'web', 'new_image'),
+                                              0770)
+        self.assertTrue(os.path.islink(os.path.join(master_dir, 'web', 'new_image', 'layer')))
+        self.assertEqual(os.listdir(step.get_web_directory()), ['v1'])
+        # the image that was removed since is left for UpdatePublishedStep
+        self.assertEqual(step.image_ids, set(['foo_image', 'new_image']))
+        self.assertEqual(set(os.listdir(os.path.join(master_dir, 'web'))),
+                         set(['foo_image', 'bar_image', 'new_image']))
+
+    @patch.object(UnitPublishStep, 'get_unit_generator')
+    @patch('pulp_docker.plugins.distributors.publish_steps.RedirectFileContext')
+    def test_process_main_links_in_threads(self, mock_context, mock_get_unit_generator):
+        mock_context.return_value.registry = 'foo_repo_id'
+        for file_name in ('ancestry', 'layer', 'json'):
+            touch(os.path.join(self.content_directory, file_name))
+        units = [Mock(unit_key={'image_id': 'image%d' % i}, storage_path=self.content_directory)
+                 for i in range(50)]
+        mock_get_unit_generator.return_value = iter(units)
+        step = publish_steps.PublishImagesStep()
+        step.parent = self.parent
+        step.initialize()
+
+        step.process_main()
+
+        self.assertEqual(step.link_builder.images, 50)
+        # the redirect file is written in the order of the units
+        self.assertEqual(mock_context.return_value.add_unit_metadata.call_args_list,
+                         [((unit,), {}) for unit in units])
+        for unit in units:
+            self.assertTrue(os.path.islink(os.path.join(
+                step.get_web_directory(), unit.unit_key['image_id'], 'layer')))
+
+    @patch.object(UnitPublishStep, 'get_unit_generator')
+    @patch('pulp_docker.plugins.distributors.publish_steps.RedirectFileContext')
+    def test_process_main_link_error(self, mock_context, mock_get_unit_generator):
+        mock_context.return_value.registry = 'foo_repo_id'
+        # creating the links fails if the same image is linked twice
+        unit = Mock(unit_key={'image_id': 'foo_image'}, storage_path=self.content_directory)
+        mock_get_unit_generator.return_value = iter([unit, unit])
+        step = publish_steps.PublishImagesStep()
+        step.parent = self.parent
+        step.initialize()
+
+        self.assertRaises(OSError, step.process_main)
+
     def test_finalize(self):
         step = publish_steps.PublishImagesStep()
         step.redirect_context = Mock()
         step.finalize()
         step.redirect_context.finalize.assert_called_once_with()
 
+    @patch('pulp_docker.plugins.distributors.metadata.write_api_files')
+    def test_finalize_api_files(self, mock_write_api_files):
+        step = publish_steps.PublishImagesStep()
+        step.parent = self.parent
+        step.redirect_context = Mock(registry='foo_repo_id', tags={'latest': 'foo_image'})
+        step.images_context = Mock()
+
+        step.finalize()
+
+        step.images_context.finalize.assert_called_once_with()
+        mock_write_api_files.assert_called_once_with(step.get_web_directory(), 'foo_repo_id',
+                                                     {'latest': 'foo_image'})
+
 
 class TestWebPublisher(unittest.TestCase):
 
@@ -82,8 +246,250 @@ class TestWebPublisher(unittest.TestCase):
             constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir
         }
         publisher = publish_steps.WebPublisher(self.repo, mock_conduit, mock_config)
-        self.assertEquals(publisher.children, [mock_images_step.return_value,
-                                               mock_web_publish_step.return_value])
+        self.assertEquals(len(publisher.children), 3)
+        self.assertEquals(publisher.children[0], mock_images_step.return_value)
+        self.assertTrue(isinstance(publisher.children[1], publish_steps.SaveFingerprintStep))
+        self.assertEquals(publisher.children[2], mock_web_publish_step.return_value)
+        mock_images_step.assert_called_once_with(None, ())
+        self.assertTrue(publisher.images_step is mock_images_step.return_value)
+
+    @patch('pulp_docker.plugins.distributors.publish_steps.AtomicDirectoryPublishStep')
+    @patch('pulp_docker.plugins.distributors.publish_steps.PublishImagesStep')
+    def test_init_redirect_file_version_2(self, mock_images_step, mock_web_publish_step):
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir,
+            constants.CONFIG_KEY_REDIRECT_FILE_VERSION: 2,
+        }
+
+        publish_steps.WebPublisher(self.repo, Mock(), mock_config)
+
+        publish_locations = mock_web_publish_step.call_args[0][1]
+        self.assertEquals(publish_locations[2], ('foo', os.path.join(self.publish_dir, 'app',
+                                                                     'foo')))
+
+    def _publish_previous(self, config, **state):
+        master_dir = os.path.join(self.master_dir, 'foo', '1234')
+        os.makedirs(os.path.join(master_dir, 'web'))
+        touch(os.path.join(master_dir, 'foo.json'))
+        os.makedirs(os.path.join(self.publish_dir, 'web'))
+        os.symlink(os.path.join(master_dir, 'web'), os.path.join(self.publish_dir, 'web', 'foo'))
+        os.makedirs(os.path.join(self.publish_dir, 'app'))
+        os.symlink(os.path.join(master_dir, 'foo.json'),
+                   os.path.join(self.publish_dir, 'app', 'foo.json'))
+        layout = fingerprint.get_publish_layout(self.repo, config)
+        layout.update(state)
+        fingerprint.save_published_state(master_dir, layout, ['foo_image'])
+        return master_dir
+
+    @patch('pulp_docker.plugins.distributors.publish_steps.PublishImagesStep')
+    def test_init_incremental(self, mock_images_step):
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir,
+            constants.CONFIG_KEY_INCREMENTAL_PUBLISH: 'true',
+        }
+        master_dir = self._publish_previous(mock_config)
+
+        publisher = publish_steps.WebPublisher(self.repo, Mock(), mock_config)
+
+        mock_images_step.assert_called_once_with(master_dir, ['foo_image'])
+        # the previous publish is updated rather than replaced
+        self.assertEquals(len(publisher.children), 3)
+        self.assertTrue(isinstance(publisher.children[2], publish_steps.UpdatePublishedStep))
+        self.assertEqual(publisher.children[2].master_dir, master_dir)
+
+    @patch('pulp_docker.plugins.distributors.publish_steps.AtomicDirectoryPublishStep')
+    @patch('pulp_docker.plugins.distributors.publish_steps.PublishImagesStep')
+    def test_init_incremental_layout_changed(self, mock_images_step, mock_web_publish_step):
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir,
+            constants.CONFIG_KEY_INCREMENTAL_PUBLISH: 'true',
+        }
+        self._publish_previous(mock_config, **{'redirect-file-version': 2})
+
+        publisher = publish_steps.WebPublisher(self.repo, Mock(), mock_config)
+
+        mock_images_step.assert_called_once_with(None, ())
+        self.assertEquals(publisher.children[2], mock_web_publish_step.return_value)
+
+    @patch('pulp_docker.plugins.distributors.publish_steps.AtomicDirectoryPublishStep')
+    @patch('pulp_docker.plugins.distributors.publish_steps.PublishImagesStep')
+    def test_init_incremental_moved(self, mock_images_step, mock_web_publish_step):
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir,
+            constants.CONFIG_KEY_INCREMENTAL_PUBLISH: 'true',
+        }
+        self._publish_previous(mock_config)
+        # the redirect file is no longer published from the previous publish
+        os.unlink(os.path.join(self.publish_dir, 'app', 'foo.json'))
+
+        publish_steps.WebPublisher(self.repo, Mock(), mock_config)
+
+        mock_images_step.assert_called_once_with(None, ())
+
+    @patch('pulp_docker.plugins.distributors.publish_steps.AtomicDirectoryPublishStep')
+    @patch('pulp_docker.plugins.distributors.publish_steps.PublishImagesStep')
+    def test_init_incremental_no_state(self, mock_images_step, mock_web_publish_step):
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir,
+            constants.CONFIG_KEY_INCREMENTAL_PUBLISH: 'true',
+        }
+        master_dir = self._publish_previous(mock_config)
+        os.unlink(os.path.join(master_dir, fingerprint.PUBLISHED_STATE_FILE))
+
+        publish_steps.WebPublisher(self.repo, Mock(), mock_config)
+
+        mock_images_step.assert_called_once_with(None, ())
+
+    @patch('pulp_docker.plugins.distributors.fingerprint.get_published_fingerprint',
+           return_value='abc')
+    @patch('pulp_docker.plugins.distributors.fingerprint.get_fingerprint', return_value='abc')
+    @patch.object(PublishStep, 'publish')
+    def test_publish_unchanged(self, mock_publish, mock_get_fingerprint,
+                               mock_get_published_fingerprint):
+        mock_conduit = Mock()
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir
+        }
+        publisher = publish_steps.WebPublisher(self.repo, mock_conduit, mock_config)
+
+        report = publisher.publish()
+
+        self.assertEqual(mock_publish.call_count, 0)
+        self.assertTrue(report is mock_conduit.build_success_report.return_value)
+        mock_conduit.build_success_report.assert_called_once_with({'skipped': True}, {})
+
+    @patch('pulp_docker.plugins.distributors.fingerprint.get_published_fingerprint',
+           return_value='abc')
+    @patch('pulp_docker.plugins.distributors.fingerprint.get_fingerprint', return_value='def')
+    @patch.object(PublishStep, 'publish')
+    def test_publish_changed(self, mock_publish, mock_get_fingerprint,
+                             mock_get_published_fingerprint):
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir
+        }
+        publisher = publish_steps.WebPublisher(self.repo, Mock(), mock_config)
+
+        report = publisher.publish()
+
+        self.assertTrue(report is mock_publish.return_value)
+        self.assertEqual(publisher.fingerprint, 'def')
+
+    @patch('pulp_docker.plugins.distributors.fingerprint.get_published_fingerprint',
+           return_value='abc')
+    @patch('pulp_docker.plugins.distributors.fingerprint.get_fingerprint', return_value='abc')
+    @patch.object(PublishStep, 'publish')
+    def test_publish_forced(self, mock_publish, mock_get_fingerprint,
+                            mock_get_published_fingerprint):
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir,
+            constants.CONFIG_KEY_FORCE_PUBLISH: True,
+        }
+        publisher = publish_steps.WebPublisher(self.repo, Mock(), mock_config)
+
+        report = publisher.publish()
+
+        self.assertTrue(report is mock_publish.return_value)
+
+
+class TestSaveFingerprintStep(unittest.TestCase):
+    def setUp(self):
+        self.working_directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_directory)
+
+    def _make_parent(self, fingerprint_value):
+        return Mock(fingerprint=fingerprint_value, layout={'version': 3},
+                    images_step=Mock(image_ids=set(['b', 'a'])))
+
+    def test_process_main(self):
+        step = publish_steps.SaveFingerprintStep()
+        step.parent = self._make_parent('abc')
+        step.get_working_dir = Mock(return_value=self.working_directory)
+
+        step.process_main()
+
+        with open(os.path.join(self.working_directory, 'fingerprint')) as fingerprint_file:
+            self.assertEqual(fingerprint_file.read(), 'abc')
+        self.assertEqual(fingerprint.get_published_state(self.working_directory),
+                         {'version': 3, 'images': ['a', 'b']})
+
+    def test_process_main_no_fingerprint(self):
+        step = publish_steps.SaveFingerprintStep()
+        step.parent = self._make_parent(None)
+        step.get_working_dir = Mock(return_value=self.working_directory)
+
+        step.process_main()
+
+        self.assertEqual(os.listdir(self.working_directory), ['published.json'])
+
+
+class TestUpdatePublishedStep(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.working_directory = os.path.join(self.temp_dir, 'working')
+        self.master_dir = os.path.join(self.temp_dir, 'master', 'foo', '1234')
+        self.tags_path = os.path.join('web', 'v1', 'repositories', 'foo', 'tags')
+        self._write(self.master_dir, {
+            'foo.json': 'old',
+            'fingerprint': 'old',
+            'published.json': 'old',
+            os.path.join('web', 'old_image', 'layer'): 'old',
+            os.path.join('web', 'kept_image', 'layer'): 'kept',
+            os.path.join('web', 'new_image', 'layer'): 'new',
+            os.path.join(self.tags_path, 'index.json'): 'old',
+            os.path.join(self.tags_path, 'old_tag'): 'old',
+        })
+        os.symlink(os.path.join(self.master_dir, 'web', 'kept_image'),
+                   os.path.join(self.master_dir, 'web', 'linked_image'))
+        self._write(self.working_directory, {
+            'foo.json': 'new',
+            'fingerprint': 'new',
+            'published.json': 'new',
+            os.path.join(self.tags_path, 'index.json'): 'new',
+            os.path.join(self.tags_path, 'latest'): 'new',
+        })
+        self.step = publish_steps.UpdatePublishedStep(self.master_dir)
+        self.step.parent = Mock(images_step=Mock(image_ids=set(['kept_image', 'new_image'])))
+        self.step.get_working_dir = Mock(return_value=self.working_directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, base_dir, files):
+        for relative_path, content in files.iteritems():
+            path = os.path.join(base_dir, relative_path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as published_file:
+                published_file.write(content)
+
+    def _read(self, relative_path):
+        with open(os.path.join(self.master_dir, relative_path)) as published_file:
+            return published_file.read()
+
+    def test_process_main(self):
+        self.step.process_main()
+
+        for relative_path in ('foo.json', 'fingerprint', 'published.json',
+                              os.path.join(self.tags_path, 'index.json'),
+                              os.path.join(self.tags_path, 'latest')):
+            self.assertEqual(self._read(relative_path), 'new')
+        # the files and images that are no longer published are removed
+        self.assertEqual(sorted(os.listdir(os.path.join(self.master_dir, 'web'))),
+                         ['kept_image', 'new_image', 'v1'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.master_dir, self.tags_path))),
+                         ['index.json', 'latest'])
+        self.assertEqual(self._read(os.path.join('web', 'kept_image', 'layer')), 'kept')
+        self.assertEqual(os.listdir(self.working_directory), [])
+
+    @patch('os.rename', side_effect=OSError)
+    def test_process_main_error(self, mock_rename):
+        self.assertRaises(OSError, self.step.process_main)
+
+        # nothing was removed, and the state of the previous publish is kept
+        self.assertEqual(self._read('published.json'), 'old')
+        self.assertEqual(len(os.listdir(os.path.join(self.master_dir, 'web'))), 5)
 
 
 class TestExportPublisher(unittest.TestCase):
@@ -103,9 +509,223 @@ class TestExportPublisher(unittest.TestCase):
             constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir
         }
         publisher = publish_steps.ExportPublisher(self.repo, mock_conduit, mock_config)
-        self.assertTrue(isinstance(publisher.children[0], publish_steps.PublishImagesStep))
-        self.assertTrue(isinstance(publisher.children[1], publish_steps.SaveTarFilePublishStep))
-        tar_step = publisher.children[1]
-        self.assertEquals(tar_step.source_dir, self.working_temp)
-        self.assertEquals(tar_step.publish_file,
-                          os.path.join(self.publish_dir, 'export/repo/foo.tar'))
+        self.assertTrue(isinstance(publisher.children[0], publish_steps.ExportImagesStep))
+        self.assertTrue(isinstance(publisher.children[1], publish_steps.SaveTarFileStep))
+        self.assertEquals(publisher.images, [])
+        self.assertFalse(publisher.manifest.is_delta)
+
+    @patch('pulp_docker.plugins.metrics.log_metrics')
+    @patch.object(publish_steps.ExportPublisher, '_build_final_report')
+    @patch.object(publish_steps.ExportPublisher, 'process_lifecycle')
+    def test_publish_reports_metrics(self, mock_process_lifecycle, mock_build_final_report,
+                                     mock_log_metrics):
+        mock_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: self.publish_dir
+        }
+        publisher = publish_steps.ExportPublisher(self.repo, Mock(), mock_config)
+        publisher.children[1].metrics.bytes = 1024
+
+        report = publisher.publish()
+
+        self.assertTrue(report is mock_build_final_report.return_value)
+        phases = publisher.progress_details['metrics']
+        self.assertEqual(phases[constants.PUBLISH_STEP_TAR]['bytes'], 1024)
+        self.assertTrue(constants.PUBLISH_STEP_IMAGES in phases)
+        mock_log_metrics.assert_called_once_with('export', 'foo', phases)
+
+
+class TestExportImagesStep(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.working_directory = os.path.join(self.temp_dir, 'working')
+        self.content_directory = os.path.join(self.temp_dir, 'content')
+        self.export_dir = os.path.join(self.temp_dir, 'publish', 'export', 'repo')
+        os.makedirs(self.working_directory)
+        os.makedirs(self.content_directory)
+        for file_name in ('ancestry', 'json', 'layer'):
+            with open(os.path.join(self.content_directory, file_name), 'w') as content_file:
+                content_file.write(file_name)
+        self.repo = Repository('foo_repo_id', working_dir=self.working_directory)
+        self.conduit = RepoPublishConduit(self.repo.id, 'foo_repo')
+        self.conduit.get_repo_scratchpad = Mock(return_value={u'tags': []})
+        self.repo_config = {
+            constants.CONFIG_KEY_DOCKER_PUBLISH_DIRECTORY: os.path.join(self.temp_dir, 'publish')
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _export(self, image_ids, parents=None):
+        config = PluginCallConfiguration(None, self.repo_config)
+        self.parent = publish_steps.ExportPublisher(self.repo, self.conduit, config)
+        self.step = self.parent.children[0]
+        self.tar_step = self.parent.children[1]
+        parents = parents or {}
+        units = [Mock(unit_key={'image_id': image_id}, storage_path=self.content_directory,
+                      metadata={'parent_id': parents.get(image_id)})
+                 for image_id in image_ids]
+        self.step.get_unit_generator = Mock(return_value=units)
+
+        self.step.initialize()
+        self.step.process_main()
+        self.step.finalize()
+        self.tar_step.process_main()
+
+    def _read(self, file_name):
+        archive = tarfile.open(os.path.join(self.export_dir, file_name))
+        try:
+            names = archive.getnames()
+            index = None
+            if 'volume.json' in names:
+                index = json.load(archive.extractfile('volume.json'))
+        finally:
+            archive.close()
+        return names, index
+
+    def test_export(self):
+        # left by an earlier export that failed
+        touch(os.path.join(self.working_directory, 'foo_repo_id.tar'))
+
+        self._export(['foo_image'])
+
+        self.assertEqual(sorted(os.listdir(self.export_dir)),
+                         ['foo_repo_id-manifest.json', 'foo_repo_id.tar'])
+        # nothing was linked into the working directory
+        self.assertEqual(os.listdir(self.step.get_web_directory()), ['v1'])
+        archive = tarfile.open(os.path.join(self.export_dir, 'foo_repo_id.tar'))
+        try:
+            names = archive.getnames()
+            self.assertEqual(archive.extractfile('web/foo_image/layer').read(), 'layer')
+        finally:
+            archive.close()
+        for name in ('foo_repo_id.json', 'web/foo_image/ancestry', 'web/foo_image/json',
+                     'web/v1/repositories/foo_repo_id/images', 'export-manifest.json'):
+            self.assertTrue(name in names)
+        self.assertFalse('foo_repo_id.tar' in names)
+        self.assertFalse('volume.json' in names)
+        self.assertEqual(self.step.metrics.units, 1)
+        self.assertEqual(self.tar_step.metrics.bytes,
+                         os.path.getsize(os.path.join(self.export_dir, 'foo_repo_id.tar')))
+        with open(os.path.join(self.export_dir, 'foo_repo_id-manifest.json')) as manifest_file:
+            self.assertEqual(json.load(manifest_file)['images'], {'foo_image': None})
+
+    def test_export_api_files(self):
+        self.conduit.get_repo_scratchpad.return_value = {
+            u'tags': [{constants.IMAGE_TAG_KEY: u'latest', constants.IMAGE_ID_KEY: u'foo_image'}]}
+
+        self._export(['foo_image'])
+
+        archive = tarfile.open(os.path.join(self.export_dir, 'foo_repo_id.tar'))
+        try:
+            members = dict((member.name, member) for member in archive.getmembers())
+            tags = json.load(archive.extractfile(
+                'web/v1/repositories/foo_repo_id/tags/index.json'))
+        finally:
+            archive.close()
+        self.assertEqual(tags, {'latest': 'foo_image'})
+        self.assertTrue('web/v1/repositories/foo_repo_id/tags/latest' in members)
+        # the images are not linked into the API tree, so nothing in the
+        # archive can lead back into the tree that holds it
+        self.assertFalse('web/v1/images' in members)
+        self.assertEqual([name for name, member in members.iteritems() if member.issym()], [])
+
+    def test_export_delta(self):
+        base_path = os.path.join(self.temp_dir, 'base.json')
+        with open(base_path, 'w') as base_file:
+            json.dump({'type': 'pulp-docker-export-manifest', 'created': '2014-10-01T00:00:00Z',
+                       'images': {'foo_image': None}, 'tags': {}}, base_file)
+        self.repo_config[constants.CONFIG_KEY_EXPORT_BASE_MANIFEST] = base_path
+
+        self._export(['foo_image', 'bar_image'])
+
+        names, index = self._read('foo_repo_id.tar')
+        self.assertTrue('web/bar_image/layer' in names)
+        self.assertFalse('web/foo_image/layer' in names)
+        self.assertEqual(self.step.metrics.units, 1)
+        with open(os.path.join(self.export_dir, 'foo_repo_id-manifest.json')) as manifest_file:
+            delta = json.load(manifest_file)['delta']
+        self.assertEqual(delta['images'], ['bar_image'])
+
+    def test_export_volumes(self):
+        touch(os.path.join(self.export_dir, 'foo_repo_id.tar'))
+        touch(os.path.join(self.export_dir, 'foo_repo_id.009.tar'))
+        # a file that matches the volume names, but that no export wrote
+        touch(os.path.join(self.export_dir, 'foo_repo_id.010.tar'))
+        with open(os.path.join(self.export_dir, 'foo_repo_id-manifest.json'), 'w') as old_file:
+            json.dump({'type': 'pulp-docker-export-manifest',
+                       'files': ['foo_repo_id.tar', 'foo_repo_id.009.tar']}, old_file)
+        volume_size = 29 * 1024
+        self.repo_config[constants.CONFIG_KEY_EXPORT_VOLUME_SIZE] = volume_size
+
+        self._export(['image_%d' % i for i in range(6)])
+
+        # the single file and the volume from the earlier export are removed,
+        # and only they are
+        self.assertTrue(os.path.exists(os.path.join(self.export_dir, 'foo_repo_id.010.tar')))
+        os.unlink(os.path.join(self.export_dir, 'foo_repo_id.010.tar'))
+        volume_files = sorted(name for name in os.listdir(self.export_dir)
+                              if name.endswith('.tar'))
+        self.assertTrue(len(volume_files) > 1)
+        with open(os.path.join(self.export_dir, 'foo_repo_id-manifest.json')) as manifest_file:
+            self.assertEqual(sorted(json.load(manifest_file)['files']), volume_files)
+        self.assertEqual(volume_files, ['foo_repo_id.%03d.tar' % i
+                                        for i in range(1, len(volume_files) + 1)])
+        image_ids = []
+        for number, volume_file in enumerate(volume_files, 1):
+            size = os.path.getsize(os.path.join(self.export_dir, volume_file))
+            self.assertTrue(size <= volume_size)
+            names, index = self._read(volume_file)
+            self.assertEqual(index['volume'], number)
+            self.assertEqual(index['volumes'], len(volume_files))
+            # each volume has all of the metadata and only its own images
+            self.assertTrue('foo_repo_id.json' in names)
+            self.assertTrue('export-manifest.json' in names)
+            self.assertEqual(sorted(name.split('/')[1] for name in names
+                                    if name.endswith('/layer')), sorted(index['images']))
+            image_ids.extend(index['images'])
+        self.assertEqual(sorted(image_ids), ['image_%d' % i for i in range(6)])
+
+    def test_export_docker_save(self):
+        self.conduit.get_repo_scratchpad.return_value = {
+            u'tags': [{constants.IMAGE_TAG_KEY: u'latest', constants.IMAGE_ID_KEY: u'bar_image'}]}
+        self.repo_config[constants.CONFIG_KEY_EXPORT_FORMAT] = constants.EXPORT_FORMAT_DOCKER_SAVE
+
+        self._export(['bar_image', 'foo_image'], {'bar_image': 'foo_image'})
+
+        archive = tarfile.open(os.path.join(self.export_dir, 'foo_repo_id.tar'))
+        try:
+            names = archive.getnames()
+            self.assertEqual(archive.extractfile('foo_image/layer.tar').read(), 'layer')
+            self.assertEqual(archive.extractfile('foo_image/VERSION').read(), '1.0')
+            repositories = json.load(archive.extractfile('repositories'))
+        finally:
+            archive.close()
+        self.assertEqual(repositories, {'foo_repo_id': {'latest': 'bar_image'}})
+        self.assertTrue('bar_image/json' in names)
+        self.assertTrue('export-manifest.json' in names)
+        # docker load can not read the files that are published for crane
+        self.assertFalse('foo_repo_id.json' in names)
+        self.assertFalse([name for name in names if name.startswith('web')])
+
+    def test_export_docker_save_volumes(self):
+        volume_size = 29 * 1024
+        self.repo_config[constants.CONFIG_KEY_EXPORT_VOLUME_SIZE] = volume_size
+        self.repo_config[constants.CONFIG_KEY_EXPORT_FORMAT] = constants.EXPORT_FORMAT_DOCKER_SAVE
+        image_ids = ['image_%d' % i for i in range(6)]
+        parents = dict(zip(image_ids[1:], image_ids))
+
+        self._export(list(reversed(image_ids)), parents)
+
+        volume_files = sorted(name for name in os.listdir(self.export_dir)
+                              if name.endswith('.tar'))
+        self.assertTrue(len(volume_files) > 1)
+        loaded = []
+        for volume_file in volume_files:
+            size = os.path.getsize(os.path.join(self.export_dir, volume_file))
+            self.assertTrue(size <= volume_size)
+            names, index = self._read(volume_file)
+            # loading the volumes in order loads each image after its parent
+            for image_id in index['images']:
+                self.assertTrue(parents.get(image_id) in loaded + [None])
+                loaded.append(image_id)
+        self.assertEqual(loaded, image_ids)
@@ -0,0 +1,168 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from pulp_docker.plugins.distributors import tarstream
+
+
+class TestTarStreamWriter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.temp_dir, 'source')
+        os.makedirs(self.source_dir)
+        self.tar_path = os.path.join(self.temp_dir, 'export', 'foo.tar')
+        # a small buffer makes sure files are copied in more than one piece
+        self.writer = tarstream.TarStreamWriter(self.tar_path, buffer_size=7)
+        self.writer.open()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.source_dir, name)
+        with open(path, 'w') as source_file:
+            source_file.write(content)
+        return path
+
+    def _read(self):
+        archive = tarfile.open(self.tar_path)
+        try:
+            members = dict((member.name, member) for member in archive.getmembers())
+            contents = dict((member.name, archive.extractfile(member).read())
+                            for member in members.itervalues() if member.isfile())
+        finally:
+            archive.close()
+        return members, contents
+
+    def test_add_file(self):
+        path = self._write('layer', 'a' * 1000)
+
+        self.writer.add_directory('web/abc')
+        self.writer.add_file('web/abc/layer', path)
+        self.writer.close()
+
+        members, contents = self._read()
+        self.assertTrue(members['web/abc'].isdir())
+        self.assertEqual(contents, {'web/abc/layer': 'a' * 1000})
+        self.assertEqual(members['web/abc/layer'].mtime, int(os.stat(path).st_mtime))
+
+    def test_bytes_written(self):
+        path = self._write('json', '{}')
+
+        self.writer.add_file('json', path)
+        self.writer.close()
+
+        self.assertEqual(self.writer.bytes_written, os.path.getsize(self.tar_path))
+        self.assertEqual(self.writer.bytes_written % tarfile.RECORDSIZE, 0)
+        self.assertEqual(self.writer.members, 1)
+
+    def test_add_file_follows_links(self):
+        path = self._write('layer', 'abc')
+        os.symlink(path, os.path.join(self.source_dir, 'link'))
+
+        self.writer.add_file('layer', os.path.join(self.source_dir, 'link'))
+        self.writer.close()
+
+        members, contents = self._read()
+        self.assertEqual(contents, {'layer': 'abc'})
+
+    def test_add_tree(self):
+        self._write('foo.json', '{}')
+        os.makedirs(os.path.join(self.source_dir, 'web', 'v1'))
+        os.symlink(os.pardir, os.path.join(self.source_dir, 'web', 'v1', 'images'))
+        excluded = self._write('foo.tar', '')
+
+        self.writer.add_tree(self.source_dir, '', exclude=[excluded])
+        self.writer.close()
+
+        members, contents = self._read()
+        self.assertEqual(sorted(members), ['foo.json', 'web', 'web/v1', 'web/v1/images'])
+        self.assertEqual(contents, {'foo.json': '{}'})
+        # the link is kept as a link, rather than adding the tree again
+        self.assertTrue(members['web/v1/images'].issym())
+        self.assertEqual(members['web/v1/images'].linkname, os.pardir)
+
+    def test_add_tree_arcname(self):
+        self._write('json', '{}')
+
+        self.writer.add_tree(self.source_dir, 'abc')
+        self.writer.close()
+
+        members, contents = self._read()
+        self.assertEqual(sorted(members), ['abc', 'abc/json'])
+
+    def test_add_stream(self):
+        path = self._write('layer', 'a' * 100)
+
+        with open(path) as source:
+            self.writer.add_stream('layer.tar', source, 100)
+        self.writer.close()
+
+        members, contents = self._read()
+        self.assertEqual(contents, {'layer.tar': 'a' * 100})
+
+    def test_add_stream_wrong_size(self):
+        path = self._write('layer', 'a' * 100)
+
+        with open(path) as source:
+            self.assertRaises(IOError, self.writer.add_stream, 'layer.tar', source, 99)
+
+    def test_add_data(self):
+        self.writer.add_data('volume.json', '{"volume": 1}')
+        self.writer.close()
+
+        members, contents = self._read()
+        self.assertEqual(contents, {'volume.json': '{"volume": 1}'})
+
+    def test_tree_size(self):
+        self._write('foo.json', 'a' * 1000)
+        os.makedirs(os.path.join(self.source_dir, 'web', 'v1'))
+        os.symlink(os.pardir, os.path.join(self.source_dir, 'web', 'v1', 'images'))
+
+        self.writer.add_tree(self.source_dir, '')
+
+        tree_size = tarstream.get_tree_size(self.source_dir)
+        self.assertEqual(self.writer.bytes_written, tree_size)
+        self.writer.close()
+        self.assertTrue(self.writer.bytes_written <= tree_size + tarstream.END_SIZE)
+
+    def test_tree_size_long_names(self):
+        # names and link targets over 100 characters take GNU longname headers
+        long_dir = os.path.join(self.source_dir, 'd' * 99)
+        os.makedirs(long_dir)
+        self._write(os.path.join(long_dir, 'f' * 150), 'a' * 10)
+        os.symlink('t' * 150, os.path.join(self.source_dir, 'link'))
+
+        self.writer.add_tree(self.source_dir, 'top')
+
+        self.assertEqual(self.writer.bytes_written,
+                         tarstream.get_tree_size(self.source_dir, arcname='top'))
+        self.writer.close()
+        members, contents = self._read()
+        self.assertEqual(members['top/link'].linkname, 't' * 150)
+        self.assertEqual(contents['top/%s/%s' % ('d' * 99, 'f' * 150)], 'a' * 10)
+
+    def test_member_size_long_name(self):
+        name = 'a' * 150
+
+        self.writer.add_data(name, 'abc')
+
+        self.assertEqual(self.writer.bytes_written, tarstream.get_member_size(3, name))
+        self.assertTrue(tarstream.get_member_size(3, name) > tarstream.get_member_size(3))
+
+
+class TestGetMemberSize(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(tarstream.get_member_size(0), 512)
+        self.assertEqual(tarstream.get_member_size(1), 1024)
+        self.assertEqual(tarstream.get_member_size(512), 1024)
+        self.assertEqual(tarstream.get_member_size(513), 1536)
+
+    def test_header_sizes(self):
+        self.assertEqual(tarstream.get_header_size('a' * 100), 512)
+        # the trailing slash makes the name too long for one block
+        self.assertEqual(tarstream.get_header_size('a' * 100, tarfile.DIRTYPE), 1536)
+        self.assertEqual(tarstream.get_header_size('a' * 600), 2048)
+        self.assertEqual(tarstream.get_header_size('link', tarfile.SYMTYPE, 'a' * 101), 1536)
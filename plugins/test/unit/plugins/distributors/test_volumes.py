@@ -0,0 +1,65 @@
+import json
+import unittest
+
+from pulp_docker.plugins.distributors import volumes
+
+
+def make_image(image_id, size, parent_id=None):
+    image = volumes.ExportImage(image_id, parent_id, '/a/b')
+    image.size = size
+    return image
+
+
+class TestPlanVolumes(unittest.TestCase):
+    def test_first_fit_decreasing(self):
+        images = [make_image(image_id, size) for image_id, size in
+                  (('a', 30), ('b', 60), ('c', 50), ('d', 40), ('e', 20))]
+
+        plan = volumes.plan_volumes(images, 100)
+
+        self.assertEqual([[image.image_id for image in volume] for volume in plan],
+                         [['b', 'd'], ['c', 'a', 'e']])
+
+    def test_oversized_image(self):
+        images = [make_image('a', 150), make_image('b', 50)]
+
+        plan = volumes.plan_volumes(images, 100)
+
+        self.assertEqual([[image.image_id for image in volume] for volume in plan],
+                         [['a'], ['b']])
+
+    def test_no_images(self):
+        self.assertEqual(volumes.plan_volumes([], 100), [])
+
+    def test_ancestry(self):
+        # c would fit in the first volume, but its parent b is in the second
+        images = [make_image('c', 30, 'b'), make_image('a', 60), make_image('b', 50, 'a')]
+
+        plan = volumes.plan_volumes(images, 100, ancestry=True)
+
+        self.assertEqual([[image.image_id for image in volume] for volume in plan],
+                         [['a'], ['b', 'c']])
+
+
+class TestSortByAncestry(unittest.TestCase):
+    def test_parents_first(self):
+        images = [make_image('d', 1, 'c'), make_image('c', 1, 'b'), make_image('e', 1, 'x'),
+                  make_image('b', 1, 'a'), make_image('a', 1)]
+
+        ordered = [image.image_id for image in volumes.sort_by_ancestry(images)]
+
+        for child, parent in (('d', 'c'), ('c', 'b'), ('b', 'a')):
+            self.assertTrue(ordered.index(parent) < ordered.index(child))
+
+    def test_cycle(self):
+        images = [make_image('a', 1, 'b'), make_image('b', 1, 'a')]
+
+        self.assertEqual(len(volumes.sort_by_ancestry(images)), 2)
+
+
+class TestGetIndex(unittest.TestCase):
+    def test_index(self):
+        index = json.loads(volumes.get_index('foo', 2, 3, [make_image('a', 1)]))
+
+        self.assertEqual(index, {'type': volumes.VOLUME_TYPE, 'repository': 'foo',
+                                 'volume': 2, 'volumes': 3, 'images': ['a']})
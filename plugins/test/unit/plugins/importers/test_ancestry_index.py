@@ -0,0 +1,180 @@
+import unittest
+
+import mock
+
+from pulp_docker.plugins.importers import ancestry_index
+
+
+MARKER = {'repo_id': 'repo1', 'image_id': None}
+
+
+def make_document(image_id, parent, size, depth, virtual_size, children=()):
+    return {'repo_id': 'repo1', 'image_id': image_id, 'parent': parent, 'size': size,
+            'depth': depth, 'virtual_size': virtual_size, 'children': list(children)}
+
+
+@mock.patch('pulp_docker.plugins.importers.ancestry_index.connection.get_collection')
+class TestGetIndex(unittest.TestCase):
+    def test_existing(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = [MARKER, make_document('a', None, 1, 0, 1, ['c', 'b'])]
+
+        self.assertEqual(ancestry_index.get_index('repo1'),
+                         {'a': {'parent': None, 'size': 1, 'depth': 0, 'virtual_size': 1,
+                                'children': ['b', 'c']}})
+        collection.find.assert_called_once_with({'repo_id': 'repo1'})
+
+    def test_existing_empty(self, mock_get_collection):
+        mock_get_collection.return_value.find.return_value = [MARKER]
+
+        self.assertEqual(ancestry_index.get_index('repo1'), {})
+
+    @mock.patch('pulp_docker.plugins.importers.associations.get_repo_images')
+    def test_builds_missing(self, mock_get_images, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = []
+        mock_get_images.return_value = {'base': {'parent_id': None, 'size': 1}}
+
+        index = ancestry_index.get_index('repo1')
+
+        self.assertEqual(index['base']['virtual_size'], 1)
+        collection.remove.assert_called_once_with({'repo_id': 'repo1'}, safe=True)
+        self.assertEqual(collection.insert.call_args_list, [
+            mock.call([dict(index['base'], repo_id='repo1', image_id='base')], safe=True),
+            mock.call(MARKER, safe=True)])
+
+    @mock.patch('pulp_docker.plugins.importers.associations.get_repo_images')
+    def test_builds_missing_without_saving(self, mock_get_images, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = []
+        mock_get_images.return_value = {'base': {'parent_id': None, 'size': 1}}
+
+        index = ancestry_index.get_index('repo1', save=False)
+
+        self.assertEqual(index['base']['virtual_size'], 1)
+        self.assertFalse(collection.remove.called)
+        self.assertFalse(collection.insert.called)
+
+
+@mock.patch('pulp_docker.plugins.importers.ancestry_index.connection.get_collection')
+class TestAddImages(unittest.TestCase):
+    def test_existing_images_only(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = [MARKER, {'image_id': 'base'}]
+
+        ancestry_index.add_images('repo1', {'base': {'parent_id': None, 'size': 1}})
+
+        # a single query, and nothing is written
+        self.assertEqual(collection.find.call_count, 1)
+        self.assertFalse(collection.insert.called)
+        self.assertFalse(collection.update.called)
+
+    def test_new_child(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.side_effect = [
+            [MARKER],
+            [make_document('child', 'base', 2, 1, 3)],
+            [],
+        ]
+
+        ancestry_index.add_images('repo1', {'grandchild': {'parent_id': 'child', 'size': 4}})
+
+        collection.insert.assert_called_once_with(
+            [make_document('grandchild', 'child', 4, 2, 7)], safe=True)
+        collection.update.assert_called_once_with(
+            {'repo_id': 'repo1', 'image_id': 'child'},
+            {'$addToSet': {'children': {'$each': ['grandchild']}}}, safe=True)
+
+    def test_new_parent(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.side_effect = [
+            [MARKER],
+            # an existing image whose parent was missing until now
+            [make_document('child', 'base', 2, 0, 2)],
+            [],
+        ]
+
+        ancestry_index.add_images('repo1', {'base': {'parent_id': None, 'size': 1}})
+
+        collection.insert.assert_called_once_with(
+            [make_document('base', None, 1, 0, 1, ['child'])], safe=True)
+        collection.update.assert_called_once_with(
+            {'repo_id': 'repo1', 'image_id': 'child'},
+            {'$set': {'depth': 1, 'virtual_size': 3}}, safe=True)
+
+    @mock.patch('pulp_docker.plugins.importers.associations.get_repo_images')
+    def test_builds_missing(self, mock_get_images, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = []
+        mock_get_images.return_value = {'base': {'parent_id': None, 'size': 1}}
+
+        ancestry_index.add_images('repo1', {'base': {'parent_id': None, 'size': 1}})
+
+        collection.remove.assert_called_once_with({'repo_id': 'repo1'}, safe=True)
+        self.assertEqual(collection.insert.call_count, 2)
+
+
+@mock.patch('pulp_docker.plugins.importers.ancestry_index.connection.get_collection')
+class TestRemoveImages(unittest.TestCase):
+    def test_remove(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.side_effect = [
+            [{'image_id': 'child', 'parent': 'base'}],
+            [make_document('grandchild', 'child', 4, 2, 7)],
+            [],
+        ]
+
+        ancestry_index.remove_images('repo1', ['child'])
+
+        collection.remove.assert_called_once_with(
+            {'repo_id': 'repo1', 'image_id': {'$in': ['child']}}, safe=True)
+        self.assertEqual(collection.update.call_args_list, [
+            mock.call({'repo_id': 'repo1', 'image_id': {'$in': ['base']}},
+                      {'$pullAll': {'children': ['child']}}, multi=True, safe=True),
+            # the orphaned image is now a base image
+            mock.call({'repo_id': 'repo1', 'image_id': 'grandchild'},
+                      {'$set': {'depth': 0, 'virtual_size': 4}}, safe=True)])
+
+    def test_unknown(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = []
+
+        ancestry_index.remove_images('repo1', ['unknown'])
+
+        self.assertFalse(collection.remove.called)
+        self.assertFalse(collection.update.called)
+
+    def test_delete_index(self, mock_get_collection):
+        ancestry_index.delete_index('repo1')
+
+        collection = mock_get_collection.return_value
+        collection.remove.assert_called_once_with({'repo_id': 'repo1'}, safe=True)
+
+
+@mock.patch('pulp_docker.plugins.importers.ancestry_index.connection.get_collection')
+class TestGetAncestors(unittest.TestCase):
+    def test_walks_up(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = [
+            MARKER, {'image_id': 'foo', 'parent': 'bar'}, {'image_id': 'bar', 'parent': 'baz'},
+            {'image_id': 'baz', 'parent': None}, {'image_id': 'other', 'parent': 'baz'}]
+
+        self.assertEqual(ancestry_index.get_ancestors('repo1', ['foo']), set(['bar', 'baz']))
+        # a single query, however many generations there are
+        collection.find.assert_called_once_with({'repo_id': 'repo1'},
+                                                fields=['image_id', 'parent'])
+
+    def test_ancestor_not_in_repo(self, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = [MARKER, {'image_id': 'foo', 'parent': 'bar'}]
+
+        self.assertEqual(ancestry_index.get_ancestors('repo1', ['foo']), set())
+
+    @mock.patch('pulp_docker.plugins.importers.associations.get_repo_images')
+    def test_builds_missing(self, mock_get_images, mock_get_collection):
+        collection = mock_get_collection.return_value
+        collection.find.return_value = []
+        mock_get_images.return_value = {'foo': {'parent_id': 'bar', 'size': 1},
+                                        'bar': {'parent_id': 'baz', 'size': 1}}
+
+        self.assertEqual(ancestry_index.get_ancestors('repo1', ['foo']), set(['bar']))
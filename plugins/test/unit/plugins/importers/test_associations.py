@@ -0,0 +1,91 @@
+import unittest
+
+import mock
+from pulp.server.managers.repo.unit_association import OWNER_TYPE_IMPORTER
+
+from pulp_docker.common import constants
+from pulp_docker.plugins.importers import associations
+
+
+def make_unit(image_id, unit_id=None):
+    return mock.Mock(unit_key={'image_id': image_id}, metadata={}, id=unit_id)
+
+
+class TestGetBatches(unittest.TestCase):
+    def test_batches(self):
+        batches = list(associations.get_batches(range(5), 2))
+
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+
+    def test_empty(self):
+        self.assertEqual(list(associations.get_batches([], 2)), [])
+
+
+@mock.patch('pulp_docker.plugins.importers.associations.factory.repo_unit_association_manager')
+class TestAssociateUnits(unittest.TestCase):
+    def setUp(self):
+        self.conduit = mock.MagicMock()
+        self.conduit.get_destination_units.return_value = []
+
+    def test_bulk(self, mock_manager):
+        units = [make_unit('image%d' % i, 'id%d' % i) for i in range(5)]
+
+        result = associations.associate_units('repo1', self.conduit, units, batch_size=2)
+
+        self.assertEqual(result, units)
+        calls = mock_manager.return_value.associate_all_by_ids.call_args_list
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(calls[0], mock.call('repo1', constants.IMAGE_TYPE_ID, ['id0', 'id1'],
+                                             OWNER_TYPE_IMPORTER, constants.IMPORTER_TYPE_ID))
+        self.assertFalse(self.conduit.associate_unit.called)
+
+    def test_fallback_without_ids(self, mock_manager):
+        units = [make_unit('image1'), make_unit('image2')]
+
+        associations.associate_units('repo1', self.conduit, units)
+
+        self.assertEqual(self.conduit.associate_unit.call_args_list,
+                         [mock.call(units[0]), mock.call(units[1])])
+        self.assertFalse(mock_manager.return_value.associate_all_by_ids.called)
+
+    def test_skips_existing(self, mock_manager):
+        self.conduit.get_destination_units.return_value = [make_unit('image1')]
+        units = [make_unit('image1', 'id1'), make_unit('image2', 'id2')]
+
+        result = associations.associate_units('repo1', self.conduit, units)
+
+        self.assertEqual(result, [units[1]])
+        mock_manager.return_value.associate_all_by_ids.assert_called_once_with(
+            'repo1', constants.IMAGE_TYPE_ID, ['id2'], OWNER_TYPE_IMPORTER,
+            constants.IMPORTER_TYPE_ID)
+
+
+class TestGetRepoImages(unittest.TestCase):
+    @mock.patch('pulp_docker.plugins.importers.associations.factory.'
+                'repo_unit_association_query_manager')
+    def test_images(self, mock_query_manager):
+        mock_query_manager.return_value.get_units_by_type.return_value = [
+            {'metadata': {'image_id': 'child', 'parent_id': 'base', 'size': 2}},
+            {'metadata': {'image_id': 'base', 'parent_id': None, 'size': None}}]
+
+        images = associations.get_repo_images('repo1')
+
+        self.assertEqual(images, {'child': {'parent_id': 'base', 'size': 2},
+                                  'base': {'parent_id': None, 'size': None}})
+
+
+class TestUnassociateImages(unittest.TestCase):
+    @mock.patch('pulp_docker.plugins.importers.associations.factory.'
+                'repo_unit_association_manager')
+    def test_unassociate(self, mock_manager):
+        associations.unassociate_images('repo1', set(['abc123']))
+
+        call_args = mock_manager.return_value.unassociate_by_criteria.call_args
+        self.assertEqual(call_args[0][0], 'repo1')
+        self.assertEqual(call_args[0][1].unit_filters, {'image_id': {'$in': ['abc123']}})
+        self.assertEqual(call_args[1], {'notify_plugins': False})
+
+
+class TestGetTotalSize(unittest.TestCase):
+    def test_total(self):
+        self.assertEqual(associations.get_total_size([{'size': 2}, {'size': None}]), 2)
@@ -0,0 +1,118 @@
+import datetime
+import unittest
+
+import mock
+
+from pulp_docker.plugins.importers import concurrency
+
+
+def make_report(bytes_downloaded=1024, seconds=1.0, kind='layer'):
+    start = datetime.datetime(2014, 1, 1)
+    finish = start + datetime.timedelta(seconds=seconds)
+    return mock.Mock(url='http://pulpproject.org/v1/images/abc123/%s' % kind,
+                     bytes_downloaded=bytes_downloaded, start_time=start, finish_time=finish)
+
+
+class TestAIMDController(unittest.TestCase):
+    def test_init_clamps_initial(self):
+        controller = concurrency.AIMDController(50, maximum=10)
+
+        self.assertEqual(controller.concurrency, 10)
+
+    def test_additive_increase(self):
+        controller = concurrency.AIMDController(5)
+        for i in range(10):
+            controller.record(make_report())
+
+        self.assertEqual(controller.adjust(1.0), 6)
+
+    def test_increase_capped_at_maximum(self):
+        controller = concurrency.AIMDController(5, maximum=5)
+        controller.record(make_report())
+
+        self.assertEqual(controller.adjust(1.0), 5)
+
+    def test_multiplicative_decrease_on_errors(self):
+        controller = concurrency.AIMDController(8)
+        for i in range(9):
+            controller.record(make_report())
+        controller.record(make_report(), succeeded=False)
+
+        self.assertEqual(controller.adjust(1.0), 4)
+
+    def test_decrease_on_latency(self):
+        controller = concurrency.AIMDController(8)
+        controller.record(make_report(seconds=1.0))
+        controller.adjust(1.0)
+        controller.record(make_report(seconds=5.0))
+
+        self.assertEqual(controller.adjust(1.0), 4)
+
+    def test_latency_compared_per_kind(self):
+        controller = concurrency.AIMDController(8)
+        controller.record(make_report(seconds=0.01, kind='json'))
+        controller.adjust(1.0)
+        controller.record(make_report(seconds=5.0, kind='layer'))
+
+        # a layer is not slow compared to a small metadata file
+        self.assertEqual(controller.adjust(1.0), 10)
+
+    def test_usual_latency_follows_upstream(self):
+        controller = concurrency.AIMDController(8, minimum=2)
+        controller.record(make_report(seconds=1.0))
+        controller.adjust(1.0)
+        adjustments = []
+        for i in range(20):
+            controller.record(make_report(seconds=3.0))
+            adjustments.append(controller.adjust(1.0))
+
+        # once the upstream has been slower for a while, that is what is usual
+        self.assertEqual(adjustments[0], 4)
+        self.assertEqual(adjustments[-1] - adjustments[-2], 1)
+        self.assertTrue(2.9 < controller.usual_latencies['layer'] < 3.0)
+
+    def test_hold_when_throughput_drops(self):
+        controller = concurrency.AIMDController(4)
+        controller.record(make_report(bytes_downloaded=10000))
+        controller.adjust(1.0)
+        controller.record(make_report(bytes_downloaded=1000))
+
+        self.assertEqual(controller.adjust(1.0), 5)
+
+    def test_never_below_minimum(self):
+        controller = concurrency.AIMDController(1)
+        controller.record(make_report(), succeeded=False)
+
+        self.assertEqual(controller.adjust(1.0), 1)
+
+    def test_empty_window(self):
+        controller = concurrency.AIMDController(3)
+
+        self.assertEqual(controller.adjust(1.0), 3)
+        self.assertEqual(list(controller.windows), [])
+
+    def test_get_report(self):
+        controller = concurrency.AIMDController(2)
+        controller.record(make_report(bytes_downloaded=2048))
+        controller.adjust(2.0)
+
+        report = controller.get_report()
+
+        self.assertEqual(report['initial_concurrency'], 2)
+        self.assertEqual(report['final_concurrency'], 3)
+        self.assertEqual(report['min_concurrency_used'], 2)
+        self.assertEqual(report['max_concurrency_used'], 2)
+        self.assertEqual(report['windows'][0]['bytes_per_second'], 1024)
+        self.assertEqual(report['windows'][0]['requests'], 1)
+
+    def test_report_keeps_recent_windows(self):
+        controller = concurrency.AIMDController(1, maximum=2)
+        for i in range(concurrency.MAX_REPORTED_WINDOWS + 10):
+            controller.record(make_report())
+            controller.adjust(1.0)
+
+        report = controller.get_report()
+
+        self.assertEqual(len(report['windows']), concurrency.MAX_REPORTED_WINDOWS)
+        self.assertEqual(report['min_concurrency_used'], 1)
+        self.assertEqual(report['max_concurrency_used'], 2)
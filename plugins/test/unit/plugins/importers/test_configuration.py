@@ -0,0 +1,110 @@
+import unittest
+
+from pulp.devel.unit.server.util import assert_validation_exception
+from pulp.plugins.config import PluginCallConfiguration
+
+from pulp_docker.common import constants, error_codes
+from pulp_docker.plugins.importers import concurrency, configuration
+
+
+class TestValidateConfig(unittest.TestCase):
+    def test_empty(self):
+        config = PluginCallConfiguration({}, {})
+
+        self.assertEquals((True, None), configuration.validate_config(config))
+
+    def test_valid(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_INCLUDE_TAGS: ['latest', r'7\.\d+'],
+            constants.CONFIG_KEY_TAG_FILTER_REGEX: 'true',
+            constants.CONFIG_KEY_MAX_TAGS: '5',
+            constants.CONFIG_KEY_MAX_ADAPTIVE_DOWNLOADS: 10,
+            constants.CONFIG_KEY_CASCADE_REMOVE: 'descendants, unreachable',
+        })
+
+        self.assertEquals((True, None), configuration.validate_config(config))
+
+    def test_boolean_bad_str(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_GARBAGE_COLLECT: 'apple'})
+
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1004], config)
+
+    def test_max_tags_not_positive(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_MAX_TAGS: 0})
+
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1008], config)
+
+    def test_max_tags_bad_str(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_MAX_TAGS: 'apple'})
+
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1008], config)
+
+    def test_max_adaptive_downloads_bad_str(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_MAX_ADAPTIVE_DOWNLOADS: 'apple'})
+
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1008], config)
+
+    def test_bad_regex(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_EXCLUDE_TAGS: ['latest', '7.('],
+            constants.CONFIG_KEY_TAG_FILTER_REGEX: True,
+        })
+
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1010], config)
+
+    def test_bad_regex_as_glob(self):
+        # globs have no syntax errors
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_EXCLUDE_TAGS: ['7.(']})
+
+        self.assertEquals((True, None), configuration.validate_config(config))
+
+    def test_cascade_unsupported(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_CASCADE_REMOVE: 'descendants,apple'})
+
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1011], config)
+
+    def test_several_errors(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_MAX_TAGS: -1,
+            constants.CONFIG_KEY_CASCADE_REMOVE: 'apple',
+        })
+
+        assert_validation_exception(configuration.validate_config,
+                                    [error_codes.DKR1008, error_codes.DKR1011], config)
+
+
+class TestGetters(unittest.TestCase):
+    def test_get_list_config(self):
+        config = {constants.CONFIG_KEY_INCLUDE_TAGS: 'a, b,,c '}
+
+        self.assertEqual(configuration.get_list_config(config, constants.CONFIG_KEY_INCLUDE_TAGS),
+                         ['a', 'b', 'c'])
+        self.assertEqual(configuration.get_list_config({}, constants.CONFIG_KEY_INCLUDE_TAGS), [])
+
+    def test_get_max_tags(self):
+        self.assertEqual(configuration.get_max_tags({}), None)
+        self.assertEqual(configuration.get_max_tags({constants.CONFIG_KEY_MAX_TAGS: '3'}), 3)
+        self.assertRaises(ValueError, configuration.get_max_tags,
+                          {constants.CONFIG_KEY_MAX_TAGS: '0'})
+
+    def test_get_max_adaptive_downloads(self):
+        self.assertEqual(configuration.get_max_adaptive_downloads({}),
+                         concurrency.DEFAULT_MAX_CONCURRENCY)
+        self.assertEqual(configuration.get_max_adaptive_downloads(
+            {constants.CONFIG_KEY_MAX_ADAPTIVE_DOWNLOADS: 4}), 4)
+
+    def test_get_cascade_remove(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_CASCADE_REMOVE: 'unreachable'})
+
+        self.assertEqual(configuration.get_cascade_remove(config),
+                         [constants.CASCADE_UNREACHABLE])
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_CASCADE_REMOVE: 'apple'})
+        self.assertRaises(ValueError, configuration.get_cascade_remove, config)
@@ -98,6 +98,9 @@ class TestUploadUnit(unittest.TestCase):
         self.repo = Repository('repo1')
         self.conduit = mock.MagicMock()
         self.config = PluginCallConfiguration({}, {})
+        patcher = mock.patch('pulp_docker.plugins.importers.importer.ancestry_index.add_images')
+        self.mock_add_images = patcher.start()
+        self.addCleanup(patcher.stop)
 
     @mock.patch('pulp_docker.plugins.importers.upload.save_models', spec_set=True)
     def test_save_conduit(self, mock_save, mock_update_tags):
@@ -147,6 +150,14 @@ class TestUploadUnit(unittest.TestCase):
 
         mock_update_tags.assert_called_once_with(self.repo.id, data.busybox_tar_path)
 
+    @mock.patch('pulp_docker.plugins.importers.upload.save_models', spec_set=True)
+    def test_updates_ancestry_index(self, mock_save, mock_update_tags):
+        DockerImporter().upload_unit(self.repo, constants.IMAGE_TYPE_ID, self.unit_key,
+                                     {}, data.busybox_tar_path, self.conduit, self.config)
+
+        images = self.mock_add_images.call_args[0][1]
+        self.assertEqual(set(images.keys()), set(data.busybox_ids))
+
 
 class TestImportUnits(unittest.TestCase):
 
@@ -156,6 +167,24 @@ class TestImportUnits(unittest.TestCase):
         self.dest_repo = Repository('repo_dest')
         self.conduit = mock.MagicMock()
         self.config = PluginCallConfiguration({}, {})
+        patcher = mock.patch('pulp_docker.plugins.importers.associations.factory.'
+                             'repo_unit_association_manager')
+        self.association_manager = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('pulp_docker.plugins.importers.importer.ancestry_index.add_images')
+        self.mock_add_images = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('pulp_docker.plugins.importers.importer.ancestry_index.'
+                             'get_ancestors', return_value=set())
+        self.mock_get_ancestors = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_associated(self, units):
+        unit_ids = []
+        for call in self.association_manager.associate_all_by_ids.call_args_list:
+            self.assertEqual(call[0][0], self.dest_repo.id)
+            unit_ids.extend(call[0][2])
+        self.assertEqual(unit_ids, [unit.id for unit in units])
 
     def test_import_all(self):
         mock_unit = mock.Mock(unit_key={'image_id': 'foo'}, metadata={})
@@ -163,31 +192,122 @@ class TestImportUnits(unittest.TestCase):
         result = DockerImporter().import_units(self.source_repo, self.dest_repo, self.conduit,
                                                self.config)
         self.assertEquals(result, [mock_unit])
-        self.conduit.associate_unit.assert_called_once_with(mock_unit)
+        self.assert_associated([mock_unit])
+
+    def test_import_updates_ancestry_index(self):
+        mock_unit = mock.Mock(unit_key={'image_id': 'foo'}, metadata={'parent_id': None,
+                                                                      'size': 2})
+        DockerImporter().import_units(self.source_repo, self.dest_repo, self.conduit,
+                                      self.config, units=[mock_unit])
+
+        self.mock_add_images.assert_called_once_with(
+            self.dest_repo.id, {'foo': {'parent_id': None, 'size': 2}})
 
     def test_import_no_parent(self):
         mock_unit = mock.Mock(unit_key={'image_id': 'foo'}, metadata={})
         result = DockerImporter().import_units(self.source_repo, self.dest_repo, self.conduit,
                                                self.config, units=[mock_unit])
         self.assertEquals(result, [mock_unit])
-        self.conduit.associate_unit.assert_called_once_with(mock_unit)
+        self.assert_associated([mock_unit])
 
     def test_import_with_parent(self):
         mock_unit1 = mock.Mock(unit_key={'image_id': 'foo'}, metadata={'parent_id': 'bar'})
         mock_unit2 = mock.Mock(unit_key={'image_id': 'bar'}, metadata={})
+        self.mock_get_ancestors.return_value = set(['bar'])
         self.conduit.get_source_units.return_value = [mock_unit2]
         result = DockerImporter().import_units(self.source_repo, self.dest_repo, self.conduit,
                                                self.config, units=[mock_unit1])
         self.assertEquals(result, [mock_unit1, mock_unit2])
-        calls = [mock.call(mock_unit1), mock.call(mock_unit2)]
-        self.conduit.associate_unit.assert_has_calls(calls)
+        self.assert_associated([mock_unit1, mock_unit2])
+
+    def test_import_with_ancestors_from_index(self):
+        mock_unit1 = mock.Mock(unit_key={'image_id': 'foo'}, metadata={'parent_id': 'bar'})
+        mock_unit2 = mock.Mock(unit_key={'image_id': 'bar'}, metadata={'parent_id': 'baz'})
+        mock_unit3 = mock.Mock(unit_key={'image_id': 'baz'}, metadata={})
+        self.mock_get_ancestors.return_value = set(['bar', 'baz'])
+        self.conduit.get_source_units.return_value = [mock_unit2, mock_unit3]
+
+        result = DockerImporter().import_units(self.source_repo, self.dest_repo, self.conduit,
+                                               self.config, units=[mock_unit1])
+
+        self.assertEquals(result, [mock_unit1, mock_unit2, mock_unit3])
+        # the ancestors are found in the source repository's index, and only
+        # the missing units are retrieved
+        self.mock_get_ancestors.assert_called_once_with(self.source_repo.id, set(['foo']))
+        self.assertEqual(self.conduit.get_source_units.call_count, 1)
+        criteria = self.conduit.get_source_units.call_args[1]['criteria']
+        self.assertEqual(set(criteria.unit_filters['image_id']['$in']), set(['bar', 'baz']))
+
+    def test_import_without_missing_ancestors(self):
+        mock_unit = mock.Mock(unit_key={'image_id': 'foo'}, metadata={'parent_id': 'bar'})
+
+        DockerImporter().import_units(self.source_repo, self.dest_repo, self.conduit,
+                                      self.config, units=[mock_unit])
+
+        self.assertFalse(self.conduit.get_source_units.called)
+
+    @mock.patch('pulp_docker.plugins.importers.importer.tags.update_tags')
+    @mock.patch('pulp_docker.plugins.importers.importer.manager_factory.repo_manager')
+    def test_import_copy_tags(self, mock_repo_manager, mock_update_tags):
+        mock_repo_manager.return_value.get_repo_scratchpad.return_value = {u'tags': [
+            {constants.IMAGE_TAG_KEY: 'latest', constants.IMAGE_ID_KEY: 'foo'},
+            {constants.IMAGE_TAG_KEY: '1.0', constants.IMAGE_ID_KEY: 'foo'},
+            {constants.IMAGE_TAG_KEY: 'other', constants.IMAGE_ID_KEY: 'baz'}]}
+        mock_unit = mock.Mock(unit_key={'image_id': 'foo'}, metadata={})
+        config = PluginCallConfiguration({}, {}, {constants.CONFIG_KEY_COPY_TAGS: True})
+
+        DockerImporter().import_units(self.source_repo, self.dest_repo, self.conduit,
+                                      config, units=[mock_unit])
+
+        mock_repo_manager.return_value.get_repo_scratchpad.assert_called_once_with(
+            self.source_repo.id)
+        mock_update_tags.assert_called_once_with(self.dest_repo.id,
+                                                 {'latest': 'foo', '1.0': 'foo'})
+
+    @mock.patch('pulp_docker.plugins.importers.importer.tags.update_tags')
+    @mock.patch('pulp_docker.plugins.importers.importer.manager_factory.repo_manager')
+    def test_import_copy_tags_association_fails(self, mock_repo_manager, mock_update_tags):
+        mock_repo_manager.return_value.get_repo_scratchpad.return_value = {u'tags': [
+            {constants.IMAGE_TAG_KEY: 'latest', constants.IMAGE_ID_KEY: 'foo'}]}
+        mock_unit = mock.Mock(id='unit1', unit_key={'image_id': 'foo'}, metadata={})
+        config = PluginCallConfiguration({}, {}, {constants.CONFIG_KEY_COPY_TAGS: True})
+        self.association_manager.associate_all_by_ids.side_effect = ValueError
+
+        self.assertRaises(ValueError, DockerImporter().import_units, self.source_repo,
+                          self.dest_repo, self.conduit, config, units=[mock_unit])
+
+        # no tag may point at an image that is not in the repository
+        self.assertFalse(mock_update_tags.called)
+
+    @mock.patch('pulp_docker.plugins.importers.importer.tags.update_tags')
+    def test_import_without_copy_tags(self, mock_update_tags):
+        mock_unit = mock.Mock(unit_key={'image_id': 'foo'}, metadata={})
+
+        DockerImporter().import_units(self.source_repo, self.dest_repo, self.conduit,
+                                      self.config, units=[mock_unit])
+
+        self.assertFalse(mock_update_tags.called)
+
+
+class TestImporterRemoved(unittest.TestCase):
+    @mock.patch('pulp_docker.plugins.importers.importer.ancestry_index.delete_index')
+    def test_deletes_index(self, mock_delete_index):
+        repo = Repository('repo1')
+
+        DockerImporter().importer_removed(repo, PluginCallConfiguration({}, {}))
+
+        mock_delete_index.assert_called_once_with('repo1')
 
 
 class TestValidateConfig(unittest.TestCase):
-    def test_always_true(self):
-        for repo, config in [['a', 'b'], [1, 2], [mock.Mock(), {}], ['abc', {'a': 2}]]:
-            # make sure all attempts are validated
-            self.assertEqual(DockerImporter().validate_config(repo, config), (True, ''))
+    @mock.patch('pulp_docker.plugins.importers.importer.configuration.validate_config')
+    def test_validates(self, mock_validate):
+        config = PluginCallConfiguration({}, {})
+
+        result = DockerImporter().validate_config(Repository('repo1'), config)
+
+        mock_validate.assert_called_once_with(config)
+        self.assertEqual(result, mock_validate.return_value)
 
 
 class TestRemoveUnit(unittest.TestCase):
@@ -197,23 +317,68 @@ class TestRemoveUnit(unittest.TestCase):
         self.conduit = mock.MagicMock()
         self.config = PluginCallConfiguration({}, {})
         self.mock_unit = mock.Mock(unit_key={'image_id': 'foo'}, metadata={})
+        patcher = mock.patch('pulp_docker.plugins.importers.importer.ancestry_index.'
+                             'remove_images')
+        self.mock_remove_images = patcher.start()
+        self.addCleanup(patcher.stop)
 
-    @mock.patch('pulp_docker.plugins.importers.importer.manager_factory.repo_manager')
-    def test_remove_with_tag(self, mock_repo_manager):
-        mock_repo_manager.return_value.get_repo_scratchpad.return_value = \
-            {u'tags': [{constants.IMAGE_TAG_KEY: 'apple',
-                        constants.IMAGE_ID_KEY: 'foo'}]}
+    @mock.patch('pulp_docker.plugins.importers.importer.tags.remove_image_tags')
+    def test_remove_tags(self, mock_remove_image_tags):
         DockerImporter().remove_units(self.repo, [self.mock_unit], self.config)
-        mock_repo_manager.return_value.set_repo_scratchpad.assert_called_once_with(
-            self.repo.id, {u'tags': []}
-        )
 
-    @mock.patch('pulp_docker.plugins.importers.importer.manager_factory.repo_manager')
-    def test_remove_without_tag(self, mock_repo_manager):
-        expected_tags = {u'tags': [{constants.IMAGE_TAG_KEY: 'apple',
-                                    constants.IMAGE_ID_KEY: 'bar'}]}
-        mock_repo_manager.return_value.get_repo_scratchpad.return_value = expected_tags
+        mock_remove_image_tags.assert_called_once_with(self.repo.id, set(['foo']))
+        self.mock_remove_images.assert_called_once_with(self.repo.id, set(['foo']))
+
+    @mock.patch('pulp_docker.plugins.importers.importer.tags.remove_image_tags')
+    @mock.patch('pulp_docker.plugins.importers.importer.associations.unassociate_images')
+    @mock.patch('pulp_docker.plugins.importers.importer.ancestry_index.get_index')
+    def test_cascade_descendants(self, mock_get_index, mock_unassociate, mock_remove_tags):
+        mock_get_index.return_value = {
+            'base': {'parent': None, 'size': 1},
+            'child': {'parent': 'foo', 'size': 2},
+            'grandchild': {'parent': 'child', 'size': 4},
+            'other': {'parent': 'base', 'size': 8},
+        }
+        self.mock_unit.metadata = {'parent_id': 'base', 'size': 16}
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_CASCADE_REMOVE:
+                                              constants.CASCADE_DESCENDANTS})
+
+        DockerImporter().remove_units(self.repo, [self.mock_unit], config)
+
+        mock_unassociate.assert_called_once_with(self.repo.id, set(['child', 'grandchild']))
+        mock_remove_tags.assert_called_once_with(self.repo.id,
+                                                 set(['foo', 'child', 'grandchild']))
 
-        DockerImporter().remove_units(self.repo, [self.mock_unit], self.config)
-        mock_repo_manager.return_value.set_repo_scratchpad.assert_called_once_with(
-            self.repo.id, expected_tags)
+    @mock.patch('pulp_docker.plugins.importers.importer.manager_factory.repo_manager')
+    @mock.patch('pulp_docker.plugins.importers.importer.tags.remove_image_tags')
+    @mock.patch('pulp_docker.plugins.importers.importer.associations.unassociate_images')
+    @mock.patch('pulp_docker.plugins.importers.importer.ancestry_index.get_index')
+    def test_cascade_unreachable(self, mock_get_index, mock_unassociate, mock_remove_tags,
+                                 mock_repo_manager):
+        mock_get_index.return_value = {
+            'base': {'parent': None, 'size': 1},
+            'middle': {'parent': 'base', 'size': 2},
+            'tagged': {'parent': 'base', 'size': 4},
+        }
+        mock_repo_manager.return_value.get_repo_scratchpad.return_value = {u'tags': [
+            {constants.IMAGE_TAG_KEY: 'latest', constants.IMAGE_ID_KEY: 'tagged'}]}
+        self.mock_unit.metadata = {'parent_id': 'middle', 'size': 16}
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_CASCADE_REMOVE:
+                                              [constants.CASCADE_UNREACHABLE]})
+
+        DockerImporter().remove_units(self.repo, [self.mock_unit], config)
+
+        # base is still needed by the tagged image
+        mock_unassociate.assert_called_once_with(self.repo.id, set(['middle']))
+
+    @mock.patch('pulp_docker.plugins.importers.importer.tags.remove_image_tags')
+    @mock.patch('pulp_docker.plugins.importers.importer.associations.unassociate_images')
+    @mock.patch('pulp_docker.plugins.importers.importer.ancestry_index.get_index')
+    def test_cascade_nothing_else(self, mock_get_index, mock_unassociate, mock_remove_tags):
+        mock_get_index.return_value = {'base': {'parent': None, 'size': 1}}
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_CASCADE_REMOVE:
+                                              constants.CASCADE_DESCENDANTS})
+
+        DockerImporter().remove_units(self.repo, [self.mock_unit], config)
+
+        self.assertFalse(mock_unassociate.called)
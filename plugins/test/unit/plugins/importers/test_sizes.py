@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp_docker.plugins.importers import sizes
+
+
+@mock.patch('pulp_docker.plugins.importers.sizes.factory.content_query_manager')
+class TestGetRollups(unittest.TestCase):
+    def test_known_parent(self, mock_query_manager):
+        query = mock_query_manager.return_value.get_multiple_units_by_keys_dicts
+        query.return_value = [{'image_id': 'base', 'parent_id': None, 'size': 10,
+                               'depth': 0, 'virtual_size': 10}]
+        images = {'child': {'parent_id': 'parent', 'size': 1},
+                  'parent': {'parent_id': 'base', 'size': 2}}
+
+        rollups = sizes.get_rollups(images)
+
+        self.assertEqual(rollups, {'parent': {'depth': 1, 'virtual_size': 12},
+                                   'child': {'depth': 2, 'virtual_size': 13}})
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual(query.call_args[0][1], [{'image_id': 'base'}])
+
+    def test_parent_without_rollups(self, mock_query_manager):
+        query = mock_query_manager.return_value.get_multiple_units_by_keys_dicts
+        query.side_effect = [
+            [{'image_id': 'parent', 'parent_id': 'base', 'size': 2}],
+            [{'image_id': 'base', 'parent_id': None, 'size': 10, 'depth': 0,
+              'virtual_size': 10}],
+        ]
+
+        rollups = sizes.get_rollups({'child': {'parent_id': 'parent', 'size': 1}})
+
+        self.assertEqual(rollups, {'child': {'depth': 2, 'virtual_size': 13}})
+        self.assertEqual(query.call_count, 2)
+
+    def test_base_images(self, mock_query_manager):
+        rollups = sizes.get_rollups({'base': {'parent_id': None, 'size': 5}})
+
+        self.assertEqual(rollups, {'base': {'depth': 0, 'virtual_size': 5}})
+        self.assertFalse(mock_query_manager.return_value.get_multiple_units_by_keys_dicts.called)
+
+
+class TestGetStoredSize(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_size(self):
+        for name, content in (('json', 'abc'), ('layer', 'abcdefg')):
+            with open(os.path.join(self.working_dir, name), 'w') as f:
+                f.write(content)
+
+        self.assertEqual(sizes.get_stored_size(self.working_dir), 10)
+
+    def test_layer_details(self):
+        with open(os.path.join(self.working_dir, 'layer'), 'w') as f:
+            f.write('abc')
+        with open(os.path.join(self.working_dir, 'json'), 'w') as f:
+            f.write('{}')
+
+        details = sizes.get_layer_details(self.working_dir)
+
+        self.assertEqual(details, {
+            'layer_size': 3,
+            'checksum': 'sha256:ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad',
+        })
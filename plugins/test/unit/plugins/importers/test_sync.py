@@ -52,6 +52,51 @@ class TestSyncStep(unittest.TestCase):
         self.assertEqual(self.step.available_units, [])
         self.assertEqual(self.step.tags, {})
 
+    def test_init_multiple_upstreams(self):
+        config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_UPSTREAM_NAME: [
+                'pulp/crane',
+                {'name': 'pulp/other', 'feed': 'http://example.com/'},
+            ],
+            importer_constants.KEY_FEED: 'http://pulpproject.org/',
+        })
+        step = sync.SyncStep(self.repo, self.conduit, config, '/a/b/c')
+
+        self.assertEqual([(r.name, r.registry_url) for r in step.index_repositories],
+                         [('pulp/crane', 'http://pulpproject.org/'),
+                          ('pulp/other', 'http://example.com/')])
+        self.assertTrue(step.index_repository is step.index_repositories[0])
+
+    def test_init_dry_run(self):
+        config = PluginCallConfiguration({}, self.config.repo_plugin_config,
+                                         {constants.CONFIG_KEY_DRY_RUN: True})
+        step = sync.SyncStep(self.repo, self.conduit, config, '/a/b/c')
+
+        step_ids = [child.step_id for child in step.children]
+        self.assertTrue(step.dry_run)
+        self.assertTrue(constants.SYNC_STEP_PLAN in step_ids)
+        self.assertFalse(constants.SYNC_STEP_SAVE in step_ids)
+
+    def test_init_garbage_collect(self):
+        config = PluginCallConfiguration({}, self.config.repo_plugin_config,
+                                         {constants.CONFIG_KEY_GARBAGE_COLLECT: True})
+        step = sync.SyncStep(self.repo, self.conduit, config, '/a/b/c')
+
+        self.assertEqual(step.children[-1].step_id, constants.SYNC_STEP_GARBAGE_COLLECT)
+        self.assertFalse(constants.SYNC_STEP_GARBAGE_COLLECT in
+                         [child.step_id for child in self.step.children])
+
+    def test_generate_download_requests_metadata_only(self):
+        self.step.step_get_local_units.units_to_download.append({'image_id': 'image1'})
+        self.step.working_dir = tempfile.mkdtemp()
+
+        try:
+            urls = [req.url for req in
+                    self.step.generate_download_requests(metadata_only=True)]
+            self.assertEqual(urls, ['http://pulpproject.org/v1/images/image1/json'])
+        finally:
+            shutil.rmtree(self.step.working_dir)
+
     def test_generate_download_requests(self):
         self.step.step_get_local_units.units_to_download.append({'image_id': 'image1'})
         self.step.working_dir = tempfile.mkdtemp()
@@ -144,6 +189,34 @@ class TestSyncStep(unittest.TestCase):
         finally:
             shutil.rmtree(self.step.working_dir)
 
+    def test_generate_download_reqs_json_exists(self):
+        self.step.step_get_local_units.units_to_download.append({'image_id': 'image1'})
+        self.step.working_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.step.working_dir, 'image1'))
+        # simulate the json file having been retrieved while filtering tags
+        open(os.path.join(self.step.working_dir, 'image1/json'), 'w').close()
+
+        try:
+            reqs = list(self.step.generate_download_requests())
+            self.assertEqual(len(reqs), 2)
+            self.assertFalse(any(req.url.endswith('/json') for req in reqs))
+        finally:
+            shutil.rmtree(self.step.working_dir)
+
+    def test_generate_download_requests_image_source(self):
+        self.step.step_get_local_units.units_to_download.append({'image_id': 'image1'})
+        self.step.working_dir = tempfile.mkdtemp()
+        source = mock.MagicMock()
+        self.step.image_sources['image1'] = source
+
+        try:
+            list(self.step.generate_download_requests())
+        finally:
+            shutil.rmtree(self.step.working_dir)
+
+        self.assertEqual([c[0][1] for c in source.create_download_request.call_args_list],
+                         ['ancestry', 'json', 'layer'])
+
     def test_sync(self):
         with mock.patch.object(self.step, 'process_lifecycle') as mock_process:
             report = self.step.sync()
@@ -153,6 +226,42 @@ class TestSyncStep(unittest.TestCase):
         # make sure it returned a report generated by the conduit
         self.assertTrue(report is self.conduit.build_success_report.return_value)
 
+    @mock.patch('pulp_docker.plugins.metrics.log_metrics', spec_set=True)
+    def test_sync_reports_metrics(self, mock_log_metrics):
+        with mock.patch.object(self.step, 'process_lifecycle'):
+            self.step.sync()
+
+        phases = self.step.progress_details['metrics']
+        self.assertTrue(constants.SYNC_STEP_METADATA in phases)
+        self.assertTrue(constants.SYNC_STEP_DOWNLOAD in phases)
+        self.assertTrue(constants.SYNC_STEP_SAVE in phases)
+        self.assertEqual(phases[constants.SYNC_STEP_SAVE]['units'], 0)
+        mock_log_metrics.assert_called_once_with('sync', 'repo1', phases)
+
+
+class TestGetUpstreams(unittest.TestCase):
+    def test_single_name(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_UPSTREAM_NAME: 'pulp/crane'})
+
+        self.assertEqual(sync.get_upstreams(config), [('pulp/crane', None)])
+
+    def test_comma_separated(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_UPSTREAM_NAME: 'a/b, c/d'})
+
+        self.assertEqual(sync.get_upstreams(config), [('a/b', None), ('c/d', None)])
+
+    def test_dicts(self):
+        config = PluginCallConfiguration({}, {constants.CONFIG_KEY_UPSTREAM_NAME: [
+            {'name': 'a/b', 'feed': 'http://example.com/'}, {'name': 'c/d'}]})
+
+        self.assertEqual(sync.get_upstreams(config),
+                         [('a/b', 'http://example.com/'), ('c/d', None)])
+
+    def test_not_set(self):
+        config = PluginCallConfiguration({}, {})
+
+        self.assertEqual(sync.get_upstreams(config), [(None, None)])
+
 
 class TestGerMetadataStep(unittest.TestCase):
     def setUp(self):
@@ -170,6 +279,8 @@ class TestGerMetadataStep(unittest.TestCase):
         self.step = sync.GetMetadataStep(self.repo, self.conduit, self.config, self.working_dir)
         self.step.parent = mock.MagicMock()
         self.index = self.step.parent.index_repository
+        self.step.parent.index_repositories = [self.index]
+        self.step.parent.image_sources = {}
 
     def tearDown(self):
         super(TestGerMetadataStep, self).tearDown()
@@ -207,6 +318,144 @@ class TestGerMetadataStep(unittest.TestCase):
         self.assertTrue('abc123' in available_ids)
         self.assertTrue('xyz789' in available_ids)
 
+    def test_filters_tags_before_ancestry(self):
+        self.index.get_tags.return_value = {'latest': 'abc123', 'devel': 'xyz789'}
+        self.index.get_image_ids.return_value = ['abc123', 'xyz789']
+        self.step.parent.tags = {}
+        self.step.config = PluginCallConfiguration({}, {constants.CONFIG_KEY_EXCLUDE_TAGS: 'devel'})
+        os.makedirs(os.path.join(self.working_dir, 'abc123'))
+        with open(os.path.join(self.working_dir, 'abc123/ancestry'), 'w') as ancestry:
+            ancestry.write('["abc123"]')
+
+        self.step.process_main()
+
+        self.assertEqual(self.step.parent.tags, {'latest': 'abc123'})
+        self.index.get_ancestry.assert_called_once_with(['abc123'])
+
+    def _make_upstream(self, name, tags):
+        upstream = mock.MagicMock()
+        upstream.name = name
+        upstream.get_tags.return_value = tags
+        upstream.get_image_ids.return_value = tags.values()
+        return upstream
+
+    def _write_ancestry(self, image_id, ancestry):
+        os.makedirs(os.path.join(self.working_dir, image_id))
+        with open(os.path.join(self.working_dir, image_id, 'ancestry'), 'w') as ancestry_file:
+            json.dump(ancestry, ancestry_file)
+
+    def test_multiple_upstreams(self):
+        first = self._make_upstream('team1/app', {'app': 'abc123', 'latest': 'abc123'})
+        second = self._make_upstream('team2/db', {'db': 'xyz789', 'base': 'base1'})
+        self.step.parent.index_repositories = [first, second]
+        self.step.parent.tags = {}
+        self._write_ancestry('abc123', ['abc123', 'base1'])
+        self._write_ancestry('xyz789', ['xyz789', 'base1'])
+        self._write_ancestry('base1', ['base1'])
+
+        self.step.process_main()
+
+        self.assertEqual(self.step.parent.tags, {'app': 'abc123', 'latest': 'abc123',
+                                                 'db': 'xyz789', 'base': 'base1'})
+        available_ids = set(unit_key['image_id'] for unit_key in
+                            self.step.parent.available_units)
+        self.assertEqual(available_ids, set(['abc123', 'xyz789', 'base1']))
+        # each image is retrieved from exactly one upstream
+        first.get_ancestry.assert_called_once_with(['abc123'])
+        self.assertEqual(sorted(second.get_ancestry.call_args[0][0]), ['base1', 'xyz789'])
+        self.assertTrue(self.step.parent.image_sources['abc123'] is first)
+        self.assertTrue(self.step.parent.image_sources['base1'] is second)
+        self.assertTrue(self.step.parent.image_sources['xyz789'] is second)
+
+    def test_multiple_upstreams_shared_image(self):
+        first = self._make_upstream('team1/app', {'latest': 'abc123'})
+        second = self._make_upstream('team2/app', {'stable': 'abc123'})
+        self.step.parent.index_repositories = [first, second]
+        self.step.parent.tags = {}
+        self._write_ancestry('abc123', ['abc123'])
+
+        self.step.process_main()
+
+        self.assertEqual(self.step.parent.tags, {'latest': 'abc123', 'stable': 'abc123'})
+        first.get_ancestry.assert_called_once_with(['abc123'])
+        second.get_ancestry.assert_called_once_with([])
+
+    def test_multiple_upstreams_tag_conflict(self):
+        first = self._make_upstream('team1/app', {'latest': 'abc123'})
+        second = self._make_upstream('team2/app', {'latest': 'xyz789'})
+        self.step.parent.index_repositories = [first, second]
+        self.step.parent.tags = {}
+        self._write_ancestry('abc123', ['abc123'])
+        self._write_ancestry('xyz789', ['xyz789', 'base1'])
+
+        self.step.process_main()
+
+        # the earlier upstream takes precedence
+        self.assertEqual(self.step.parent.tags, {'latest': 'abc123'})
+        # but the image the later upstream tags, and its ancestry, are still synced
+        available_ids = set(unit_key['image_id'] for unit_key in
+                            self.step.parent.available_units)
+        self.assertEqual(available_ids, set(['abc123', 'xyz789', 'base1']))
+        second.get_ancestry.assert_called_once_with(['xyz789'])
+        self.assertTrue(self.step.parent.image_sources['xyz789'] is second)
+        self.assertTrue(self.step.parent.image_sources['base1'] is second)
+
+    def test_multiple_upstreams_tag_conflict_order(self):
+        first = self._make_upstream('team1/app', {'latest': 'abc123'})
+        second = self._make_upstream('team2/app', {'latest': 'xyz789'})
+        self.step.parent.index_repositories = [second, first]
+        self.step.parent.tags = {}
+        self._write_ancestry('abc123', ['abc123'])
+        self._write_ancestry('xyz789', ['xyz789'])
+
+        self.step.process_main()
+
+        # priority follows the order of the upstream repositories, not the tags
+        self.assertEqual(self.step.parent.tags, {'latest': 'xyz789'})
+
+    def test_filter_tags_include(self):
+        self.step.config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_INCLUDE_TAGS: ['latest', '7.*'],
+        })
+
+        tags = self.step.filter_tags({'latest': 'a', '7.0': 'b', 'devel': 'c'}, self.working_dir)
+
+        self.assertEqual(tags, {'latest': 'a', '7.0': 'b'})
+
+    def test_filter_tags_regex(self):
+        self.step.config = PluginCallConfiguration({}, {
+            constants.CONFIG_KEY_INCLUDE_TAGS: [r'7\.\d+'],
+            constants.CONFIG_KEY_TAG_FILTER_REGEX: True,
+        })
+
+        tags = self.step.filter_tags({'latest': 'a', '7.0': 'b', '7.0-rc1': 'c'},
+                                     self.working_dir)
+
+        self.assertEqual(tags, {'7.0': 'b'})
+
+    def test_filter_tags_max_tags(self):
+        self.step.config = PluginCallConfiguration({}, {constants.CONFIG_KEY_MAX_TAGS: 1})
+        for image_id, created in (('abc123', '2014-06-01T00:00:00Z'),
+                                  ('xyz789', '2014-07-01T00:00:00Z')):
+            os.makedirs(os.path.join(self.working_dir, image_id))
+            with open(os.path.join(self.working_dir, image_id, 'json'), 'w') as json_file:
+                json.dump({'created': created}, json_file)
+
+        tags = self.step.filter_tags({'old': 'abc123', 'new': 'xyz789'}, self.working_dir)
+
+        self.assertEqual(tags, {'new': 'xyz789'})
+        self.assertEqual(set(self.index.get_image_json.call_args[0][0]),
+                         set(['abc123', 'xyz789']))
+
+    def test_filter_tags_max_tags_not_reached(self):
+        self.step.config = PluginCallConfiguration({}, {constants.CONFIG_KEY_MAX_TAGS: 5})
+
+        tags = self.step.filter_tags({'latest': 'abc123'}, self.working_dir)
+
+        self.assertEqual(tags, {'latest': 'abc123'})
+        # no metadata is needed when there are few enough tags
+        self.assertFalse(self.index.get_image_json.called)
+
     def test_expand_tags_no_abbreviations(self):
         ids = ['abc123', 'xyz789']
         tags = {'foo': 'abc123', 'bar': 'abc123', 'baz': 'xyz789'}
@@ -251,15 +500,222 @@ class TestGetLocalImagesStep(unittest.TestCase):
         shutil.rmtree(self.working_dir)
 
     def test_dict_to_unit(self):
-        unit = self.step._dict_to_unit({'image_id': 'abc123', 'parent_id': None, 'size': 12})
+        unit = self.step._dict_to_unit({'image_id': 'abc123', 'parent_id': None, 'size': 12,
+                                        'virtual_size': 12, 'depth': 0})
 
+        expected_metadata = {'parent_id': None, 'size': 12, 'virtual_size': 12, 'depth': 0,
+                             'stored_size': None, 'layer_size': None, 'checksum': None}
         self.assertTrue(unit is self.step.conduit.init_unit.return_value)
         self.step.conduit.init_unit.assert_called_once_with(constants.IMAGE_TYPE_ID,
                                                             {'image_id': 'abc123'},
-                                                            {'parent_id': None, 'size': 12},
+                                                            expected_metadata,
                                                             os.path.join(constants.IMAGE_TYPE_ID,
                                                                          'abc123'))
 
+    def test_dict_to_unit_resave_keeps_stored_values(self):
+        # an existing unit, as the database returns it, is saved again when it
+        # is associated with the repository, and must keep every stored value
+        unit_dict = {'_id': 'unit1', '_content_type_id': constants.IMAGE_TYPE_ID,
+                     'image_id': 'abc123', 'parent_id': 'xyz789', 'size': 12,
+                     'virtual_size': 22, 'depth': 1, 'stored_size': 15, 'layer_size': 14,
+                     'checksum': 'sha256:abc'}
+
+        self.step._dict_to_unit(unit_dict)
+
+        metadata = self.step.conduit.init_unit.call_args[0][2]
+        self.assertEqual(metadata, {'parent_id': 'xyz789', 'size': 12, 'virtual_size': 22,
+                                    'depth': 1, 'stored_size': 15, 'layer_size': 14,
+                                    'checksum': 'sha256:abc'})
+
+    def test_dict_to_unit_records_existing_image(self):
+        self.step._dict_to_unit({'image_id': 'abc123', 'parent_id': 'xyz789', 'size': 12})
+
+        self.assertEqual(self.step.existing_images,
+                         {'abc123': {'parent_id': 'xyz789', 'size': 12}})
+
+
+class TestGetLocalImagesStepDryRun(unittest.TestCase):
+    def setUp(self):
+        super(TestGetLocalImagesStepDryRun, self).setUp()
+        self.step = sync.GetLocalImagesStep(constants.IMPORTER_TYPE_ID,
+                                            constants.IMAGE_TYPE_ID,
+                                            ['image_id'], '/a/b/c')
+        self.step.conduit = mock.MagicMock()
+        self.step.content_query_manager = mock.MagicMock()
+        self.step.parent = mock.MagicMock(dry_run=True)
+        self.step.parent.available_units = [{'image_id': 'abc123'}, {'image_id': 'xyz789'}]
+
+    def test_does_not_save_existing_units(self):
+        self.step.content_query_manager.get_multiple_units_by_keys_dicts.return_value = [
+            {'image_id': 'abc123', 'parent_id': None, 'size': 12}]
+
+        self.step.process_main()
+
+        self.assertEqual(self.step.units_to_download, [{'image_id': 'xyz789'}])
+        self.assertFalse(self.step.conduit.save_unit.called)
+
+
+class TestPlanSyncStep(unittest.TestCase):
+    def setUp(self):
+        super(TestPlanSyncStep, self).setUp()
+        self.working_dir = tempfile.mkdtemp()
+        self.step = sync.PlanSyncStep(self.working_dir)
+        self.step.config = PluginCallConfiguration({}, {})
+        self.step.parent = mock.MagicMock()
+        self.step.parent.step_get_local_units.units_to_download = [{'image_id': 'abc123'},
+                                                                   {'image_id': 'xyz789'}]
+        self.step.parent.tags = {'latest': 'abc123', 'old': 'def456'}
+        self.step.parent.step_download.get_throughput.return_value = 100.0
+        for image_id, size, ancestry in (('abc123', 1000, ['abc123', 'xyz789']),
+                                         ('xyz789', None, ['xyz789']),
+                                         ('def456', 5, ['def456'])):
+            os.makedirs(os.path.join(self.working_dir, image_id))
+            with open(os.path.join(self.working_dir, image_id, 'json'), 'w') as json_file:
+                json.dump({'Size': size}, json_file)
+            with open(os.path.join(self.working_dir, image_id, 'ancestry'), 'w') as anc_file:
+                json.dump(ancestry, anc_file)
+
+    def tearDown(self):
+        super(TestPlanSyncStep, self).tearDown()
+        shutil.rmtree(self.working_dir)
+
+    def test_process_main(self):
+        self.step.process_main()
+
+        self.assertEqual(self.step.progress_details, {
+            'images_to_download': 2,
+            'total_size': 1000,
+            'affected_tags': ['latest'],
+            'estimated_seconds': 10,
+        })
+
+    def test_estimate_uses_max_speed(self):
+        self.step.config = PluginCallConfiguration({}, {importer_constants.KEY_MAX_SPEED: 500})
+
+        self.assertEqual(self.step.estimate_seconds(1000), 2)
+
+    def test_estimate_without_rate(self):
+        self.step.parent.step_download.get_throughput.return_value = 0.0
+
+        self.assertTrue(self.step.estimate_seconds(1000) is None)
+
+
+class TestDockerDownloadStep(unittest.TestCase):
+    def setUp(self):
+        super(TestDockerDownloadStep, self).setUp()
+        self.requests = [DownloadRequest('http://pulpproject.org/%d' % i, '/a/b/%d' % i)
+                         for i in range(10)]
+        plugin_config = {constants.CONFIG_KEY_ADAPTIVE_DOWNLOADS: True,
+                         importer_constants.KEY_MAX_DOWNLOADS: 1}
+        self.config = PluginCallConfiguration({}, plugin_config)
+        self.step = sync.DockerDownloadStep(constants.SYNC_STEP_DOWNLOAD,
+                                            downloads=iter(self.requests),
+                                            repo=RepositoryModel('repo1'), config=self.config,
+                                            working_dir='/a/b')
+
+    @mock.patch('pulp_docker.plugins.importers.sync.HTTPThreadedDownloader')
+    def test_adaptive_downloads_in_windows(self, mock_downloader):
+        self.step._process_block()
+
+        # every request is downloaded exactly once
+        downloaded = []
+        for call in mock_downloader.return_value.download.call_args_list:
+            downloaded.extend(call[0][0])
+        self.assertEqual(downloaded, self.requests)
+        # the first window uses the configured concurrency
+        self.assertEqual(len(mock_downloader.return_value.download.call_args_list[0][0][0]),
+                         sync.DockerDownloadStep.WINDOW_FACTOR)
+        self.assertEqual(self.step.progress_details['initial_concurrency'], 1)
+
+    @mock.patch('pulp_docker.plugins.importers.sync.HTTPThreadedDownloader')
+    @mock.patch('pulp_docker.plugins.importers.sync.LocalFileDownloader')
+    def test_adaptive_downloads_local_feed(self, mock_local_downloader, mock_downloader):
+        self.requests = [DownloadRequest('file:///a/feed/%d' % i, '/a/b/%d' % i)
+                         for i in range(10)]
+        self.step.downloads = iter(self.requests)
+
+        self.step._process_block()
+
+        # local files are read rather than downloaded over HTTP
+        self.assertTrue(mock_local_downloader.return_value.download.called)
+        self.assertFalse(mock_downloader.called)
+
+    @mock.patch('pulp_docker.plugins.importers.sync.DownloadStep._process_block')
+    def test_fixed_downloads(self, mock_process_block):
+        self.step.config = PluginCallConfiguration({}, {})
+
+        self.step._process_block()
+
+        mock_process_block.assert_called_once_with()
+        self.assertTrue(self.step.controller is None)
+
+    def test_records_reports(self):
+        self.step.controller = mock.MagicMock()
+        self.step.report_progress = mock.MagicMock()
+        report = mock.Mock(url='http://pulpproject.org/v1/images/abc123/layer',
+                           bytes_downloaded=10, start_time=None, finish_time=None)
+
+        self.step.download_succeeded(report)
+        self.step.download_failed(report)
+
+        self.step.controller.record.assert_has_calls([mock.call(report),
+                                                      mock.call(report, succeeded=False)])
+        self.assertEqual(self.step.metrics.requests, 2)
+        self.assertEqual(self.step.metrics.failures, 1)
+        self.assertEqual(self.step.metrics.bytes, 20)
+
+
+@mock.patch('pulp_docker.plugins.importers.ancestry_index.remove_images')
+@mock.patch('pulp_docker.plugins.importers.associations.unassociate_images')
+@mock.patch('pulp_docker.plugins.importers.ancestry_index.get_index')
+class TestGarbageCollectStep(unittest.TestCase):
+    def setUp(self):
+        super(TestGarbageCollectStep, self).setUp()
+        self.step = sync.GarbageCollectStep('/a/b/c')
+        self.step.repo = RepositoryModel('repo1')
+        self.step.conduit = mock.MagicMock()
+        self.step.conduit.get_repo_scratchpad.return_value = {u'tags': [
+            {constants.IMAGE_TAG_KEY: 'stable', constants.IMAGE_ID_KEY: 'stable1'}]}
+        self.step.parent = mock.MagicMock()
+        self.step.parent.dry_run = False
+        self.step.parent.tags = {'latest': 'new1'}
+        self.step.parent.available_units = [{'image_id': 'new1'}, {'image_id': 'base'}]
+        self.index = {
+            'base': {'parent': None, 'size': 1},
+            'stable1': {'parent': 'base', 'size': 2},
+            'old1': {'parent': 'old-base', 'size': 4},
+            'old-base': {'parent': None, 'size': 0},
+        }
+
+    def test_removes_unreachable(self, mock_get_index, mock_unassociate, mock_remove_images):
+        mock_get_index.return_value = self.index
+
+        self.step.process_main()
+
+        mock_unassociate.assert_called_once_with('repo1', set(['old1', 'old-base']))
+        mock_remove_images.assert_called_once_with('repo1', set(['old1', 'old-base']))
+        self.assertEqual(self.step.progress_details,
+                         {'images_removed': 2, 'bytes_freed': 4, 'dry_run': False})
+
+    def test_dry_run(self, mock_get_index, mock_unassociate, mock_remove_images):
+        mock_get_index.return_value = self.index
+        self.step.parent.dry_run = True
+
+        self.step.process_main()
+
+        self.assertFalse(mock_unassociate.called)
+        self.assertFalse(mock_remove_images.called)
+        self.assertEqual(self.step.progress_details['images_removed'], 2)
+        # the index is not saved if it has to be built
+        mock_get_index.assert_called_once_with('repo1', save=False)
+
+    def test_nothing_to_remove(self, mock_get_index, mock_unassociate, mock_remove_images):
+        mock_get_index.return_value = {'base': {'parent': None, 'size': 1}}
+
+        self.step.process_main()
+
+        self.assertFalse(mock_unassociate.called)
+
 
 class TestSaveUnits(unittest.TestCase):
     def setUp(self):
@@ -271,9 +727,20 @@ class TestSaveUnits(unittest.TestCase):
         self.step.conduit = mock.MagicMock()
         self.step.parent = mock.MagicMock()
         self.step.parent.step_get_local_units.units_to_download = [{'image_id': 'abc123'}]
+        self.step.parent.step_get_local_units.existing_images = {
+            'xyz789': {'parent_id': None, 'size': 10}}
 
         self.unit = Unit(constants.IMAGE_TYPE_ID, {'image_id': 'abc123'},
                          {'parent': None, 'size': 2}, os.path.join(self.dest_dir, 'abc123'))
+        patcher = mock.patch('pulp_docker.plugins.importers.ancestry_index.add_images')
+        self.mock_add_images = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('pulp_docker.plugins.importers.sizes.factory.content_query_manager')
+        self.mock_query_manager = patcher.start().return_value
+        self.mock_query_manager.get_multiple_units_by_keys_dicts.return_value = [
+            {'image_id': 'xyz789', 'parent_id': None, 'size': 10, 'depth': 0,
+             'virtual_size': 10}]
+        self.addCleanup(patcher.stop)
 
     def tearDown(self):
         super(TestSaveUnits, self).tearDown()
@@ -314,6 +781,41 @@ class TestSaveUnits(unittest.TestCase):
         expected_unit = self.step.conduit.init_unit.return_value
         self.step.conduit.save_unit.assert_called_once_with(expected_unit)
 
+    @mock.patch('pulp_docker.plugins.importers.tags.update_tags', spec_set=True)
+    def test_process_main_stores_rollups(self, mock_update_tags):
+        self._write_files_legit_metadata()
+
+        with mock.patch.object(self.step, 'move_files'):
+            self.step.process_main()
+
+        metadata = self.step.conduit.init_unit.call_args[0][2]
+        self.assertEqual(metadata['parent_id'], 'xyz789')
+        self.assertEqual(metadata['depth'], 1)
+        self.assertEqual(metadata['virtual_size'], 12)
+        # only the json file has any content
+        self.assertEqual(metadata['stored_size'],
+                         os.path.getsize(os.path.join(self.working_dir, 'abc123/json')))
+        # the layer file is empty
+        self.assertEqual(metadata['layer_size'], 0)
+        self.assertEqual(metadata['checksum'], 'sha256:e3b0c44298fc1c149afbf4c8996fb92427ae41e4649'
+                                               'b934ca495991b7852b855')
+
+    @mock.patch('pulp_docker.plugins.importers.tags.update_tags', spec_set=True)
+    def test_process_main_updates_ancestry_index(self, mock_update_tags):
+        self._write_files_legit_metadata()
+
+        with mock.patch.object(self.step, 'move_files'):
+            self.step.process_main()
+
+        # both the new image and the existing one that was associated, which
+        # the index skips if it already has it
+        self.mock_add_images.assert_called_once_with('repo1', mock.ANY)
+        images = self.mock_add_images.call_args[0][1]
+        self.assertEqual(set(images), set(['abc123', 'xyz789']))
+        self.assertEqual(images['abc123']['parent_id'], 'xyz789')
+        self.assertEqual(images['abc123']['size'], 2)
+        self.assertEqual(images['xyz789'], {'parent_id': None, 'size': 10})
+
     @mock.patch('pulp_docker.plugins.importers.tags.update_tags', spec_set=True)
     def test_process_main_updates_tags(self, mock_update_tags):
         self._write_files_legit_metadata()
@@ -0,0 +1,90 @@
+import unittest
+
+import mock
+from pulp.server.exceptions import PulpExecutionException
+
+from pulp_docker.common import constants
+from pulp_docker.plugins.importers import tags
+
+
+def make_tag(tag, image_id):
+    return {constants.IMAGE_TAG_KEY: tag, constants.IMAGE_ID_KEY: image_id}
+
+
+@mock.patch('pulp_docker.plugins.importers.tags.Repo.get_collection')
+@mock.patch('pulp_docker.plugins.importers.tags.factory.repo_manager')
+class TestUpdateTags(unittest.TestCase):
+    def test_writes_only_changed_tags(self, mock_repo_manager, mock_get_collection):
+        mock_repo_manager.return_value.get_repo_scratchpad.return_value = {u'tags': [
+            make_tag('latest', 'abc123'), make_tag('stable', 'abc123')]}
+        collection = mock_get_collection.return_value
+        collection.update.return_value = {'n': 1}
+
+        tags.update_tags('repo1', {'latest': 'abc123', 'stable': 'xyz789', 'new': 'xyz789',
+                                   'newer': 'abc123'})
+
+        # a single update, which only applies if the tags did not change meanwhile
+        collection.update.assert_called_once_with(
+            {'id': 'repo1', 'scratchpad.tags': {'$size': 2},
+             'scratchpad.tags.1.tag': 'stable',
+             'scratchpad.tags.tag': {'$nin': ['new', 'newer']}},
+            {'$set': {'scratchpad.tags.1.image_id': 'xyz789',
+                      'scratchpad.tags.2': make_tag('new', 'xyz789'),
+                      'scratchpad.tags.3': make_tag('newer', 'abc123')}}, safe=True)
+
+    def test_no_tags_yet(self, mock_repo_manager, mock_get_collection):
+        mock_repo_manager.return_value.get_repo_scratchpad.return_value = {}
+        collection = mock_get_collection.return_value
+        collection.update.return_value = {'n': 1}
+
+        tags.update_tags('repo1', {'latest': 'abc123'})
+
+        collection.update.assert_called_once_with(
+            {'id': 'repo1', '$or': [{'scratchpad.tags': {'$exists': False}},
+                                    {'scratchpad.tags': {'$size': 0}}]},
+            {'$set': {'scratchpad.tags': [make_tag('latest', 'abc123')]}}, safe=True)
+
+    def test_no_changes(self, mock_repo_manager, mock_get_collection):
+        mock_repo_manager.return_value.get_repo_scratchpad.return_value = {u'tags': [
+            make_tag('latest', 'abc123')]}
+
+        tags.update_tags('repo1', {'latest': 'abc123'})
+
+        self.assertFalse(mock_get_collection.return_value.update.called)
+
+    def test_retries_after_change(self, mock_repo_manager, mock_get_collection):
+        mock_repo_manager.return_value.get_repo_scratchpad.side_effect = [
+            {u'tags': []}, {u'tags': [make_tag('other', 'abc123')]}]
+        collection = mock_get_collection.return_value
+        collection.update.side_effect = [{'n': 0}, {'n': 1}]
+
+        tags.update_tags('repo1', {'latest': 'abc123'})
+
+        # the second attempt is based on the tags as they were changed
+        self.assertEqual(collection.update.call_count, 2)
+        self.assertEqual(collection.update.call_args[0][1],
+                         {'$set': {'scratchpad.tags.1': make_tag('latest', 'abc123')}})
+
+    def test_keeps_changing(self, mock_repo_manager, mock_get_collection):
+        mock_repo_manager.return_value.get_repo_scratchpad.return_value = {u'tags': []}
+        mock_get_collection.return_value.update.return_value = {'n': 0}
+
+        self.assertRaises(PulpExecutionException, tags.update_tags, 'repo1',
+                          {'latest': 'abc123'})
+        self.assertEqual(mock_get_collection.return_value.update.call_count,
+                         tags.UPDATE_ATTEMPTS)
+
+
+@mock.patch('pulp_docker.plugins.importers.tags.Repo.get_collection')
+class TestRemoveTags(unittest.TestCase):
+    def test_remove_image_tags(self, mock_get_collection):
+        tags.remove_image_tags('repo1', set(['abc123']))
+
+        mock_get_collection.return_value.update.assert_called_once_with(
+            {'id': 'repo1'}, {'$pull': {'scratchpad.tags': {'image_id': {'$in': ['abc123']}}}},
+            safe=True)
+
+    def test_nothing_to_remove(self, mock_get_collection):
+        tags.remove_image_tags('repo1', [])
+
+        self.assertFalse(mock_get_collection.called)
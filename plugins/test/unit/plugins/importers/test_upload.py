@@ -80,16 +80,30 @@ class TestGetModels(unittest.TestCase):
 class TestSaveModels(unittest.TestCase):
     def setUp(self):
         self.conduit = mock.MagicMock()
-
+        patcher = mock.patch('pulp_docker.plugins.importers.sizes.get_rollups')
+        self.mock_get_rollups = patcher.start()
+        self.mock_get_rollups.side_effect = lambda images: dict(
+            (image_id, {'depth': 1, 'virtual_size': 2048}) for image_id in images)
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('pulp_docker.plugins.importers.sizes.get_layer_details',
+                return_value={'layer_size': 8, 'checksum': 'sha256:abc'})
+    @mock.patch('pulp_docker.plugins.importers.sizes.get_stored_size', return_value=10)
     @mock.patch('os.path.exists', return_value=True, spec_set=True)
-    def test_path_exists(self, mock_exists):
+    def test_path_exists(self, mock_exists, mock_get_stored_size, mock_get_layer_details):
         model = DockerImage('abc123', 'xyz789', 1024)
 
         upload.save_models(self.conduit, [model], (model.image_id,), data.busybox_tar_path)
 
         self.assertEqual(self.conduit.save_unit.call_count, 1)
+        self.mock_get_rollups.assert_called_once_with(
+            {'abc123': {'parent_id': 'xyz789', 'size': 1024}})
+        expected_metadata = dict(model.unit_metadata, depth=1, virtual_size=2048)
         self.conduit.init_unit.assert_called_once_with(constants.IMAGE_TYPE_ID, model.unit_key,
-                                                       model.unit_metadata, model.relative_path)
+                                                       expected_metadata, model.relative_path)
+        unit_metadata = self.conduit.init_unit.return_value.metadata
+        self.assertEqual(unit_metadata.__setitem__.call_args, mock.call('stored_size', 10))
+        unit_metadata.update.assert_called_once_with({'layer_size': 8, 'checksum': 'sha256:abc'})
 
         self.conduit.save_unit.assert_called_once_with(self.conduit.init_unit.return_value)
 
@@ -117,49 +131,52 @@ class TestSaveModels(unittest.TestCase):
             # make sure these files were moved into place
             self.assertTrue(os.path.exists(os.path.join(model_dest, 'json')))
             self.assertTrue(os.path.exists(os.path.join(model_dest, 'layer')))
+            # the size on disk of the files that were written
+            self.assertEqual(unit.metadata['stored_size'],
+                             sum(os.path.getsize(os.path.join(model_dest, name))
+                                 for name in ('ancestry', 'json', 'layer')))
+            self.assertEqual(unit.metadata['layer_size'],
+                             os.path.getsize(os.path.join(model_dest, 'layer')))
+            self.assertTrue(unit.metadata['checksum'].startswith('sha256:'))
         finally:
             shutil.rmtree(dest)
 
 
 @mock.patch.object(RepoManager, 'get_repo_scratchpad', spec_set=True)
-@mock.patch.object(RepoManager, 'update_repo_scratchpad', spec_set=True)
+@mock.patch('pulp_docker.plugins.importers.tags.Repo.get_collection')
 class TestUpdateTags(unittest.TestCase):
-    def test_basic_update(self, mock_update, mock_get):
+    def setUp(self):
+        self.latest = {constants.IMAGE_TAG_KEY: 'latest',
+                       constants.IMAGE_ID_KEY: data.busybox_ids[0]}
+
+    def test_basic_update(self, mock_get_collection, mock_get):
         mock_get.return_value = {'foo': 'other data that should not be part of the update'}
+        mock_get_collection.return_value.update.return_value = {'n': 1}
 
         upload.update_tags('repo1', data.busybox_tar_path)
 
-        mock_update.assert_called_once_with('repo1',
-                                            {'tags':
-                                                [{constants.IMAGE_TAG_KEY: 'latest',
-                                                  constants.IMAGE_ID_KEY: data.busybox_ids[0]}]})
+        self.assertEqual(mock_get_collection.return_value.update.call_args[0][1],
+                         {'$set': {'scratchpad.tags': [self.latest]}})
 
-    def test_preserves_existing_tags(self, mock_update, mock_get):
+    def test_preserves_existing_tags(self, mock_get_collection, mock_get):
         mock_get.return_value = {'tags': [{constants.IMAGE_TAG_KEY: 'greatest',
                                            constants.IMAGE_ID_KEY: data.busybox_ids[1]}]}
+        mock_get_collection.return_value.update.return_value = {'n': 1}
 
         upload.update_tags('repo1', data.busybox_tar_path)
 
-        expected_tags = {
-            'tags': [{constants.IMAGE_TAG_KEY: 'greatest',
-                      constants.IMAGE_ID_KEY: data.busybox_ids[1]},
-                     {constants.IMAGE_TAG_KEY: 'latest',
-                      constants.IMAGE_ID_KEY: data.busybox_ids[0]}]
-        }
-        mock_update.assert_called_once_with('repo1', expected_tags)
+        # only the new tag is written
+        self.assertEqual(mock_get_collection.return_value.update.call_args[0][1],
+                         {'$set': {'scratchpad.tags.1': self.latest}})
 
-    def test_overwrite_existing_duplicate_tags(self, mock_update, mock_get):
+    def test_overwrite_existing_duplicate_tags(self, mock_get_collection, mock_get):
         mock_get.return_value = {'tags': [{constants.IMAGE_TAG_KEY: 'latest',
                                            constants.IMAGE_ID_KEY: 'original_latest'},
                                           {constants.IMAGE_TAG_KEY: 'existing',
                                            constants.IMAGE_ID_KEY: 'existing'}]}
+        mock_get_collection.return_value.update.return_value = {'n': 1}
 
         upload.update_tags('repo1', data.busybox_tar_path)
 
-        expected_tags = {
-            'tags': [{constants.IMAGE_TAG_KEY: 'existing',
-                      constants.IMAGE_ID_KEY: 'existing'},
-                     {constants.IMAGE_TAG_KEY: 'latest',
-                      constants.IMAGE_ID_KEY: data.busybox_ids[0]}]
-        }
-        mock_update.assert_called_once_with('repo1', expected_tags)
+        self.assertEqual(mock_get_collection.return_value.update.call_args[0][1],
+                         {'$set': {'scratchpad.tags.0.image_id': data.busybox_ids[0]}})
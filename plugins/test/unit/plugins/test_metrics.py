@@ -0,0 +1,135 @@
+import datetime
+import json
+import unittest
+
+import mock
+
+from pulp_docker.plugins import metrics
+
+
+def make_report(url='http://pulpproject.org/v1/images/abc123/layer', bytes_downloaded=100,
+                seconds=2):
+    start = datetime.datetime(2014, 1, 1)
+    return mock.Mock(url=url, bytes_downloaded=bytes_downloaded, start_time=start,
+                     finish_time=start + datetime.timedelta(seconds=seconds))
+
+
+class TestMetrics(unittest.TestCase):
+    def test_record_download(self):
+        m = metrics.Metrics()
+
+        m.record_download(make_report())
+        m.record_download(make_report(url='http://cdn.example.com/layer', bytes_downloaded=50))
+        m.record_download(make_report(bytes_downloaded=None), succeeded=False)
+
+        self.assertEqual(m.requests, 3)
+        self.assertEqual(m.failures, 1)
+        self.assertEqual(m.bytes, 150)
+        self.assertEqual(m.endpoints['pulpproject.org'],
+                         {'requests': 2, 'failures': 1, 'bytes': 100, 'seconds': 4.0})
+        self.assertEqual(m.endpoints['cdn.example.com']['bytes'], 50)
+
+    def test_merge(self):
+        m1 = metrics.Metrics()
+        m1.record_download(make_report())
+        m1.wall_time = 5.0
+        m2 = metrics.Metrics()
+        m2.record_download(make_report())
+        m2.units = 3
+
+        m1.merge(m2)
+
+        self.assertEqual(m1.requests, 2)
+        self.assertEqual(m1.bytes, 200)
+        self.assertEqual(m1.units, 3)
+        self.assertEqual(m1.wall_time, 5.0)
+        self.assertEqual(m1.endpoints['pulpproject.org']['seconds'], 4.0)
+
+    def test_to_dict(self):
+        m = metrics.Metrics()
+        m.record_download(make_report())
+        m.wall_time = 4.0
+
+        result = m.to_dict()
+
+        self.assertEqual(result['bytes_per_second'], 25)
+        self.assertEqual(result['endpoints']['pulpproject.org']['bytes_per_second'], 50)
+        # make sure it can be serialized
+        json.dumps(result)
+
+    def test_to_dict_no_time(self):
+        self.assertEqual(metrics.Metrics().to_dict()['bytes_per_second'], 0)
+
+
+class TestTimedStepMixin(unittest.TestCase):
+    class BaseStep(object):
+        def __init__(self, step_type):
+            self.step_type = step_type
+
+        def initialize(self):
+            pass
+
+        def finalize(self):
+            pass
+
+    class TimedStep(metrics.TimedStepMixin, BaseStep):
+        pass
+
+    @mock.patch('time.time')
+    def test_measures_wall_time(self, mock_time):
+        mock_time.side_effect = [10.0, 13.5]
+        step = self.TimedStep('foo')
+
+        step.initialize()
+        step.finalize()
+
+        self.assertEqual(step.step_type, 'foo')
+        self.assertEqual(step.metrics.wall_time, 3.5)
+
+    def test_finalize_without_initialize(self):
+        step = self.TimedStep('foo')
+
+        step.finalize()
+
+        self.assertEqual(step.metrics.wall_time, 0.0)
+
+
+class TestReportMetrics(unittest.TestCase):
+    @mock.patch.object(metrics, 'log_metrics')
+    def test_collects_phases(self, mock_log_metrics):
+        timed = mock.Mock(step_id='download', metrics=metrics.Metrics())
+        timed.metrics.bytes = 1024
+        untimed = mock.Mock(step_id='other', spec=['step_id'])
+        step = mock.Mock(children=[timed, untimed])
+        step.get_repo.return_value.id = 'repo1'
+
+        metrics.report_metrics(step, 'export')
+
+        phases = step.progress_details['metrics']
+        self.assertEqual(phases.keys(), ['download'])
+        self.assertEqual(phases['download']['bytes'], 1024)
+        mock_log_metrics.assert_called_once_with('export', 'repo1', phases)
+
+
+class TestLogMetrics(unittest.TestCase):
+    @mock.patch.object(metrics, '_metrics_logger')
+    def test_logs_json(self, mock_logger):
+        metrics.log_metrics('sync', 'repo1', {'phase': {'bytes': 1}})
+
+        document = json.loads(mock_logger.info.call_args[0][0])
+        self.assertEqual(document, {'operation': 'sync', 'repo_id': 'repo1',
+                                    'phases': {'phase': {'bytes': 1}}})
+
+
+class TestGetDuration(unittest.TestCase):
+    def test_datetimes(self):
+        start = datetime.datetime(2014, 1, 1)
+        finish = start + datetime.timedelta(seconds=2, microseconds=500000)
+
+        self.assertEqual(metrics.get_duration(start, finish), 2.5)
+
+    def test_numbers(self):
+        self.assertEqual(metrics.get_duration(1.0, 3.0), 2.0)
+
+    def test_missing(self):
+        self.assertEqual(metrics.get_duration(None, 3.0), 0.0)
@@ -191,7 +191,9 @@ class TestGetAncestry(unittest.TestCase):
         self.assertEqual(len(mock_download.call_args[0][0]), 1)
         req = mock_download.call_args[0][0][0]
         self.assertEqual(req.url, 'http://pulpproject.org/v1/images/abc123/ancestry')
-        self.assertEqual(req.destination, os.path.join(self.working_dir, 'abc123/ancestry'))
+        # downloaded to a temporary file, which is renamed into place
+        self.assertEqual(req.data, os.path.join(self.working_dir, 'abc123/ancestry'))
+        self.assertTrue(req.destination.startswith(req.data + '.'))
 
     def test_adds_auth_header(self):
         self.repo.token = 'letmein'
@@ -220,6 +222,53 @@ class TestGetAncestry(unittest.TestCase):
             self.assertRaises(IOError, self.repo.get_ancestry, ['abc123'])
 
 
+class TestGetImageJson(unittest.TestCase):
+    def setUp(self):
+        super(TestGetImageJson, self).setUp()
+        self.working_dir = tempfile.mkdtemp()
+        self.config = DownloaderConfig()
+        self.repo = registry.Repository('pulp/crane', self.config,
+                                        'http://pulpproject.org/', self.working_dir)
+
+    def tearDown(self):
+        super(TestGetImageJson, self).tearDown()
+        shutil.rmtree(self.working_dir)
+
+    def test_makes_request(self):
+        with mock.patch.object(self.repo.downloader, 'download') as mock_download:
+            self.repo.get_image_json(['abc123'])
+
+        self.assertEqual(mock_download.call_count, 1)
+        self.assertEqual(len(mock_download.call_args[0][0]), 1)
+        req = mock_download.call_args[0][0][0]
+        self.assertEqual(req.url, 'http://pulpproject.org/v1/images/abc123/json')
+        # downloaded to a temporary file, which is renamed into place
+        self.assertEqual(req.data, os.path.join(self.working_dir, 'abc123/json'))
+        self.assertTrue(req.destination.startswith(req.data + '.'))
+
+    def test_failed_request(self):
+        self.repo.listener.failed_reports.append(
+            DownloadReport('http://redhat.com/v1/images/abc123/json', '/a/b/c'))
+        with mock.patch.object(self.repo.downloader, 'download'):
+            self.assertRaises(IOError, self.repo.get_image_json, ['abc123'])
+
+    def test_renames_into_place(self):
+        def download(requests):
+            for request in requests:
+                with open(request.destination, 'w') as json_file:
+                    json_file.write('{}')
+                self.repo.listener.succeeded_reports.append(
+                    DownloadReport(request.url, request.destination, request.data))
+
+        with mock.patch.object(self.repo.downloader, 'download', side_effect=download):
+            self.repo.get_image_json(['abc123'])
+
+        # no temporary file is left
+        self.assertEqual(os.listdir(os.path.join(self.working_dir, 'abc123')), ['json'])
+        with open(os.path.join(self.working_dir, 'abc123', 'json')) as json_file:
+            self.assertEqual(json_file.read(), '{}')
+
+
 class TestAddAuthHeader(unittest.TestCase):
     def setUp(self):
         super(TestAddAuthHeader, self).setUp()
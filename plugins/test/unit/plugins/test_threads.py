@@ -0,0 +1,58 @@
+import threading
+import unittest
+
+from pulp_docker.plugins import threads
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_calls_each_item(self):
+        results = []
+        lock = threading.Lock()
+
+        def record(a, b):
+            with lock:
+                results.append(a + b)
+
+        pool = threads.WorkerPool(record, workers=3)
+        pool.start()
+        for i in range(100):
+            pool.add(i, 1)
+        pool.join()
+        pool.check()
+
+        self.assertEqual(sorted(results), range(1, 101))
+
+    def test_minimum_workers(self):
+        pool = threads.WorkerPool(self.fail, workers=0)
+
+        self.assertEqual(pool.workers, 1)
+
+    def test_error_raised(self):
+        def fail(item):
+            raise ValueError(item)
+
+        pool = threads.WorkerPool(fail, workers=2)
+        pool.start()
+        pool.add(1)
+        pool.join()
+
+        self.assertRaises(ValueError, pool.check)
+        self.assertRaises(ValueError, pool.add, 2)
+
+
+class TestRun(unittest.TestCase):
+    def test_results_in_order(self):
+        self.assertEqual(threads.run(lambda x: x * 2, range(10), workers=3),
+                         [x * 2 for x in range(10)])
+
+    def test_single_item(self):
+        self.assertEqual(threads.run(lambda x: x * 2, [1]), [2])
+
+    def test_error(self):
+        def fail(item):
+            raise ValueError(item)
+
+        self.assertRaises(ValueError, threads.run, fail, [1, 2], workers=2)
+
+    def test_no_items(self):
+        self.assertEqual(threads.run(self.fail, []), [])